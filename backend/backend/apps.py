@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class BackendConfig(AppConfig):
+    name = 'backend'
+
+    def ready(self):
+        from .querycache import connect_invalidation
+        from .timing import install_hooks
+
+        connect_invalidation()
+        install_hooks()
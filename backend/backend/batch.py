@@ -0,0 +1,175 @@
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.template.response import SimpleTemplateResponse
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .metrics import LATENCY, REQUESTS, route_of
+
+# Несколько запросов API одним HTTP-запросом. Подзапросы идут прямо в view
+# через резолвер URL, без middleware и повторной проверки JWT: пользователь
+# уже аутентифицирован внешним запросом. Доступны только синхронные view
+# под /api/. Подряд идущие чтения можно выполнить параллельно, записи всегда
+# выполняются по одной в заданном порядке.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+ALLOWED_METHODS = SAFE_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE')
+# Заголовки подответа, которые имеют смысл для клиента
+RESULT_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Location')
+# Что подзапрос берёт из окружения внешнего запроса. Условные (If-None-Match,
+# If-Modified-Since), Range и Content-Encoding относятся к самому пакету:
+# переданные дальше, они дали бы подответы 304/206 без тела
+INHERITED_ENVIRON = (
+    'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'SCRIPT_NAME', 'REMOTE_ADDR',
+    'wsgi.version', 'wsgi.url_scheme', 'wsgi.errors', 'wsgi.multithread', 'wsgi.multiprocess', 'wsgi.run_once',
+    'HTTP_HOST', 'HTTP_AUTHORIZATION', 'HTTP_ACCEPT', 'HTTP_ACCEPT_LANGUAGE', 'HTTP_USER_AGENT',
+    'HTTP_X_FORWARDED_FOR', 'HTTP_X_FORWARDED_HOST', 'HTTP_X_FORWARDED_PROTO',
+)
+
+
+def _error(code, detail):
+    return {'status': code, 'body': {'detail': detail}}
+
+
+def build_request(outer, method, path, body):
+    """Подзапрос; TypeError/ValueError, если тело нельзя передать как JSON."""
+    url = urlsplit(path)
+    payload = b'' if body is None else json.dumps(body).encode()
+    environ = {
+        **{key: outer.META[key] for key in INHERITED_ENVIRON if key in outer.META},
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': BytesIO(payload),
+    }
+    request = WSGIRequest(environ)
+    request.user = outer.user
+    # Request DRF подхватывает эти атрибуты вместо своих аутентификаторов
+    request._force_auth_user = outer.user
+    request._force_auth_token = outer.auth
+    return request
+
+
+def dispatch(outer, item):
+    if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+        return _error(status.HTTP_400_BAD_REQUEST, 'Each request needs a path')
+    method = str(item.get('method', 'GET')).upper()
+    if method not in ALLOWED_METHODS:
+        return _error(status.HTTP_405_METHOD_NOT_ALLOWED, f'Method {method} is not allowed')
+
+    try:
+        request = build_request(outer, method, item['path'], item.get('body'))
+    except (TypeError, ValueError):
+        # Например, bytes в теле из MessagePack
+        return _error(status.HTTP_400_BAD_REQUEST, 'Request body must be JSON-serializable')
+    if not request.path_info.startswith('/api/'):
+        return _error(status.HTTP_400_BAD_REQUEST, 'Only /api/ paths are allowed')
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return _error(status.HTTP_404_NOT_FOUND, 'Not found')
+    if match.func is batch:
+        return _error(status.HTTP_400_BAD_REQUEST, 'Nested batch requests are not allowed')
+    if iscoroutinefunction(match.func):
+        return _error(status.HTTP_400_BAD_REQUEST, 'Async views are not supported in a batch')
+    request.resolver_match = match
+
+    start = time.perf_counter()
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        # Ответ DRF рендерится вместе со всем пакетом, шаблоны — здесь
+        if isinstance(response, SimpleTemplateResponse) and not isinstance(response, Response):
+            response.render()
+    except Exception as exc:
+        response = response_for_exception(request, exc)
+    route = route_of(request)
+    LATENCY.labels(method, route).observe(time.perf_counter() - start)
+    REQUESTS.labels(method, route, str(response.status_code)).inc()
+
+    result = {'status': response.status_code}
+    headers = {name: response[name] for name in RESULT_HEADERS if response.has_header(name)}
+    if headers:
+        result['headers'] = headers
+    if hasattr(response, 'data'):
+        # Данные DRF не рендерятся отдельно: весь пакет рендерится один раз
+        result['body'] = response.data
+    elif response.streaming:
+        response.close()
+        return _error(status.HTTP_406_NOT_ACCEPTABLE, 'Streaming responses are not supported in a batch')
+    elif response.get('Content-Type', '').startswith('application/json') and response.content:
+        result['body'] = json.loads(response.content)
+    elif response.content:
+        result['body'] = response.content.decode(response.charset, errors='replace')
+    return result
+
+
+def _in_thread(context, outer, item):
+    try:
+        return context.run(dispatch, outer, item)
+    finally:
+        # Поток пула открывает своё соединение к БД на каждый подзапрос; закрываем сразу
+        connections.close_all()
+
+
+def run_batch(outer, items, parallel):
+    results = [None] * len(items)
+    index = 0
+    with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS) as pool:
+        while index < len(items):
+            # Группа подряд идущих чтений — параллельно, запись — отдельно
+            group_end = index + 1
+            if parallel and _is_safe(items[index]):
+                while group_end < len(items) and _is_safe(items[group_end]):
+                    group_end += 1
+            if group_end - index == 1:
+                results[index] = dispatch(outer, items[index])
+            else:
+                futures = [
+                    pool.submit(_in_thread, contextvars.copy_context(), outer, items[i])
+                    for i in range(index, group_end)
+                ]
+                for i, future in zip(range(index, group_end), futures):
+                    results[i] = future.result()
+            index = group_end
+    return results
+
+
+def _is_safe(item):
+    return isinstance(item, dict) and str(item.get('method', 'GET')).upper() in SAFE_METHODS
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    """
+    {"requests": [{"id": "me", "method": "GET", "path": "/api/users/me/"}, ...],
+     "parallel": true} -> {"responses": [{"id", "status", "headers", "body"}, ...]}
+    """
+    items = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({'detail': 'requests must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        return Response(
+            {'detail': f'At most {settings.BATCH_MAX_REQUESTS} requests per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    results = run_batch(request, items, bool(request.data.get('parallel')))
+    for item, result in zip(items, results):
+        if isinstance(item, dict) and 'id' in item:
+            result['id'] = item['id']
+    return Response({'responses': results})
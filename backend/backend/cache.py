@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# Поколения кэша: вместо удаления множества ключей при записи меняем
+# номер поколения области (например, "heatmap:42"), и все старые ключи
+# этой области перестают использоваться и вытесняются по TTL.
+
+
+def _generation_key(scope):
+    return f'gen:{scope}'
+
+
+def get_generation(scope):
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        # Новое поколение уникально во времени, поэтому после вытеснения
+        # счётчика из кэша старые значения не "оживут"
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(scope):
+    cache.set(_generation_key(scope), time.time_ns(), None)
+
+
+def versioned_key(scope, *parts):
+    return ':'.join([scope, str(get_generation(scope)), *(str(part) for part in parts)])
+
+
+def is_shared(alias='default'):
+    """Видят ли кэш все процессы: память процесса (LocMemCache) у каждого воркера своя."""
+    return not isinstance(caches[alias], LocMemCache)
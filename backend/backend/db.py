@@ -0,0 +1,64 @@
+import logging
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(thread_connections=False):
+    """
+    Прогревает соединения при старте воркера, чтобы первый запрос не платил
+    за TLS-рукопожатие. Пул (DB_POOL) общий для всех потоков процесса: он
+    заполняется до min_size при любом типе воркера. Без пула соединение
+    Django принадлежит потоку, поэтому оно открывается, только если
+    thread_connections — запросы обслуживает этот же поток (sync-воркер
+    gunicorn, см. post_worker_init в gunicorn.conf.py). Потокам gthread и
+    ASGI без пула прогрев ничего не даёт.
+    """
+    if not settings.DB_WARMUP:
+        return
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is None and not thread_connections:
+            continue
+        try:
+            connection.ensure_connection()
+            if pool is not None:
+                connection.close()  # возвращает соединение в пул
+                pool.wait()
+        except Exception:
+            logger.warning('Не удалось прогреть соединение с БД %s', connection.alias, exc_info=True)
+
+
+def pool_stats():
+    """Состояние соединений текущего процесса по каждой БД."""
+    stats = {}
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            stats[connection.alias] = {
+                'pooled': False,
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'connected': connection.connection is not None,
+            }
+            continue
+        # get_stats() опускает нулевые счётчики
+        raw = pool.get_stats()
+        requests = raw.get('requests_num', 0)
+        wait_ms = raw.get('requests_wait_ms', 0)
+        stats[connection.alias] = {
+            'pooled': True,
+            'min_size': raw.get('pool_min', 0),
+            'max_size': raw.get('pool_max', 0),
+            'size': raw.get('pool_size', 0),
+            'in_use': raw.get('pool_size', 0) - raw.get('pool_available', 0),
+            'idle': raw.get('pool_available', 0),
+            'waiting': raw.get('requests_waiting', 0),
+            'requests': requests,
+            'wait_ms_total': wait_ms,
+            'wait_ms_avg': round(wait_ms / requests, 2) if requests else 0,
+            'timeouts': raw.get('requests_errors', 0),
+            'connections_lost': raw.get('connections_lost', 0),
+        }
+    return stats
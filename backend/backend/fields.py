@@ -0,0 +1,133 @@
+import zlib
+
+from django import forms
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# Текстовое поле, которое хранится в bytea сжатым. Первый байт значения —
+# формат: 0 — UTF-8 как есть (короткий текст), 1 — zlib, 2 — zstd.
+# Из БД приходит PackedText, распаковка происходит при первом обращении к
+# атрибуту модели; записи, у которых текст не читают, не платят за неё.
+
+PLAIN = 0
+ZLIB = 1
+ZSTD = 2
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class PackedText(bytes):
+    """Значение из БД в формате поля, ещё не распакованное."""
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('Для COMPRESSED_TEXT_CODEC=zstd нужен пакет zstandard')
+    return zstandard
+
+
+def compress_text(text, min_bytes=None, codec=None):
+    data = text.encode()
+    min_bytes = settings.COMPRESSED_TEXT_MIN_BYTES if min_bytes is None else min_bytes
+    codec = codec or settings.COMPRESSED_TEXT_CODEC
+    if len(data) >= min_bytes:
+        if codec == 'zstd':
+            packed = bytes([ZSTD]) + _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        else:
+            packed = bytes([ZLIB]) + zlib.compress(data, ZLIB_LEVEL)
+        # Несжимаемый текст хранится как есть
+        if len(packed) < len(data) + 1:
+            return packed
+    return bytes([PLAIN]) + data
+
+
+def decompress_text(packed):
+    if not packed:
+        return ''
+    # psycopg2 отдаёт bytea как memoryview, у которого packed[0] — не int
+    packed = bytes(packed)
+    marker, body = packed[0], packed[1:]
+    if marker == PLAIN:
+        return body.decode()
+    if marker == ZLIB:
+        return zlib.decompress(body).decode()
+    if marker == ZSTD:
+        return _zstd().ZstdDecompressor().decompress(body).decode()
+    raise ValueError(f'Неизвестный формат сжатого текста: {marker}')
+
+
+def to_text(value):
+    """Текст из значения поля: строки, PackedText из values()/values_list() или None."""
+    if isinstance(value, (bytes, memoryview)):
+        return decompress_text(value)
+    return value
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    # Дескриптор данных: иначе значение из instance.__dict__ отдаётся в обход __get__
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is not None and isinstance(value, PackedText):
+            value = decompress_text(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    TextField со сжатием: в коде модели — str, в БД — bytea. Текст короче
+    COMPRESSED_TEXT_MIN_BYTES байт не сжимается. Поиск по содержимому в SQL
+    невозможен — для него нужна отдельная колонка с открытым текстом.
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.editable:
+            kwargs.pop('editable', None)
+        else:
+            kwargs['editable'] = False
+        return name, path, args, kwargs
+
+    def _check_str_default_value(self):
+        # Значение по умолчанию — текст, а не байты
+        return []
+
+    def get_default(self):
+        return models.Field.get_default(self)
+
+    def pre_save(self, model_instance, add):
+        # Непрочитанный текст (PackedText) сохраняется как есть, без распаковки через дескриптор
+        return model_instance.__dict__.get(self.attname)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return PackedText(value)
+
+    def to_python(self, value):
+        return to_text(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, PackedText):
+            return bytes(value)
+        return compress_text(str(value))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{'form_class': forms.CharField, 'widget': forms.Textarea, **kwargs})
@@ -0,0 +1,111 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Логирование без блокирующего ввода-вывода в запросе: обработчик только кладёт
+# запись в ограниченную очередь, а форматирование в JSON и запись в поток
+# выполняет фоновый поток QueueListener. При переполнении записи отбрасываются.
+
+# Атрибуты LogRecord, которые не попадают в JSON как дополнительные поля
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись; поля из extra= добавляются как есть."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """QueueHandler со своим QueueListener, который пишет JSON в stream."""
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JsonFormatter())
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Аргументы подставляются здесь: изменяемые объекты могут поменяться,
+        # пока запись ждёт в очереди. Traceback тоже превращается в текст.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей ниже уровня level; более важные — всегда."""
+
+    def __init__(self, rate=1.0, level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def filter(self, record):
+        return record.levelno >= self.level or self.rate >= 1 or random.random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket на каждый шаблон сообщения: не больше rate записей в секунду
+    с запасом burst. Записи уровня level и выше не ограничиваются.
+    """
+
+    def __init__(self, rate=50, burst=100, level='ERROR'):
+        super().__init__()
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > 10000:
+                self._buckets.clear()
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
@@ -0,0 +1,150 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Отдача медиафайлов вместо django.conf.urls.static: Range, ETag/Last-Modified
+# и Cache-Control. Если перед приложением стоит nginx или Apache, сами байты
+# отдаёт он (X-Accel-Redirect / X-Sendfile), а Django только проверяет запрос.
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    """Файл, из которого можно прочитать только length байт начиная с offset."""
+
+    def __init__(self, file, offset, length):
+        file.seek(offset)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # wsgi.file_wrapper (gunicorn) отправляет через sendfile с текущей позиции
+        # не больше Content-Length байт
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Заголовок Range -> (начало, конец включительно); None — отдать файл целиком."""
+    match = _RANGE_RE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        # Несколько диапазонов и неизвестные единицы не поддерживаем — RFC 9110 разрешает игнорировать
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if length == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def range_applies(request, etag, mtime):
+    # If-Range: диапазон только если файл не изменился, иначе — весь файл
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _with_headers(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def file_response(request, path, url_path, etag=None, cache_control=None, content_type=None):
+    """
+    Ответ с файлом path; url_path — путь относительно MEDIA_ROOT для
+    X-Accel-Redirect. Без content_type тип угадывается по расширению.
+    """
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+    # Сильный валидатор: файл с тем же именем, временем изменения и размером не менялся
+    etag = etag or f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': cache_control or f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}',
+        'Accept-Ranges': 'bytes',
+        # Браузер не должен угадывать тип по содержимому (HTML в «картинке»)
+        'X-Content-Type-Options': 'nosniff',
+    }
+
+    guessed, encoding = mimetypes.guess_type(path)
+    content_type = content_type or guessed or 'application/octet-stream'
+
+    if not_modified(request, etag, st.st_mtime):
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_ACCEL:
+        # Веб-сервер сам обработает Range и отправит файл через sendfile
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL == 'nginx':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + url_path
+        else:
+            response['X-Sendfile'] = os.fsencode(path).decode('latin-1')
+    else:
+        try:
+            byte_range = parse_range(request.headers['Range'], st.st_size) \
+                if 'Range' in request.headers and range_applies(request, etag, st.st_mtime) else None
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{st.st_size}'
+            return _with_headers(response, headers)
+        file = open(path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(file, content_type=content_type)
+        response.block_size = BLOCK_SIZE
+        if encoding:
+            response['Content-Encoding'] = encoding
+    return _with_headers(response, headers)
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    return file_response(request, full_path, path)
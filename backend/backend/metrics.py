@@ -0,0 +1,102 @@
+import hmac
+import os
+import re
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+from .timing import current_timings
+
+# Метрики в формате Prometheus. При нескольких воркерах gunicorn задаётся
+# PROMETHEUS_MULTIPROC_DIR: каждый процесс пишет значения в свои файлы в
+# этом каталоге, а /metrics складывает их. Маршрут — шаблон URL из urls.py,
+# а не путь запроса, чтобы число рядов не росло с числом записей и пользователей.
+
+_ANCHORS = re.compile(r'(^|/)\^|\$(?=/|$)')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = Counter('http_requests_total', 'HTTP-запросы', ['method', 'route', 'status'])
+LATENCY = Histogram('http_request_duration_seconds', 'Время ответа', ['method', 'route'], buckets=LATENCY_BUCKETS)
+DB_QUERIES = Counter('db_queries_total', 'Запросы к БД', ['route'])
+DB_TIME = Counter('db_query_seconds_total', 'Время запросов к БД', ['route'])
+CACHE_LOOKUPS = Counter('cache_lookups_total', 'Обращения к кэшам приложения', ['cache', 'result'])
+
+ENTRIES_CREATED = Counter('entries_created_total', 'Созданные записи')
+EMOTIONS_LOGGED = Counter('emotions_logged_total', 'Отмеченные эмоции', ['emotion_type'])
+LIKES_TOGGLED = Counter('likes_toggled_total', 'Лайки и их отмена', ['action'])
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def route_of(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    # У маршрутов роутера DRF внутри пути остаются якоря регулярных выражений
+    return '/' + _ANCHORS.sub(r'\1', match.route)
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа и работу с БД по маршрутам. Ставится после ServerTimingMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        route = route_of(request)
+        LATENCY.labels(request.method, route).observe(time.perf_counter() - start)
+        REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+        timings = current_timings()
+        if timings is not None and timings.queries:
+            DB_QUERIES.labels(route).inc(timings.queries)
+            DB_TIME.labels(route).inc(timings.phases.get('db', 0.0))
+        return response
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    # Без токена метрики открыты только при DEBUG
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden()
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def _entry_saved(sender, instance, created, **kwargs):
+    if created:
+        ENTRIES_CREATED.inc()
+
+
+def _emotion_saved(sender, instance, created, **kwargs):
+    if created:
+        EMOTIONS_LOGGED.labels(instance.emotion_type).inc()
+
+
+def _like_saved(sender, instance, created, **kwargs):
+    if created:
+        LIKES_TOGGLED.labels('like').inc()
+
+
+def _like_deleted(sender, instance, **kwargs):
+    LIKES_TOGGLED.labels('unlike').inc()
+
+
+post_save.connect(_entry_saved, sender='entries.Entry', dispatch_uid='metrics_entry_saved')
+post_save.connect(_emotion_saved, sender='emotions.Emotion', dispatch_uid='metrics_emotion_saved')
+post_save.connect(_like_saved, sender='like.Like', dispatch_uid='metrics_like_saved')
+post_delete.connect(_like_deleted, sender='like.Like', dispatch_uid='metrics_like_deleted')
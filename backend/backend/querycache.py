@@ -0,0 +1,239 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.models.sql.query import Query
+
+from .cache import is_shared
+from .metrics import record_cache
+
+# Кэш результатов запросов по таблицам. Ключ — скомпилированный SQL с
+# параметрами и версии всех таблиц, которые запрос читает (включая
+# подзапросы). Любая запись в таблицу меняет её версию, и все ключи с
+# этой таблицей перестают совпадать. Кэширование включается явно: .cache(),
+# и только с общим кэшем: версии таблиц должны видеть все воркеры.
+
+_MISS = object()
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def _cache():
+    return caches[settings.QUERY_CACHE_ALIAS]
+
+
+def _enabled():
+    return is_shared(settings.QUERY_CACHE_ALIAS)
+
+
+def _table_key(table):
+    return f'qc:table:{table}'
+
+
+def _walk(node):
+    """Обходит дерево WHERE и выражений; вложенные Query отдаются как листья."""
+    yield node
+    if isinstance(node, Query):
+        return
+    children = getattr(node, 'children', None)
+    if children is None and hasattr(node, 'get_source_expressions'):
+        children = node.get_source_expressions()
+    for child in children or ():
+        if child is not None:
+            yield from _walk(child)
+
+
+def query_tables(query):
+    """Таблицы, которые читает запрос, включая подзапросы и объединения."""
+    tables = {query.get_meta().db_table}
+    tables.update(join.table_name for join in query.alias_map.values())
+    for expression in (query.where, *query.annotations.values()):
+        for node in _walk(expression):
+            inner = node if isinstance(node, Query) else getattr(node, 'query', None)
+            if isinstance(inner, Query) and inner is not query:
+                tables |= query_tables(inner)
+    for combined in query.combined_queries:
+        tables |= query_tables(combined)
+    return tables
+
+
+def table_versions(tables):
+    cache = _cache()
+    keys = [_table_key(table) for table in sorted(tables)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Версия уникальна во времени: вытесненный счётчик не "оживит" старые ключи
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_tables(tables):
+    if not _enabled():
+        return
+
+    def bump():
+        now = time.time_ns()
+        _cache().set_many({_table_key(table): now for table in tables}, None)
+
+    bump()
+    # Повтор после коммита: иначе параллельный запрос мог закэшировать данные
+    # до коммита под уже новой версией
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def invalidate_model(model):
+    bump_tables({model._meta.db_table, *(parent._meta.db_table for parent in model._meta.get_parent_list())})
+
+
+def _record(model, hit):
+    record_cache('query', hit)
+    with _stats_lock:
+        _stats[model._meta.label]['hits' if hit else 'misses'] += 1
+
+
+def query_cache_stats():
+    """Попадания и промахи по моделям в текущем процессе."""
+    with _stats_lock:
+        return {
+            label: {**counts, 'hit_rate': round(counts['hits'] / (counts['hits'] + counts['misses']), 3)}
+            for label, counts in _stats.items()
+        }
+
+
+class CachingQuerySet(models.QuerySet):
+    """QuerySet, который после .cache() берёт результат из кэша Django."""
+
+    _cache_enabled = False
+    _cache_timeout = None
+
+    def cache(self, timeout=None):
+        clone = self._chain()
+        clone._cache_enabled = True
+        clone._cache_timeout = timeout if timeout is not None else settings.QUERY_CACHE_TIMEOUT
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_enabled = self._cache_enabled
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _cache_key(self, kind):
+        # prefetch_related читает другие таблицы отдельными запросами — не кэшируем
+        if not self._cache_enabled or self._prefetch_related_lookups or self.query.select_for_update:
+            return None
+        if not _enabled():
+            return None
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        versions = table_versions(query_tables(self.query))
+        raw = repr((self.db, kind, self._iterable_class.__name__, sql, params, versions))
+        return f'qc:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            key = self._cache_key('rows')
+            if key is not None:
+                rows = _cache().get(key, _MISS)
+                _record(self.model, rows is not _MISS)
+                if rows is not _MISS:
+                    self._result_cache = rows
+                    return
+                super()._fetch_all()
+                _cache().set(key, self._result_cache, self._cache_timeout)
+                return
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is None:
+            key = self._cache_key('count')
+            if key is not None:
+                count = _cache().get(key, _MISS)
+                _record(self.model, count is not _MISS)
+                if count is _MISS:
+                    count = super().count()
+                    _cache().set(key, count, self._cache_timeout)
+                return count
+        return super().count()
+
+    # Массовые операции не шлют post_save/post_delete — сбрасываем таблицу сами
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        invalidate_model(self.model)
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        invalidate_model(self.model)
+        return result
+
+    def _raw_delete(self, using):
+        rows = super()._raw_delete(using)
+        invalidate_model(self.model)
+        return rows
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        invalidate_model(self.model)
+        return objs
+
+    def bulk_update(self, *args, **kwargs):
+        rows = super().bulk_update(*args, **kwargs)
+        invalidate_model(self.model)
+        return rows
+
+
+CachingManager = models.Manager.from_queryset(CachingQuerySet)
+
+
+def _invalidate_sender(sender, **kwargs):
+    invalidate_model(sender)
+
+
+def _invalidate_through(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_model(sender)
+
+
+def _is_cached(model):
+    return any(issubclass(manager._queryset_class, CachingQuerySet) for manager in model._meta.managers)
+
+
+def connect_invalidation():
+    """
+    Подключает сброс версий к моделям с CachingQuerySet и к моделям их прямых
+    связей (таблицы select_related и фильтров по FK). Остальные модели,
+    например задачи и сессии, сохраняются без записи в кэш.
+    """
+    watched, through = set(), set()
+    for model in apps.get_models():
+        if not _is_cached(model):
+            continue
+        watched.add(model)
+        for field in model._meta.get_fields():
+            if isinstance(field, models.ManyToManyField):
+                watched.add(field.related_model)
+                through.add(field.remote_field.through)
+            elif isinstance(field, models.ForeignKey):
+                watched.add(field.related_model)
+    # Прокси шлют сигналы от своего класса
+    for model in apps.get_models():
+        if model._meta.concrete_model in watched:
+            label = model._meta.label
+            post_save.connect(_invalidate_sender, sender=model, dispatch_uid=f'querycache_post_save:{label}')
+            post_delete.connect(_invalidate_sender, sender=model, dispatch_uid=f'querycache_post_delete:{label}')
+    for model in through:
+        label = model._meta.label
+        m2m_changed.connect(_invalidate_through, sender=model, dispatch_uid=f'querycache_m2m_changed:{label}')
@@ -0,0 +1,68 @@
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Быстрые рендереры и парсеры для DRF: orjson вместо json из стандартной
+# библиотеки и MessagePack для клиентов, которые присылают
+# Accept: application/msgpack. Типы, которых orjson/msgpack не знают
+# (Decimal, ленивые строки и т. п.), приводятся тем же кодировщиком, что и в DRF.
+
+_drf_default = JSONEncoder().default
+
+
+def _msgpack_default(value):
+    # datetime/UUID и прочее msgpack сам не упаковывает — как в JSON, отдаём строкой
+    return _drf_default(value)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None  # orjson всегда отдаёт UTF-8
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Отступы (Accept: application/json; indent=4) orjson не поддерживает — отдаём стандартному рендереру
+        if accepted_media_type and 'indent' in accepted_media_type:
+            return JSONRenderer().render(data, accepted_media_type, renderer_context)
+        # datetime/date/time orjson пишет сам и иначе, чем DRF (+00:00 вместо Z),
+        # поэтому они тоже идут через кодировщик DRF
+        return orjson.dumps(
+            data, default=_drf_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True, datetime=False)
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
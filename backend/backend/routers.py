@@ -0,0 +1,103 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import is_shared
+
+# Чтения идут на реплики только внутри безопасных запросов, которые
+# ReplicaRoutingMiddleware разрешил; команды и фоновые задачи читают с основной БД.
+# Состояние запроса — изменяемый объект: потоки с copy_context() (batch)
+# видят тот же объект, и запись в любом из них переводит чтения на основную БД.
+_request_state = ContextVar('replica_request_state', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_pin'
+
+
+class RequestState:
+    def __init__(self, primary):
+        self.primary = primary  # читать с основной БД
+        self.wrote = False  # в запросе была запись
+
+
+class ReplicaRouter:
+    """Записи и миграции — в default, чтения разрешённых запросов — в случайную реплику."""
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if settings.DATABASE_REPLICAS and state is not None and not state.primary:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Запись в любом запросе (в том числе GET) закрепляет клиента за основной БД
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+            state.primary = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def _token_user_id(request):
+    """id пользователя из access-токена без обращения к БД."""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        return AccessToken(header[len('Bearer '):]).get(api_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Отправляет чтения безопасных запросов на реплики. После записи клиент на
+    DATABASE_REPLICA_PIN_SECONDS закрепляется за основной БД (read-your-writes):
+    браузер — через cookie, пользователь с JWT — через метку в кэше. Метку
+    должны видеть все воркеры, поэтому с репликами нужен общий кэш.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.DATABASE_REPLICAS and not is_shared():
+            raise ImproperlyConfigured(
+                'DB_REPLICA_HOSTS requires a shared cache (CACHE_BACKEND): '
+                'read-your-writes pins are stored in the cache'
+            )
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        user_id = _token_user_id(request)
+        safe = request.method in SAFE_METHODS
+        pinned = PIN_COOKIE in request.COOKIES or (user_id is not None and cache.get(_pin_key(user_id)))
+        state = RequestState(primary=not safe or bool(pinned))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote:
+            window = settings.DATABASE_REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, '1', max_age=window, httponly=True, samesite='Lax')
+            if user_id is not None:
+                cache.set(_pin_key(user_id), 1, window)
+        return response
@@ -1,13 +1,17 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
+from importlib.util import find_spec
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
-load_dotenv()
-
 # Базовая директория проекта
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Явный путь: без него python-dotenv ищет .env, разбирая стек вызовов и поднимаясь по каталогам
+load_dotenv(BASE_DIR / '.env')
+
 # Секретный ключ (жёстко прописан)
 SECRET_KEY = os.getenv("SECRET_KEY", "k7qo3qy%i8=81887f@q=%7%)n!+ra#t0%fucdc+3o_3g*&f*7e")
 
@@ -15,8 +19,6 @@ SECRET_KEY = os.getenv("SECRET_KEY", "k7qo3qy%i8=81887f@q=%7%)n!+ra#t0%fucdc+3o_
 DEBUG = True
 
 # Разрешённые хосты
-import os
-
 ALLOWED_HOSTS = os.getenv('DJANGO_ALLOWED_HOSTS', 'localhost').split(',')
 
 
@@ -33,19 +35,25 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework_simplejwt',
 
+    'backend',
     'users',
     'entries',
     'emotions',
     'reviews',
     'like',
     'comments',
+    'blobs',
+    'tasks',
 ]
 
 # Middleware (corsheaders должен идти выше CommonMiddleware)
 MIDDLEWARE = [
+    'backend.timing.ServerTimingMiddleware',       # Server-Timing и профилирование
+    'backend.metrics.MetricsMiddleware',           # метрики Prometheus
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # отдача статики
     'corsheaders.middleware.CorsMiddleware',       # CORS
+    'backend.routers.ReplicaRoutingMiddleware',    # чтения с реплик
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,6 +83,19 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Настройки базы данных (PostgreSQL)
+# Соединения с БД: без пула соединение живёт DB_CONN_MAX_AGE секунд и
+# переиспользуется между запросами (TLS-рукопожатие с Render — самая дорогая
+# часть запроса). DB_POOL=1 включает пул psycopg 3 (нужен pip install
+# "psycopg[binary,pool]"; в requirements его нет, потому что с установленным
+# psycopg 3 Django грузит его вместо psycopg2, а это ~140 мс холодного старта).
+# Пул у каждого процесса свой: DB_POOL_MAX_SIZE × число воркеров не должно
+# превышать лимит соединений БД.
+DB_POOL = os.getenv('DB_POOL', '').lower() in ('1', 'true', 'yes')
+# Без psycopg 3 Django сообщит об этом только при первом соединении, а прогрев
+# (backend.db.warm_up) лишь пишет предупреждение — поэтому проверяем сразу
+if DB_POOL and not (find_spec('psycopg') and find_spec('psycopg_pool')):
+    raise ImproperlyConfigured('DB_POOL=1 requires psycopg 3 with the pool: pip install "psycopg[binary,pool]"')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -83,9 +104,103 @@ DATABASES = {
         'PASSWORD': os.getenv("DB_PASSWORD", "D3tefheUgQwUlqmikWAsLkhY5aaenIvc"),
         'HOST': os.getenv("DB_HOST", "dpg-d15b3fje5dus739fk4hg-a.singapore-postgres.render.com"),
         'PORT': os.getenv("DB_PORT", "5432"),
+        # С пулом постоянные соединения Django не используются
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+}
+
+# Проверку соединения перед выдачей из пула Django включает сам по CONN_HEALTH_CHECKS
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 4)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+    }
+
+# Реплики для чтения: DB_REPLICA_HOSTS через запятую, остальные параметры как у
+# default. В тестах реплики зеркалируют default (TEST MIRROR). С репликами нужен общий
+# кэш (CACHE_BACKEND): в нём хранятся метки read-your-writes.
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host.strip(),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает с основной БД
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+# Открывать соединения (или заполнять пул) при старте воркера gunicorn (post_worker_init)
+DB_WARMUP = os.getenv('DB_WARMUP', '1').lower() in ('1', 'true', 'yes')
+
+# Бюджет холодного старта (мс до первого ответа), проверяется тестом users и manage.py profile_startup
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1500))
+
+# Кэш (по умолчанию память процесса, в проде задаётся общий бэкенд через окружение)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'taimbook'),
+    },
+    # Локальный кэш процесса для счётчиков ограничения частоты входа
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'taimbook-local',
+    },
 }
 
+# Кэш результатов запросов (.cache() у CachingQuerySet): алиас кэша и время жизни
+QUERY_CACHE_ALIAS = os.getenv('QUERY_CACHE_ALIAS', 'default')
+QUERY_CACHE_TIMEOUT = int(os.getenv('QUERY_CACHE_TIMEOUT', 300))
+
+# Время жизни кэша годовой тепловой карты (секунды); с кэшем в памяти процесса
+# (без CACHE_BACKEND) — короткое, т.к. другие воркеры не видят сброса
+HEATMAP_CACHE_TIMEOUT = int(os.getenv('HEATMAP_CACHE_TIMEOUT', 60 * 60 * 24))
+HEATMAP_LOCAL_CACHE_TIMEOUT = int(os.getenv('HEATMAP_LOCAL_CACHE_TIMEOUT', 60))
+
+# Публичный профиль: время жизни кэша (кэшируется только в общем кэше) и размер первой страницы записей
+PROFILE_CACHE_TIMEOUT = int(os.getenv('PROFILE_CACHE_TIMEOUT', 60 * 60))
+PROFILE_PAGE_SIZE = int(os.getenv('PROFILE_PAGE_SIZE', 10))
+PROFILE_MAX_PAGE_SIZE = 50
+
+# Пакетный endpoint api/batch/: максимум подзапросов и потоков для параллельных чтений
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 4))
+
+# Сжатие текста записей (backend.fields.CompressedTextField): текст короче
+# порога хранится как есть; zstd требует пакет zstandard
+COMPRESSED_TEXT_CODEC = os.getenv('COMPRESSED_TEXT_CODEC', 'zlib')
+COMPRESSED_TEXT_MIN_BYTES = int(os.getenv('COMPRESSED_TEXT_MIN_BYTES', 256))
+
+# Лента изменений entries/changes: размер страницы
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 200))
+SYNC_MAX_PAGE_SIZE = 1000
+
+# История правок записей: snapshot каждые N версий, срок хранения и предел версий на запись
+REVISION_SNAPSHOT_EVERY = int(os.getenv('REVISION_SNAPSHOT_EVERY', 20))
+REVISION_KEEP_DAYS = int(os.getenv('REVISION_KEEP_DAYS', 90))
+REVISION_MAX_PER_ENTRY = int(os.getenv('REVISION_MAX_PER_ENTRY', 200))
+# Изменённый фрагмент длиннее этого (в символах) сохраняется заменой целиком, без посимвольного diff
+REVISION_DIFF_LIMIT = 20000
+
+# Автосохранение редактора: пауза без правок до записи в БД, предельная задержка записи (секунды),
+# время жизни черновика в кэше и блокировки черновика. Черновики — только с общим кэшем,
+# без него каждая правка пишется в БД сразу
+AUTOSAVE_QUIET_SECONDS = float(os.getenv('AUTOSAVE_QUIET_SECONDS', 3))
+AUTOSAVE_MAX_DELAY = float(os.getenv('AUTOSAVE_MAX_DELAY', 30))
+AUTOSAVE_DRAFT_TIMEOUT = 60 * 60
+AUTOSAVE_LOCK_TIMEOUT = 5
+
 # Статические файлы
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -95,6 +210,42 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Медиа файлы
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Сколько секунд браузер и CDN могут кэшировать медиа без перепроверки (blob — всегда год)
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', 60 * 60 * 24))
+# Кто отправляет байты файла: '' — сам Django (FileResponse), 'nginx' — X-Accel-Redirect,
+# 'sendfile' — X-Sendfile (Apache mod_xsendfile, lighttpd)
+MEDIA_ACCEL = os.getenv('MEDIA_ACCEL', '')
+# internal location в nginx, который смотрит на MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Загруженные файлы хранятся по хешу содержимого (blobs/ab/<sha256>.<ext>)
+STORAGES = {
+    'default': {'BACKEND': 'blobs.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# Файл blob без ссылок не удаляется, если его трогали за последние N секунд
+BLOB_DELETE_GRACE = int(os.getenv('BLOB_DELETE_GRACE', 60 * 60))
+
+# Фоновые задачи (tasks): воркер — manage.py run_worker.
+# Число потоков на очередь в одном воркере
+TASKS_QUEUES = {'default': 2, 'media': 1, 'maintenance': 1}
+# Выполнять задачи сразу после коммита в процессе веб-сервера (разработка без воркера)
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False') == 'True'
+TASKS_POLL_INTERVAL = float(os.getenv('TASKS_POLL_INTERVAL', 1))
+# Задача в running дольше этого срока считается брошенной упавшим воркером
+TASKS_LOCK_TIMEOUT = int(os.getenv('TASKS_LOCK_TIMEOUT', 10 * 60))
+# Повторы: пауза base * 2^(попытка-1), не больше max секунд
+TASKS_RETRY_BASE = 10
+TASKS_RETRY_MAX = 60 * 60
+TASKS_KEEP_FINISHED_DAYS = 7
+# Периодические задачи: имя -> задача и интервал в секундах
+TASKS_PERIODIC = {
+    'purge-finished-jobs': {'task': 'tasks.jobs.purge_finished', 'every': 24 * 60 * 60},
+    'collect-orphaned-media': {'task': 'blobs.jobs.collect_orphans', 'every': 24 * 60 * 60},
+    'compact-sync-log': {'task': 'entries.jobs.compact_sync_log', 'every': 24 * 60 * 60},
+    'prune-entry-revisions': {'task': 'entries.jobs.prune_entry_revisions', 'every': 24 * 60 * 60},
+}
+TASKS_PERIODIC_CHECK = 60
 
 # CORS настройки
 CORS_ALLOWED_ORIGINS = [
@@ -114,11 +265,7 @@ CORS_ALLOW_METHODS = [
     "PATCH",
 ]
 
-from corsheaders.defaults import default_headers
-
-CORS_ALLOW_HEADERS = list(default_headers) + [
-    'authorization',
-]
+# CORS_ALLOW_HEADERS не задаём: заголовки corsheaders по умолчанию уже включают authorization
 
 # Django REST Framework настройки
 REST_FRAMEWORK = {
@@ -126,10 +273,22 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    # JSON через orjson; MessagePack по Accept/Content-Type: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.ORJSONRenderer',
+        'backend.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.renderers.ORJSONParser',
+        'backend.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # Настройки JWT
@@ -151,11 +310,87 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(days=1),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=7),
+    # Ротация и отзыв refresh-токенов реализованы в users.revocation
+    # (приложение token_blacklist не используется)
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.RotatingTokenRefreshSerializer',
 }
 
-# Максимальный размер загружаемых данных (50 МБ)
-DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800
+# Bloom-фильтр отозванных refresh-токенов
+TOKEN_REVOCATION_BLOOM_CAPACITY = int(os.getenv('TOKEN_REVOCATION_BLOOM_CAPACITY', 100_000))
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = float(os.getenv('TOKEN_REVOCATION_BLOOM_ERROR_RATE', 0.001))
+# Как часто процесс догружает отзывы, сделанные другими процессами
+TOKEN_REVOCATION_SYNC_SECONDS = int(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', 30))
+
+# Сколько секунд аутентифицированный пользователь хранится в кэше (только если кэш общий для воркеров)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60))
+
+# Вход: ограничение попыток (попыток, секунд на полное восстановление)
+LOGIN_THROTTLE_IP = (int(os.getenv('LOGIN_THROTTLE_IP_BURST', 20)), int(os.getenv('LOGIN_THROTTLE_IP_PERIOD', 60)))
+LOGIN_THROTTLE_EMAIL = (int(os.getenv('LOGIN_THROTTLE_EMAIL_BURST', 5)), int(os.getenv('LOGIN_THROTTLE_EMAIL_PERIOD', 300)))
+# Пул потоков для проверки паролей при асинхронном входе и предел одновременных проверок в процессе
+LOGIN_HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', 2))
+LOGIN_HASH_MAX_PENDING = int(os.getenv('LOGIN_HASH_MAX_PENDING', 8))
+# Хешер, в который пароль перехешируется при успешном входе ('default' — первый из PASSWORD_HASHERS)
+LOGIN_PASSWORD_HASHER = os.getenv('LOGIN_PASSWORD_HASHER', 'default')
+
+# Загрузки: тело запроса без файлов держится в памяти (5 МБ), файлы пишутся
+# во временные файлы и проверяются потоково (backend/uploads.py)
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('DATA_UPLOAD_MAX_MEMORY_SIZE', 5 * 1024 * 1024))
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 256 * 1024))
+FILE_UPLOAD_HANDLERS = ['backend.uploads.ImageUploadHandler']
+# Максимальный размер изображения (50 МБ), разрешение и сторона после уменьшения
+UPLOAD_IMAGE_MAX_SIZE = int(os.getenv('UPLOAD_IMAGE_MAX_SIZE', 50 * 1024 * 1024))
+UPLOAD_IMAGE_MAX_PIXELS = int(os.getenv('UPLOAD_IMAGE_MAX_PIXELS', 50_000_000))
+UPLOAD_IMAGE_MAX_DIMENSION = int(os.getenv('UPLOAD_IMAGE_MAX_DIMENSION', 2560))
+# Одновременных загрузок на пользователя (для всех воркеров: общий кэш или блокировки PostgreSQL);
+# время жизни счётчика в кэше (секунды)
+UPLOAD_MAX_CONCURRENT_PER_USER = int(os.getenv('UPLOAD_MAX_CONCURRENT_PER_USER', 2))
+UPLOAD_SLOT_TIMEOUT = 300
+
+# Логирование: JSON-строки через очередь и фоновый поток (backend/logconfig.py).
+# Горячие пути пишут INFO с выборкой LOG_SAMPLE_RATE, одинаковые сообщения
+# ограничены LOG_RATE_LIMIT в секунду; WARNING и выше не выбрасываются.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+LOG_RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', 50))
+
+# Заголовок Server-Timing с фазами запроса (auth, db, serialize, render, total)
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+# cProfile для доли PROFILE_SAMPLE_RATE запросов к view из PROFILE_VIEWS
+# (имена маршрутов через запятую, например entry-list,public-profile; * — все)
+PROFILE_VIEWS = [name for name in os.getenv('PROFILE_VIEWS', '').split(',') if name]
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.01))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'taimbook-profiles'))
+
+# Метрики Prometheus на /metrics: нужен заголовок Authorization: Bearer <токен>,
+# без токена /metrics отвечает 403 (кроме DEBUG). Для нескольких воркеров задайте
+# переменную окружения PROMETHEUS_MULTIPROC_DIR (её читает prometheus_client,
+# см. gunicorn.conf.py).
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample': {'()': 'backend.logconfig.SamplingFilter', 'rate': LOG_SAMPLE_RATE},
+        'rate_limit': {'()': 'backend.logconfig.RateLimitFilter', 'rate': LOG_RATE_LIMIT, 'burst': LOG_RATE_LIMIT * 2},
+    },
+    'handlers': {
+        'background': {
+            '()': 'backend.logconfig.BackgroundHandler',
+            'stream': 'ext://sys.stderr',
+            'filters': ['rate_limit'],
+        },
+    },
+    'root': {'handlers': ['background'], 'level': LOG_LEVEL},
+    'loggers': {
+        'django': {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False},
+        **{
+            name: {'level': LOG_LEVEL, 'filters': ['sample']}
+            for name in ('entries.views', 'entries.serializers', 'emotions.views', 'reviews.views', 'backend.timing')
+        },
+    },
+}
 
 # Кастомная модель пользователя
 AUTH_USER_MODEL = 'users.User'
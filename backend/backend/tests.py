@@ -0,0 +1,705 @@
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+import msgpack
+from prometheus_client import REGISTRY
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.template import engines
+from django.template.response import TemplateResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.exceptions import Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from emotions.models import Emotion
+from entries.models import Entry
+from entries.views import EntryViewSet
+from reviews.models import Review
+from like.models import Like
+from tasks.models import Job
+from users.models import User
+from users.tests import shared_cache
+
+from . import fields
+from .db import pool_stats, warm_up
+from .fields import PLAIN, ZLIB, PackedText, compress_text, decompress_text, to_text
+from .media import file_response
+from .renderers import MessagePackRenderer, ORJSONRenderer
+from .routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from . import querycache, timing, uploads
+from .uploads import acquire_upload_slot, release_upload_slot
+
+# Реплика для тестов роутера: второе соединение к тестовой БД default
+if 'replica1' not in connections.settings:
+    connections.settings['replica1'] = {
+        **connections.settings['default'],
+        'TEST': {**connections.settings['default']['TEST'], 'MIRROR': 'default'},
+    }
+
+SAMPLE = {
+    'aware': datetime.datetime(2024, 1, 1, 12, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+    'offset': datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=3))),
+    'naive': datetime.datetime(2024, 1, 1, 12, 0, 0, 500),
+    'date': datetime.date(2024, 2, 29),
+    'time': datetime.time(8, 30, 15, 250000),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'decimal': Decimal('12.50'),
+    'nested': [{'when': datetime.datetime(2020, 5, 5, tzinfo=datetime.timezone.utc)}],
+}
+
+
+class RendererTests(SimpleTestCase):
+    def test_orjson_matches_drf_json(self):
+        expected = json.loads(JSONRenderer().render(SAMPLE))
+        self.assertEqual(json.loads(ORJSONRenderer().render(SAMPLE)), expected)
+        self.assertEqual(expected['aware'], '2024-01-01T12:00:00.123456Z')
+
+    def test_msgpack_matches_drf_json(self):
+        expected = json.loads(JSONRenderer().render(SAMPLE))
+        self.assertEqual(msgpack.unpackb(MessagePackRenderer().render(SAMPLE)), expected)
+
+    def test_indent_falls_back_to_drf(self):
+        rendered = ORJSONRenderer().render(SAMPLE, 'application/json; indent=2')
+        self.assertEqual(rendered, JSONRenderer().render(SAMPLE, 'application/json; indent=2'))
+
+
+@override_settings(MEDIA_ACCEL=None)
+class FileResponseTests(SimpleTestCase):
+    SIZE = 2000
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.bin')
+        self.data = bytes(range(256)) * 7 + bytes(self.SIZE - 256 * 7)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.data)
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        response = file_response(self.factory.get('/media/file.bin', headers=headers), self.path, 'file.bin')
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.data)
+
+    def test_range(self):
+        response = self.get(Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{self.SIZE}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.data[10:20])
+
+    def test_suffix_range(self):
+        response = self.get(Range='bytes=-500')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1500-1999/{self.SIZE}')
+        self.assertEqual(self.body(response), self.data[-500:])
+
+    def test_suffix_longer_than_file(self):
+        response = self.get(Range='bytes=-5000')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-1999/{self.SIZE}')
+        self.assertEqual(self.body(response), self.data)
+
+    def test_open_range_end_is_clamped(self):
+        response = self.get(Range='bytes=1990-5000')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[1990:])
+
+    def test_range_past_eof(self):
+        for header in ('bytes=2000-', 'bytes=3000-3100', 'bytes=-0'):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{self.SIZE}')
+
+    def test_multi_range_falls_back_to_full_file(self):
+        response = self.get(Range='bytes=0-9,100-109')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_stale_if_range_etag_sends_full_file(self):
+        response = self.get(Range='bytes=0-9', **{'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_stale_if_range_date_sends_full_file(self):
+        stale = http_date(os.stat(self.path).st_mtime - 3600)
+        response = self.get(Range='bytes=0-9', **{'If-Range': stale})
+        self.assertEqual(response.status_code, 200)
+
+    def test_current_if_range_sends_range(self):
+        etag = self.get()['ETag']
+        response = self.get(Range='bytes=0-9', **{'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[:10])
+
+    def test_not_modified(self):
+        first = self.get()
+        self.assertEqual(self.get(**{'If-None-Match': first['ETag']}).status_code, 304)
+        self.assertEqual(self.get(**{'If-Modified-Since': first['Last-Modified']}).status_code, 304)
+
+    @override_settings(MEDIA_ACCEL='nginx', MEDIA_ACCEL_PREFIX='/protected/')
+    def test_accel_redirect(self):
+        response = file_response(self.factory.get('/media/file.bin'), self.path, 'file.bin')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/file.bin')
+        self.assertEqual(response.content, b'')
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, requests, **headers):
+        response = self.client.post('/api/batch/', {'requests': requests}, format='json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['responses']
+
+    def test_conditional_headers_do_not_reach_sub_requests(self):
+        shared_cache(self)
+        direct = self.client.get('/api/users/profile/alice/')
+        etag = direct['ETag']
+        self.assertEqual(self.client.get('/api/users/profile/alice/', headers={'If-None-Match': etag}).status_code, 304)
+
+        [result] = self.batch(
+            [{'id': 'profile', 'path': '/api/users/profile/alice/'}],
+            **{'If-None-Match': etag, 'Range': 'bytes=0-1'},
+        )
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(result['body']['user']['username'], 'alice')
+
+    def test_binary_body_fails_only_its_item(self):
+        payload = msgpack.packb({'requests': [
+            {'id': 'bad', 'method': 'POST', 'path': '/api/emotions/', 'body': {'emotion_type': b'joy'}},
+            {'id': 'good', 'path': '/api/users/me/'},
+        ]}, use_bin_type=True)
+        response = self.client.post('/api/batch/', payload, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        bad, good = response.json()['responses']
+        self.assertEqual((bad['id'], bad['status']), ('bad', 400))
+        self.assertEqual((good['id'], good['status']), ('good', 200))
+
+    def test_nested_batch_is_rejected(self):
+        [result] = self.batch([{'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}}])
+        self.assertEqual(result['status'], 400)
+
+    def test_only_api_paths(self):
+        self.client.force_authenticate(User.objects.create_superuser(username='a', email='s@a.ru', password='pass12345!X'))
+        admin, metrics = self.batch([{'path': '/admin/'}, {'path': '/metrics'}])
+        self.assertEqual(admin['status'], 400)
+        self.assertEqual(metrics['status'], 400)
+
+    def test_async_view_is_rejected(self):
+        async_view, me = self.batch([
+            {'method': 'POST', 'path': '/api/users/login/async/', 'body': {}},
+            {'path': '/api/users/me/'},
+        ])
+        self.assertEqual(async_view['status'], 400)
+        self.assertEqual(me['status'], 200)
+
+    def test_template_response_is_rendered(self):
+        def view(request):
+            return TemplateResponse(request, engines['django'].from_string('hello {{ name }}'), {'name': 'alice'})
+
+        with mock.patch('backend.batch.resolve', return_value=ResolverMatch(view, (), {}, route='api/page/')):
+            [result] = self.batch([{'path': '/api/page/'}])
+        self.assertEqual(result, {'status': 200, 'body': 'hello alice'})
+
+    def test_parallel_groups_consecutive_reads(self):
+        calls = []
+
+        def fake_dispatch(outer, item):
+            calls.append((item['id'], threading.current_thread() is threading.main_thread()))
+            return {'status': 200}
+
+        requests = [
+            {'id': 'r1', 'path': '/api/users/me/'},
+            {'id': 'r2', 'path': '/api/users/me/'},
+            {'id': 'w', 'method': 'POST', 'path': '/api/emotions/'},
+            {'id': 'r3', 'path': '/api/users/me/'},
+        ]
+        with mock.patch('backend.batch.dispatch', side_effect=fake_dispatch):
+            responses = self.client.post('/api/batch/', {'requests': requests, 'parallel': True}, format='json')
+        self.assertEqual([item['id'] for item in responses.json()['responses']], ['r1', 'r2', 'w', 'r3'])
+        main = dict(calls)
+        # Два чтения подряд — в пуле, запись и одиночное чтение — в потоке запроса
+        self.assertEqual(main, {'r1': False, 'r2': False, 'w': True, 'r3': True})
+        self.assertEqual([item for item, _ in calls][2:], ['w', 'r3'])
+
+        calls.clear()
+        with mock.patch('backend.batch.dispatch', side_effect=fake_dispatch):
+            self.client.post('/api/batch/', {'requests': requests}, format='json')
+        self.assertEqual(calls, [('r1', True), ('r2', True), ('w', True), ('r3', True)])
+
+    def test_parallel_reads_return_in_order(self):
+        results = self.batch_parallel([{'id': str(i), 'path': '/api/users/me/'} for i in range(3)])
+        self.assertEqual([(item['id'], item['status']) for item in results], [('0', 200), ('1', 200), ('2', 200)])
+        self.assertTrue(all(item['body']['username'] == 'alice' for item in results))
+
+    def batch_parallel(self, requests):
+        response = self.client.post('/api/batch/', {'requests': requests, 'parallel': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['responses']
+
+
+def png(width=8, height=8):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(UPLOAD_MAX_CONCURRENT_PER_USER=2)
+class UploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, cover):
+        return self.client.post('/api/entries/', {'title': 'a', 'cover_image': cover}, format='multipart')
+
+    def test_image_is_accepted(self):
+        response = self.upload(png())
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['cover_image'])
+
+    def test_non_image_is_rejected(self):
+        response = self.upload(SimpleUploadedFile('x.png', b'<svg onload=alert(1)>', content_type='image/png'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cover_image', response.json())
+        # Заголовок похож на PNG, но Pillow файл не открывает
+        response = self.upload(SimpleUploadedFile('x.png', b'\x89PNG\r\n\x1a\n' + b'0' * 100))
+        self.assertEqual(response.status_code, 400)
+
+    def test_pixel_bomb_is_rejected(self):
+        with self.settings(UPLOAD_IMAGE_MAX_PIXELS=100):
+            self.assertEqual(self.upload(png(20, 20)).status_code, 413)
+            self.assertEqual(self.upload(png(10, 10)).status_code, 201)
+
+    def test_too_large_is_rejected(self):
+        with self.settings(UPLOAD_IMAGE_MAX_SIZE=50):
+            self.assertEqual(self.upload(png()).status_code, 413)
+
+    def test_concurrent_uploads_are_limited(self):
+        slots = [acquire_upload_slot(self.user.pk) for _ in range(2)]
+        self.assertEqual(self.upload(png()).status_code, 429)
+        release_upload_slot(self.user.pk, slots[0])
+        self.assertEqual(self.upload(png()).status_code, 201)
+        release_upload_slot(self.user.pk, slots[1])
+
+    def test_concurrent_uploads_are_limited_in_shared_cache(self):
+        shared_cache(self)
+        self.test_concurrent_uploads_are_limited()
+
+    def test_slot_released_on_error(self):
+        with mock.patch.object(EntryViewSet, 'create', side_effect=RuntimeError('boom')), \
+                self.assertLogs('django.request', 'ERROR'):
+            for _ in range(3):
+                with self.assertRaises(RuntimeError):
+                    self.upload(png())
+        slots = [acquire_upload_slot(self.user.pk) for _ in range(2)]
+        for slot in slots:
+            release_upload_slot(self.user.pk, slot)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'advisory locks are PostgreSQL-only')
+    def test_slots_are_shared_between_connections(self):
+        slots = [acquire_upload_slot(self.user.pk) for _ in range(2)]
+        self.addCleanup(lambda: [release_upload_slot(self.user.pk, slot) for slot in slots])
+        result = []
+
+        def other_worker():
+            # Другой процесс: своё соединение и свой учёт занятых слотов
+            try:
+                with mock.patch.object(uploads, '_held_slots', set()):
+                    acquire_upload_slot(self.user.pk)
+                result.append('acquired')
+            except Throttled:
+                result.append('throttled')
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        thread.join(5)
+        self.assertEqual(result, ['throttled'])
+
+
+class DatabaseHealthTests(TestCase):
+    def test_pool_stats_without_pool(self):
+        User.objects.exists()
+        stats = pool_stats()['default']
+        self.assertEqual(stats, {
+            'pooled': False,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'connected': True,
+        })
+
+    def test_pool_stats_with_pool(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {
+            'pool_min': 1, 'pool_max': 4, 'pool_size': 3, 'pool_available': 1,
+            'requests_num': 4, 'requests_wait_ms': 10,
+        }
+        with mock.patch('backend.db.connections') as connections_mock:
+            connections_mock.all.return_value = [mock.Mock(alias='default', pool=pool)]
+            stats = pool_stats()['default']
+        self.assertEqual(stats, {
+            'pooled': True, 'min_size': 1, 'max_size': 4, 'size': 3, 'in_use': 2, 'idle': 1,
+            'waiting': 0, 'requests': 4, 'wait_ms_total': 10, 'wait_ms_avg': 2.5,
+            'timeouts': 0, 'connections_lost': 0,
+        })
+
+    def test_health_endpoint_is_admin_only(self):
+        client = APIClient()
+        self.assertIn(client.get('/api/health/db/').status_code, (401, 403))
+        client.force_authenticate(User.objects.create_user(username='u', email='u@u.ru', password='pass12345!X'))
+        self.assertEqual(client.get('/api/health/db/').status_code, 403)
+        client.force_authenticate(User.objects.create_superuser(username='a', email='a@a.ru', password='pass12345!X'))
+        data = client.get('/api/health/db/').json()
+        self.assertEqual(data['pid'], os.getpid())
+        self.assertIn('default', data['databases'])
+
+    def test_warm_up_opens_thread_connection_only_when_asked(self):
+        plain = mock.Mock(pool=None)
+        pooled = mock.Mock()
+        with mock.patch('backend.db.connections') as connections_mock:
+            connections_mock.all.return_value = [plain, pooled]
+            warm_up()
+            plain.ensure_connection.assert_not_called()
+            pooled.pool.wait.assert_called_once()
+
+            warm_up(thread_connections=True)
+            plain.ensure_connection.assert_called_once()
+
+            with self.settings(DB_WARMUP=False):
+                warm_up(thread_connections=True)
+            plain.ensure_connection.assert_called_once()
+
+
+def read_db(request):
+    """Куда роутер отправит чтение; запрос выполняется по-настоящему."""
+    User.objects.count()
+    return HttpResponse(User.objects.all().db)
+
+
+def write_then_read_db(request):
+    User.objects.filter(pk=0).update(remind_pin=True)
+    return HttpResponse(User.objects.all().db)
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        override = override_settings(DATABASE_REPLICAS=['replica1'])
+        override.enable()
+        self.addCleanup(override.disable)
+        shared_cache(self)
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='u', email='u@u.ru', password='pass12345!X')
+
+    def request(self, view, method='get', user=None, **extra):
+        if user is not None:
+            extra['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return ReplicaRoutingMiddleware(view)(getattr(self.factory, method)('/', **extra))
+
+    def test_safe_request_reads_from_replica(self):
+        with CaptureQueriesContext(connections['replica1']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            response = self.request(read_db)
+        self.assertEqual(response.content, b'replica1')
+        self.assertEqual(len(replica), 1)
+        self.assertEqual(len(primary), 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_request_uses_primary(self):
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.request(read_db, method='post')
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(len(replica), 0)
+        # Без записи клиент не закрепляется
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_goes_to_primary_and_pins_request(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(User), 'default')
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.request(write_then_read_db)
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(len(replica), 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        self.factory.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.request(read_db).content, b'default')
+
+    def test_read_your_writes_across_requests_by_token(self):
+        other = User.objects.create_user(username='o', email='o@o.ru', password='pass12345!X')
+        self.request(write_then_read_db, user=self.user)
+        # Новый запрос без cookie (другой клиент), но с тем же пользователем
+        self.assertEqual(self.request(read_db, user=self.user).content, b'default')
+        self.assertEqual(self.request(read_db, user=other).content, b'replica1')
+        with self.settings(DATABASE_REPLICA_PIN_SECONDS=0):
+            self.request(write_then_read_db, user=other)
+        self.assertEqual(self.request(read_db, user=other).content, b'replica1')
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(User), 'default')
+        self.assertEqual(User.objects.all().db, 'default')
+
+    def test_requires_shared_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaRoutingMiddleware(read_db)
+            with self.settings(DATABASE_REPLICAS=[]):
+                ReplicaRoutingMiddleware(read_db)
+
+
+class QueryCacheTests(TestCase):
+    def setUp(self):
+        shared_cache(self)
+        self.review = Review.objects.create(text='ok', rating=5)
+
+    def assertCached(self, queryset):
+        """Первое чтение идёт в БД, повторное — из кэша."""
+        with self.assertNumQueries(1):
+            rows = list(queryset.all())
+        with self.assertNumQueries(0):
+            self.assertEqual(list(queryset.all()), rows)
+        return rows
+
+    def test_cached_until_save(self):
+        self.assertCached(Review.objects.cache())
+        self.review.rating = 4
+        self.review.save()
+        self.assertEqual(self.assertCached(Review.objects.cache())[0].rating, 4)
+
+    def test_update_invalidates(self):
+        self.assertCached(Review.objects.cache())
+        Review.objects.update(rating=1)
+        self.assertEqual(self.assertCached(Review.objects.cache())[0].rating, 1)
+
+    def test_bulk_update_invalidates(self):
+        self.assertCached(Review.objects.cache())
+        self.review.rating = 2
+        Review.objects.bulk_update([self.review], ['rating'])
+        self.assertEqual(self.assertCached(Review.objects.cache())[0].rating, 2)
+
+    def test_count_cached_and_invalidated_by_delete(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Review.objects.cache().count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(Review.objects.cache().count(), 1)
+        self.review.delete()
+        self.assertEqual(Review.objects.cache().count(), 0)
+
+    def test_joined_table_invalidates(self):
+        user = User.objects.create_user(username='u', email='u@u.ru', password='pass12345!X')
+        Entry.objects.create(user=user, content='text', is_public=True)
+        entries = Entry.objects.select_related('user').cache()
+        self.assertCached(entries)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.assertCached(entries)[0].user.username, 'renamed')
+
+    def test_unrelated_models_skip_invalidation(self):
+        with mock.patch.object(querycache, 'invalidate_model') as invalidate:
+            Job.objects.create(name='noop')
+            invalidate.assert_not_called()
+            Review.objects.create(text='ok', rating=3)
+            invalidate.assert_called_once_with(Review)
+
+    def test_local_cache_disables_caching(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    list(Review.objects.cache())
+
+
+@override_settings(SERVER_TIMING=True, PROFILE_VIEWS=[])
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        Review.objects.create(text='ok', rating=5)
+
+    def phases(self, response):
+        return {part.split(';')[0]: part for part in response['Server-Timing'].split(', ')}
+
+    def test_header_phases_and_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reviews/')
+        phases = self.phases(response)
+        self.assertEqual(set(phases), {'auth', 'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', phases['db'])
+
+    def test_no_queries_no_db_phase(self):
+        response = self.client.get('/api/users/nonexistent-route/')
+        self.assertNotIn('db', self.phases(response))
+
+    def test_header_disabled(self):
+        with self.settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get('/api/reviews/'))
+
+    def test_hooks_installed_once(self):
+        timing.install_hooks()
+        self.assertFalse(hasattr(APIView.initial.__wrapped__, '__wrapped__'))
+
+    def test_sampled_request_writes_profile(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        with self.settings(PROFILE_VIEWS=['review-list-create'], PROFILE_SAMPLE_RATE=1.0, PROFILE_DIR=path):
+            self.client.get('/api/reviews/')
+            self.client.get('/admin/login/')
+        self.assertEqual(len(os.listdir(path)), 1)
+        self.assertTrue(os.listdir(path)[0].startswith('review-list-create-'))
+
+    def test_unsampled_request_writes_nothing(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        with self.settings(PROFILE_VIEWS=['*'], PROFILE_SAMPLE_RATE=0.0, PROFILE_DIR=path):
+            self.client.get('/api/reviews/')
+        self.assertEqual(os.listdir(path), [])
+
+
+def metric(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', email='u@u.ru', password='pass12345!X')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_routes_are_labelled_by_pattern(self):
+        entry = Entry.objects.create(user=self.user, content='text')
+        route = '/api/entries/(?P<pk>[^/.]+)/'
+        before = metric('http_requests_total', method='GET', route=route, status='200')
+        queries = metric('db_queries_total', route=route)
+        self.client.get(f'/api/entries/{entry.pk}/')
+        self.assertEqual(metric('http_requests_total', method='GET', route=route, status='200'), before + 1)
+        self.assertGreater(metric('db_queries_total', route=route), queries)
+
+        before = metric('http_requests_total', method='GET', route='unmatched', status='404')
+        self.client.get('/no/such/path/')
+        self.assertEqual(metric('http_requests_total', method='GET', route='unmatched', status='404'), before + 1)
+
+    def test_domain_counters(self):
+        entries = metric('entries_created_total')
+        emotions = metric('emotions_logged_total', emotion_type='joy')
+        likes = metric('likes_toggled_total', action='like')
+        unlikes = metric('likes_toggled_total', action='unlike')
+        entry = Entry.objects.create(user=self.user, content='text')
+        entry.save()
+        Emotion.objects.create(user=self.user, emotion_type='joy')
+        Like.objects.create(user=self.user, entry=entry).delete()
+        self.assertEqual(metric('entries_created_total'), entries + 1)
+        self.assertEqual(metric('emotions_logged_total', emotion_type='joy'), emotions + 1)
+        self.assertEqual(metric('likes_toggled_total', action='like'), likes + 1)
+        self.assertEqual(metric('likes_toggled_total', action='unlike'), unlikes + 1)
+
+    @override_settings(METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_requests_total', response.content)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_without_token_only_in_debug(self):
+        with self.settings(DEBUG=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class CompressedTextFieldTests(TestCase):
+    TEXT = 'Сегодня был хороший день. ' * 40
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', email='u@u.ru', password='pass12345!X')
+        self.entry = Entry.objects.create(user=self.user, content=self.TEXT)
+
+    def test_round_trip(self):
+        short = compress_text('привет', min_bytes=256)
+        self.assertEqual(short[0], PLAIN)
+        self.assertEqual(decompress_text(short), 'привет')
+        packed = compress_text(self.TEXT, min_bytes=256)
+        self.assertEqual(packed[0], ZLIB)
+        self.assertLess(len(packed), len(self.TEXT.encode()))
+        self.assertEqual(decompress_text(memoryview(packed)), self.TEXT)
+        self.assertEqual(decompress_text(b''), '')
+
+    def test_incompressible_text_stored_plain(self):
+        text = 'qwertyuiopasdfgh'
+        packed = compress_text(text, min_bytes=1)
+        self.assertEqual(packed, bytes([PLAIN]) + text.encode())
+
+    def test_decoded_lazily_once(self):
+        entry = Entry.objects.get(pk=self.entry.pk)
+        self.assertIsInstance(entry.__dict__['content'], PackedText)
+        with mock.patch.object(fields, 'decompress_text', wraps=decompress_text) as decompress:
+            self.assertEqual(entry.content, self.TEXT)
+            self.assertEqual(entry.content, self.TEXT)
+        decompress.assert_called_once()
+
+    def test_deferred_content(self):
+        entry = Entry.objects.defer('content').get(pk=self.entry.pk)
+        self.assertNotIn('content', entry.__dict__)
+        with self.assertNumQueries(1):
+            self.assertEqual(entry.content, self.TEXT)
+
+    def test_values_return_packed_text(self):
+        value = Entry.objects.values('content').get(pk=self.entry.pk)['content']
+        self.assertIsInstance(value, PackedText)
+        self.assertEqual(to_text(value), self.TEXT)
+        [value] = Entry.objects.filter(pk=self.entry.pk).values_list('content', flat=True)
+        self.assertEqual(to_text(value), self.TEXT)
+        self.assertIsNone(to_text(None))
+
+    def test_save_without_reading_content(self):
+        stored = bytes(Entry.objects.values_list('content', flat=True).get(pk=self.entry.pk))
+        entry = Entry.objects.get(pk=self.entry.pk)
+        entry.title = 'Новое название'
+        with mock.patch.object(fields, 'decompress_text') as decompress, \
+                mock.patch.object(fields, 'compress_text') as compress:
+            entry.save()
+        decompress.assert_not_called()
+        compress.assert_not_called()
+        row = Entry.objects.values('title', 'content', 'search_text').get(pk=self.entry.pk)
+        self.assertEqual(row['title'], 'Новое название')
+        self.assertEqual(bytes(row['content']), stored)
+        self.assertEqual(row['search_text'], self.TEXT.strip())
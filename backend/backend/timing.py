@@ -0,0 +1,170 @@
+import cProfile
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Замер фаз запроса: аутентификация и права (APIView.initial), запросы к БД,
+# сериализация (serializer.data) и рендеринг (Response.rendered_content).
+# Итог уходит в заголовок Server-Timing и в лог как структурированная запись.
+# Фазы могут пересекаться: время БД входит и в сериализацию, и в view.
+
+_timings = ContextVar('timings', default=None)
+_hooks_installed = False
+
+
+class Timings:
+    def __init__(self):
+        self.phases = {}
+        self.active = set()
+        self.queries = 0
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+def current_timings():
+    """Замеры текущего запроса или None вне ServerTimingMiddleware."""
+    return _timings.get()
+
+
+@contextmanager
+def phase(name):
+    """Добавляет время блока к фазе name текущего запроса; вложенные вызовы не удваивают время."""
+    timings = _timings.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.add(name, time.perf_counter() - start)
+
+
+def _timed(name, func):
+    def wrapper(*args, **kwargs):
+        with phase(name):
+            return func(*args, **kwargs)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def install_hooks():
+    """
+    Оборачивает точки DRF, через которые проходит любой API-запрос. Меняет классы
+    на весь процесс, поэтому вызывается из BackendConfig.ready(); повторный
+    вызов ничего не делает.
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+    APIView.initial = _timed('auth', APIView.initial)
+    # Serializer.data и ListSerializer.data вызывают BaseSerializer.data через super()
+    BaseSerializer.data = property(_timed('serialize', BaseSerializer.data.fget))
+    Response.rendered_content = property(_timed('render', Response.rendered_content.fget))
+
+
+def _db_timer(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    timings.queries += 1
+    with phase('db'):
+        return execute(sql, params, many, context)
+
+
+def server_timing_header(timings, total):
+    parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.phases.items()]
+    if timings.queries:
+        parts = [part + f';desc="{timings.queries} queries"' if part.startswith('db;') else part for part in parts]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class ServerTimingMiddleware:
+    """
+    Меряет фазы каждого запроса. SERVER_TIMING включает заголовок в ответе,
+    PROFILE_VIEWS и PROFILE_SAMPLE_RATE — cProfile для доли запросов к
+    выбранным view с сохранением .prof в PROFILE_DIR. Фазы DRF замеряются
+    обёртками из install_hooks().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with _execute_wrappers(_db_timer):
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+            profiler = getattr(request, '_profiler', None)
+            if profiler is not None:
+                profiler.disable()
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        if profiler is not None:
+            self.dump_profile(profiler, view)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing_header(timings, total)
+        logger.info(
+            'request timing',
+            extra={
+                'view': view,
+                'method': request.method,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'queries': timings.queries,
+                **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in timings.phases.items()},
+            },
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        views = settings.PROFILE_VIEWS
+        view = request.resolver_match.view_name
+        if not views or ('*' not in views and view not in views) or random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В процессе уже работает другой профилировщик (соседний поток)
+            return None
+        request._profiler = profiler
+        return None
+
+    def dump_profile(self, profiler, view):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = f'{(view or "unknown").replace(":", "_")}-{time.time_ns()}-{os.getpid()}.prof'
+        path = os.path.join(settings.PROFILE_DIR, name)
+        profiler.dump_stats(path)
+        logger.info('profile saved', extra={'view': view, 'path': path})
+
+
+@contextmanager
+def _execute_wrappers(wrapper):
+    # Соединения создаются лениво, поэтому оборачиваются все алиасы (и реплики)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        yield
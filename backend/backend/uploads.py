@@ -0,0 +1,190 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled, ValidationError
+
+from .cache import is_shared
+
+# В проекте загружаются только изображения (обложки записей и фото профиля),
+# поэтому обработчик подключён для всех загрузок. Файл сразу пишется во
+# временный файл на диске, заголовок проверяется по первому фрагменту, а
+# размер — по мере чтения, так что в памяти держится только текущий фрагмент.
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+NOT_AN_IMAGE = 'Файл не является изображением (JPEG, PNG, GIF или WebP).'
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой.'
+    default_code = 'upload_too_large'
+
+
+def sniff_image(head):
+    """Формат изображения по первым байтам или None."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, kind in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+def check_image(uploaded):
+    """
+    Проверяет, что файл открывается как изображение и не слишком велик по
+    разрешению. Pillow читает только заголовок, пиксели не декодируются.
+    Уменьшение делает фоновая задача blobs.jobs.shrink_stored_image.
+    """
+    from PIL import Image  # Pillow нужен только при загрузке, не при старте
+
+    with Image.open(uploaded.temporary_file_path()) as image:
+        width, height = image.size
+    if width * height > settings.UPLOAD_IMAGE_MAX_PIXELS:
+        raise UploadTooLarge('Слишком большое разрешение изображения.')
+    return uploaded
+
+
+def shrink_image(path, destination):
+    """
+    Уменьшает изображение path до UPLOAD_IMAGE_MAX_DIMENSION по большей
+    стороне и пишет в destination. Для JPEG thumbnail() декодирует сразу в
+    уменьшенном масштабе (draft). Возвращает False, если уменьшать не нужно.
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        limit = settings.UPLOAD_IMAGE_MAX_DIMENSION
+        # Анимацию не пересжимаем, чтобы не потерять кадры
+        if max(image.size) <= limit or getattr(image, 'n_frames', 1) > 1:
+            return False
+        image_format = image.format
+        image.thumbnail((limit, limit))
+        options = {'quality': 85, 'optimize': True} if image_format in ('JPEG', 'WEBP') else {}
+        image.save(destination, format=image_format, **options)
+    return True
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Потоковая загрузка изображений с проверкой формата и размера."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Заведомо слишком большой запрос отклоняем до чтения тела
+        if content_length > settings.UPLOAD_IMAGE_MAX_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        # Хеш для хранилища по содержимому считается по ходу чтения
+        self.hasher = hashlib.sha256()
+
+    def _reject(self, exc):
+        self.file.close()
+        raise exc
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and sniff_image(raw_data[:12]) is None:
+            self._reject(ValidationError({self.field_name: [NOT_AN_IMAGE]}))
+        if start + len(raw_data) > settings.UPLOAD_IMAGE_MAX_SIZE:
+            self._reject(UploadTooLarge())
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            return check_image(uploaded)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            self._reject(ValidationError({self.field_name: [NOT_AN_IMAGE]}))
+
+
+# Слоты одновременных загрузок пользователя должны быть общими для всех
+# воркеров. С общим кэшем это счётчик в кэше; без него на PostgreSQL — N
+# сессионных advisory-блокировок (слот занят, пока соединение держит
+# блокировку, и освобождается, даже если воркер упал). Кэш в памяти процесса
+# остаётся только для SQLite, т.е. разработки в одном процессе.
+UPLOAD_LOCK_SPACE = 0x5550
+# Сессионная блокировка повторно берётся тем же соединением, поэтому слоты,
+# занятые этим процессом, учитываются отдельно
+_held_slots = set()
+_held_lock = threading.Lock()
+
+
+def _slot_key(user_id):
+    return f'upload:slots:{user_id}'
+
+
+def _slot_connection():
+    from users.models import User
+
+    connection = connections[router.db_for_write(User)]
+    return connection if connection.vendor == 'postgresql' and not is_shared() else None
+
+
+def acquire_upload_slot(user_id):
+    """Занимает слот загрузки или бросает Throttled. Номер слота (на PostgreSQL) нужен release_upload_slot."""
+    connection = _slot_connection()
+    if connection is not None:
+        with _held_lock, connection.cursor() as cursor:
+            for slot in range(settings.UPLOAD_MAX_CONCURRENT_PER_USER):
+                if (user_id, slot) in _held_slots:
+                    continue
+                cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [UPLOAD_LOCK_SPACE + slot, user_id % 2 ** 31])
+                if cursor.fetchone()[0]:
+                    _held_slots.add((user_id, slot))
+                    return slot
+    else:
+        key = _slot_key(user_id)
+        # Таймаут страхует от слотов, не освобождённых из-за падения воркера
+        cache.add(key, 0, settings.UPLOAD_SLOT_TIMEOUT)
+        if cache.incr(key) <= settings.UPLOAD_MAX_CONCURRENT_PER_USER:
+            return None
+        cache.decr(key)
+    raise Throttled(detail='Слишком много одновременных загрузок.', wait=1)
+
+
+def release_upload_slot(user_id, slot=None):
+    connection = _slot_connection()
+    if connection is not None:
+        with _held_lock, connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [UPLOAD_LOCK_SPACE + slot, user_id % 2 ** 31])
+            _held_slots.discard((user_id, slot))
+        return
+    try:
+        cache.decr(_slot_key(user_id))
+    except ValueError:
+        pass
+
+
+class UploadSlotMixin:
+    """Ограничивает число одновременных multipart-запросов одного пользователя."""
+
+    _upload_slot = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.content_type.startswith('multipart/') and request.user.is_authenticated:
+            self._upload_slot = (request.user.pk, acquire_upload_slot(request.user.pk))
+
+    def dispatch(self, request, *args, **kwargs):
+        # finally: слот освобождается и при необработанном исключении
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._upload_slot is not None:
+                release_upload_slot(*self._upload_slot)
+                self._upload_slot = None
@@ -1,7 +1,10 @@
 from django.contrib import admin
-from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+from django.urls import path, include, re_path
+from blobs.views import serve_blob
+from .batch import batch
+from .media import serve_media
+from .metrics import metrics_view
+from .views import db_stats, query_cache
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,4 +14,10 @@ urlpatterns = [
     path('api/reviews/', include('reviews.urls')),
     path('api/like/', include('like.urls')),
     path('api/comments/', include('comments.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/health/db/', db_stats, name='db-stats'),
+    path('api/batch/', batch, name='batch'),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/health/querycache/', query_cache, name='query-cache-stats'),
+    re_path(r'^media/(?P<name>blobs/[0-9a-f]{2}/[0-9a-f]{64}(?:\.[a-z0-9]+)?)$', serve_blob, name='blob'),
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='media'),
+]
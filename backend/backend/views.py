@@ -0,0 +1,22 @@
+import os
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .db import pool_stats
+from .querycache import query_cache_stats
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_stats(request):
+    """Статистика соединений с БД для мониторинга (по процессу, который ответил)."""
+    return Response({'pid': os.getpid(), 'databases': pool_stats()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def query_cache(request):
+    """Попадания и промахи кэша запросов по моделям (по процессу, который ответил)."""
+    return Response({'pid': os.getpid(), 'models': query_cache_stats()})
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Blob
+
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'refcount', 'created_at')
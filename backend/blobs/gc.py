@@ -0,0 +1,64 @@
+import hashlib
+import os
+import time
+
+from .signals import TRACKED_FIELDS
+
+# Готовые обложки из covers/ выбираются на фронтенде и в БД не ссылаются
+PROTECTED_PREFIXES = ('covers/',)
+
+
+def path_key(name):
+    """64-битный ключ пути: множество таких чисел в разы компактнее множества строк."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'little')
+
+
+def referenced_keys(chunk_size=5000):
+    """Ключи всех путей, на которые ссылаются файловые поля, без загрузки моделей."""
+    keys = set()
+    for model, fields in TRACKED_FIELDS.items():
+        for field in fields:
+            names = (
+                model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True)
+                .iterator(chunk_size=chunk_size)
+            )
+            keys.update(map(path_key, names))
+    return keys
+
+
+def walk_files(root):
+    """Обходит дерево через os.scandir, отдавая (относительный путь, DirEntry)."""
+    stack = ['']
+    while stack:
+        prefix = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, prefix)) as entries:
+                for entry in entries:
+                    name = f'{prefix}{entry.name}'
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(f'{name}/')
+                    elif entry.is_file(follow_symlinks=False):
+                        yield name, entry
+        except FileNotFoundError:
+            continue
+
+
+def find_orphans(root, keys, grace_seconds, progress=None, progress_every=10000):
+    """
+    Отдаёт (путь, размер) файлов без ссылок из БД, не менявшихся grace_seconds.
+    Совпадение ключей при коллизии хеша лишь оставляет файл на месте.
+    """
+    cutoff = time.time() - grace_seconds
+    scanned = 0
+    for name, entry in walk_files(root):
+        scanned += 1
+        if progress and scanned % progress_every == 0:
+            progress(scanned)
+        if name.startswith(PROTECTED_PREFIXES) or path_key(name) in keys:
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime <= cutoff:
+            yield name, stat.st_size
+    if progress:
+        progress(scanned)
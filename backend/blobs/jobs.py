@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management import call_command
+from django.db import transaction
+
+from backend.uploads import shrink_image
+from tasks.registry import task
+
+
+@task(queue='media')
+def shrink_stored_image(model_label, pk, field_name):
+    """
+    Уменьшает сохранённое изображение и подменяет файл в поле. Если поле
+    успели изменить, пока шла задача, новое значение не перезаписывается.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name):
+        return
+    field_file = getattr(instance, field_name)
+    name = field_file.name
+    storage = field_file.storage
+
+    with tempfile.TemporaryFile() as resized:
+        if not shrink_image(storage.path(name), resized):
+            return
+        resized.seek(0)
+        new_name = storage.save(name, File(resized, name=os.path.basename(name)))
+
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(pk=pk).first()
+        if instance is None or getattr(instance, field_name).name != name:
+            return
+        setattr(instance, field_name, new_name)
+        update_fields = [field_name]
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            update_fields.append('updated_at')
+        # save(), а не update(): сигналы пересчитают ссылки на blob и сбросят кэши
+        instance.save(update_fields=update_fields)
+
+
+def shrink_later(instance, field_name):
+    shrink_stored_image.delay(instance._meta.label, instance.pk, field_name)
+
+
+@task(queue='maintenance', max_attempts=1)
+def collect_orphans():
+    call_command('collect_orphaned_media', verbosity=0)
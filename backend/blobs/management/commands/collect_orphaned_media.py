@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+from blobs.gc import find_orphans, referenced_keys
+from blobs.models import Blob
+from blobs.storage import is_blob
+
+BLOB_BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = 'Находит и удаляет файлы в MEDIA_ROOT, на которые не ссылается ни одна запись в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Не трогать файлы, изменённые за последние N часов')
+        parser.add_argument('--progress-every', type=int, default=10000,
+                            help='Как часто сообщать о числе просмотренных файлов')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        if options['grace_hours'] < 0:
+            raise CommandError('--grace-hours не может быть отрицательным')
+
+        keys = referenced_keys()
+        self.stdout.write(f'Путей, на которые есть ссылки: {len(keys)}')
+
+        def progress(count):
+            self.stdout.write(f'Просмотрено файлов: {count}')
+
+        storage = storages['default']
+        dry_run = options['dry_run']
+        orphans = find_orphans(
+            settings.MEDIA_ROOT, keys, options['grace_hours'] * 3600,
+            progress=progress, progress_every=options['progress_every'],
+        )
+        count = 0
+        total_size = 0
+        blob_names = []
+        for name, size in orphans:
+            count += 1
+            total_size += size
+            if options['verbosity'] > 1 or dry_run:
+                self.stdout.write(f'{"Будет удалён" if dry_run else "Удалён"}: {name} ({size} байт)')
+            if dry_run:
+                continue
+            storage.delete(name)
+            if is_blob(name):
+                blob_names.append(name)
+                if len(blob_names) >= BLOB_BATCH:
+                    Blob.objects.filter(name__in=blob_names).delete()
+                    blob_names.clear()
+        if blob_names:
+            Blob.objects.filter(name__in=blob_names).delete()
+
+        verb = 'Найдено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов без ссылок: {count}, {total_size / 1024 / 1024:.1f} МБ'))
@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """Файл в хранилище по содержимому и число ссылок на него из моделей."""
+
+    name = models.CharField(max_length=255, unique=True)  # blobs/ab/<sha256>.<ext>
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
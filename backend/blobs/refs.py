@@ -0,0 +1,37 @@
+from django.core.files.storage import storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Blob
+from .storage import is_blob
+
+
+def retain(name):
+    """Добавляет ссылку на blob; строка создаётся при первой ссылке."""
+    if not is_blob(name):
+        return
+    if Blob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+        return
+    storage = storages['default']
+    try:
+        with transaction.atomic():
+            Blob.objects.create(name=name, size=storage.size(name), refcount=1)
+    except IntegrityError:
+        Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release(name):
+    """Убирает ссылку; blob без ссылок удаляется вместе с файлом после коммита."""
+    if not is_blob(name):
+        return
+    Blob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+    deleted, _ = Blob.objects.filter(name=name, refcount=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: _delete_file(name))
+
+
+def _delete_file(name):
+    storage = storages['default']
+    # Файл мог снова понадобиться, пока транзакция коммитилась
+    if hasattr(storage, 'delete_if_stale') and not Blob.objects.filter(name=name).exists():
+        storage.delete_if_stale(name)
@@ -0,0 +1,52 @@
+from django.db.models.signals import post_delete, post_init, post_save
+
+from entries.models import Entry
+from users.models import User
+from .refs import release, retain
+
+# Файловые поля, ссылки из которых учитываются в Blob.refcount
+TRACKED_FIELDS = {
+    Entry: ('cover_image',),
+    User: ('profile_photo',),
+}
+
+
+def _loaded_names(instance, fields):
+    """Имена файлов загруженных полей; отложенные (defer/only) поля пропускаются."""
+    names = {}
+    for field in fields:
+        if field in instance.__dict__:
+            value = instance.__dict__[field]
+            names[field] = getattr(value, 'name', value) or None
+    return names
+
+
+def remember_names(sender, instance, **kwargs):
+    instance._blob_names = _loaded_names(instance, TRACKED_FIELDS[sender])
+
+
+def update_refs(sender, instance, update_fields=None, **kwargs):
+    known = getattr(instance, '_blob_names', {})
+    current = _loaded_names(instance, TRACKED_FIELDS[sender])
+    for field, name in current.items():
+        if update_fields is not None and field not in update_fields:
+            continue
+        if field in known:
+            if known[field] == name:
+                continue
+            release(known[field])
+        if name:
+            retain(name)
+    instance._blob_names = {**known, **current}
+
+
+def drop_refs(sender, instance, **kwargs):
+    for name in _loaded_names(instance, TRACKED_FIELDS[sender]).values():
+        if name:
+            release(name)
+
+
+for model in TRACKED_FIELDS:
+    post_init.connect(remember_names, sender=model)
+    post_save.connect(update_refs, sender=model)
+    post_delete.connect(drop_refs, sender=model)
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+from backend.uploads import sniff_image
+
+BLOB_PREFIX = 'blobs/'
+# Расширение blob берётся из формата, определённого по содержимому, а не из
+# имени файла клиента: одинаковые байты получают одно имя, а .html/.svg в
+# хранилище не попадают
+IMAGE_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def file_digest(content):
+    """sha256 содержимого: берётся посчитанный при загрузке или считается по фрагментам."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def sniff_extension(content):
+    content.seek(0)
+    head = content.read(12)
+    content.seek(0)
+    return IMAGE_EXTENSIONS.get(sniff_image(head), '')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранит каждый файл один раз под именем blobs/ab/<sha256><расширение>.
+    Повторная загрузка того же содержимого не пишет файл, а возвращает
+    существующее имя; поэтому URL неизменяемы и кэшируются навсегда.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменяется хешем в _save, проверять занятость незачем
+        return name
+
+    def blob_name(self, name, content):
+        digest = file_digest(content)
+        return f'{BLOB_PREFIX}{digest[:2]}/{digest}{sniff_extension(content)}'
+
+    def _save(self, name, content):
+        name = self.blob_name(name, content)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Свежий mtime защищает файл от удаления, пока новая ссылка не сохранена
+            os.utime(full_path)
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Пишем во временный файл рядом и атомарно переименовываем: при гонке
+        # двух одинаковых загрузок содержимое всё равно совпадает
+        temp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        if hasattr(content, 'temporary_file_path'):
+            file_move_safe(content.temporary_file_path(), temp_path)
+        else:
+            with open(temp_path, 'wb') as destination:
+                for chunk in content.chunks():
+                    destination.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp_path, self.file_permissions_mode)
+        os.replace(temp_path, full_path)
+        return name
+
+    def delete_if_stale(self, name):
+        """Удаляет файл, если его не трогали BLOB_DELETE_GRACE секунд."""
+        try:
+            if time.time() - os.path.getmtime(self.path(name)) >= settings.BLOB_DELETE_GRACE:
+                self.delete(name)
+        except FileNotFoundError:
+            pass
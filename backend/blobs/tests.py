@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from entries.models import Entry
+from users.models import User
+from .gc import find_orphans, path_key, referenced_keys
+from .models import Blob
+
+COVER = b'\x89PNG\r\n\x1a\n' + b'cover' * 100
+
+
+def cover():
+    return SimpleUploadedFile('cover.png', COVER, content_type='image/png')
+
+
+class BlobTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root, BLOB_DELETE_GRACE=0)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+
+    def file_exists(self, name):
+        return os.path.exists(storages['default'].path(name))
+
+
+class RefcountTests(BlobTestCase):
+    def test_shared_image_survives_deleting_one_row(self):
+        first = Entry.objects.create(user=self.user, title='a', cover_image=cover())
+        second = Entry.objects.create(user=self.user, title='b', cover_image=cover())
+        name = first.cover_image.name
+        self.assertEqual(second.cover_image.name, name)
+        self.assertEqual(Blob.objects.get(name=name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+        self.assertTrue(self.file_exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+        self.assertFalse(self.file_exists(name))
+
+    def test_replacing_cover_releases_old_blob(self):
+        entry = Entry.objects.create(user=self.user, title='a', cover_image=cover())
+        old = entry.cover_image.name
+        entry.cover_image = SimpleUploadedFile('other.png', COVER + b'!', content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertFalse(Blob.objects.filter(name=old).exists())
+        self.assertEqual(Blob.objects.get(name=entry.cover_image.name).refcount, 1)
+
+
+class BlobNameTests(BlobTestCase):
+    def test_extension_comes_from_content(self):
+        storage = storages['default']
+        names = {
+            storage.save(name, SimpleUploadedFile(name, COVER))
+            for name in ('a.png', 'b.PNG', 'c.html', 'd')
+        }
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().endswith('.png'))
+        self.assertEqual(os.path.splitext(storage.save('e.svg', SimpleUploadedFile('e.svg', b'<svg/>')))[1], '')
+
+    @override_settings(MEDIA_ACCEL=None)
+    def test_served_type_is_not_taken_from_client_extension(self):
+        digest = 'ab' + '0' * 62
+        for extension, expected in (('.png', 'image/png'), ('.html', 'application/octet-stream'),
+                                    ('.svg', 'application/octet-stream')):
+            with self.subTest(extension=extension):
+                name = f'blobs/ab/{digest}{extension}'
+                path = storages['default'].path(name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(b'<html><script>alert(1)</script>')
+                response = self.client.get(f'/media/{name}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], expected)
+                self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+                response.close()
+
+
+class CollectOrphanedMediaTests(BlobTestCase):
+    def write(self, name, age=48 * 3600):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x')
+        past = time.time() - age
+        os.utime(path, (past, past))
+        return path
+
+    def test_dry_run_deletes_nothing(self):
+        entry = Entry.objects.create(user=self.user, title='a', cover_image=cover())
+        orphan = self.write('entries/covers/orphan.png')
+        orphan_blob = self.write('blobs/ab/abcdef.png')
+        Blob.objects.create(name='blobs/ab/abcdef.png', refcount=0)
+
+        out = StringIO()
+        call_command('collect_orphaned_media', '--dry-run', '--grace-hours=0', stdout=out)
+        self.assertIn('entries/covers/orphan.png', out.getvalue())
+        self.assertTrue(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(orphan_blob))
+        self.assertTrue(self.file_exists(entry.cover_image.name))
+        self.assertTrue(Blob.objects.filter(name='blobs/ab/abcdef.png').exists())
+
+    def test_removes_only_unreferenced_old_files(self):
+        entry = Entry.objects.create(user=self.user, title='a', cover_image=cover())
+        orphan = self.write('entries/covers/orphan.png')
+        fresh = self.write('entries/covers/fresh.png', age=0)
+        protected = self.write('covers/builtin.png')
+
+        call_command('collect_orphaned_media', '--grace-hours=24', stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(protected))
+        self.assertTrue(self.file_exists(entry.cover_image.name))
+
+    def test_orphaned_blob_row_is_removed_with_file(self):
+        orphan_blob = self.write('blobs/ab/abcdef.png')
+        Blob.objects.create(name='blobs/ab/abcdef.png', refcount=0)
+        call_command('collect_orphaned_media', '--grace-hours=1', stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan_blob))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_negative_grace_is_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('collect_orphaned_media', '--grace-hours=-1', stdout=StringIO())
+
+
+class FindOrphansTests(BlobTestCase):
+    def test_referenced_keys_cover_all_file_fields(self):
+        entry = Entry.objects.create(user=self.user, title='a', cover_image=cover())
+        self.user.profile_photo = 'profile_photos/alice.png'
+        self.user.save()
+        Entry.objects.create(user=self.user, title='no cover')
+        self.assertEqual(referenced_keys(chunk_size=1),
+                         {path_key(entry.cover_image.name), path_key('profile_photos/alice.png')})
+
+    def test_walks_nested_directories(self):
+        for name in ('a.png', 'x/b.png', 'x/y/c.png', 'covers/d.png'):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'12345')
+        seen = []
+        orphans = sorted(find_orphans(self.media_root, {path_key('x/b.png')}, -1, progress=seen.append,
+                                      progress_every=2))
+        self.assertEqual(orphans, [('a.png', 5), ('x/y/c.png', 5)])
+        self.assertEqual(seen, [2, 4, 4])
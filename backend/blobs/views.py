@@ -0,0 +1,23 @@
+import mimetypes
+import os
+
+from django.core.files.storage import storages
+from django.views.decorators.http import require_safe
+
+from backend.media import file_response
+
+# Имя blob содержит хеш содержимого, поэтому ответ можно кэшировать навсегда
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Тип отдаётся только для изображений; у blob'ов, сохранённых до определения
+# формата по содержимому, расширение могло прийти от клиента (.html, .svg)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+@require_safe
+def serve_blob(request, name):
+    digest, extension = os.path.splitext(os.path.basename(name))
+    content_type = mimetypes.guess_type(name)[0] if extension in IMAGE_EXTENSIONS else 'application/octet-stream'
+    return file_response(
+        request, storages['default'].path(name), name,
+        etag=f'"{digest}"', cache_control=IMMUTABLE, content_type=content_type,
+    )
@@ -1,6 +1,7 @@
 from django.db import models
 from users.models import User
 from entries.models import Entry
+from backend.querycache import CachingManager
 
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -8,6 +9,8 @@ class Comment(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CachingManager()
+
     class Meta:
         ordering = ['created_at']
         verbose_name = 'Comment'
@@ -36,7 +36,7 @@ class CommentListCreateAPIView(APIView):
 
     def get(self, request, entry_id):
         entry = get_object_or_404(Entry, id=entry_id)
-        comments = entry.comments.select_related('user').all()
+        comments = entry.comments.select_related('user').cache()
         serializer = CommentSerializer(comments, many=True, context={'request': request})
         return Response(serializer.data)
 
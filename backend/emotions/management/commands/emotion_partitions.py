@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from emotions.partitions import (
+    add_months, archive_partition, create_partition, is_partitioned,
+    list_partitions, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт месячные секции таблицы эмоций заранее и архивирует старые'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='На сколько месяцев вперёд создавать секции')
+        parser.add_argument('--retain-months', type=int, default=None,
+                            help='Сколько последних месяцев хранить в таблице (по умолчанию все)')
+        parser.add_argument('--drop', action='store_true',
+                            help='Удалять старые секции вместо переименования в архивные таблицы')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет сделано')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('Таблица эмоций не секционирована (нужен PostgreSQL и миграция emotions 0004)')
+
+        if options['retain_months'] is not None and options['retain_months'] < 1:
+            raise CommandError('--retain-months должен быть не меньше 1')
+
+        current = month_start(timezone.now())
+        existing = list_partitions()
+        dry_run = options['dry_run']
+
+        for offset in range(options['ahead'] + 1):
+            month = add_months(current, offset)
+            if month in existing:
+                continue
+            if dry_run:
+                self.stdout.write(f'Будет создана секция за {month:%Y-%m}')
+            else:
+                name = create_partition(month)
+                self.stdout.write(self.style.SUCCESS(f'Создана секция {name}'))
+
+        if options['retain_months'] is None:
+            return
+        oldest_kept = add_months(current, -(options['retain_months'] - 1))
+        for month, name in sorted(existing.items()):
+            if month >= oldest_kept:
+                break
+            if dry_run:
+                self.stdout.write(f'Будет отключена секция {name}')
+                continue
+            archived = archive_partition(name, drop=options['drop'])
+            if archived:
+                self.stdout.write(self.style.SUCCESS(f'Секция {name} отключена и сохранена как {archived}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Секция {name} удалена'))
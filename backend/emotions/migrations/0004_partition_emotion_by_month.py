@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# Таблица эмоций переводится в декларативное секционирование PostgreSQL
+# по месяцам поля timestamp. Первичный ключ секционированной таблицы
+# обязан включать ключ секционирования, поэтому в БД он (id, timestamp),
+# а id по-прежнему выдаётся последовательностью и остаётся уникальным.
+
+TABLE = 'emotions_emotion'
+MONTHS_AHEAD = 3
+
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(value):
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy')
+        cursor.execute(f'ALTER TABLE {TABLE}_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {TABLE}_legacy ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE IF EXISTS {TABLE}_id_seq')
+        cursor.execute(f'DROP INDEX IF EXISTS {TABLE}_user_id_idx')
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_id_seq')
+        cursor.execute(f'''
+            CREATE TABLE {TABLE} (
+                id bigint NOT NULL DEFAULT nextval('{TABLE}_id_seq'),
+                emotion_type varchar(10) NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                user_id bigint NOT NULL
+                    REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED,
+                PRIMARY KEY (id, "timestamp")
+            ) PARTITION BY RANGE ("timestamp")
+        ''')
+        cursor.execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+        cursor.execute(f'CREATE INDEX {TABLE}_user_id_idx ON {TABLE} (user_id)')
+
+        # Секции от самой старой эмоции до нескольких месяцев вперёд,
+        # остальное (неожиданные даты) попадает в секцию по умолчанию
+        cursor.execute(f'SELECT MIN("timestamp") FROM {TABLE}_legacy')
+        oldest = cursor.fetchone()[0]
+        now = datetime.now(timezone.utc)
+        month = _month_start(oldest or now)
+        last = _month_start(now)
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+        while month <= last:
+            upper = _next_month(month)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            month = upper
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'''
+            INSERT INTO {TABLE} (id, emotion_type, "timestamp", user_id)
+            SELECT id, emotion_type, "timestamp", user_id FROM {TABLE}_legacy
+        ''')
+        # Отложенные проверки внешнего ключа должны сработать до следующего DDL
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f"SELECT setval('{TABLE}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}")
+        cursor.execute(f'DROP TABLE {TABLE}_legacy')
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'''
+            CREATE TABLE {TABLE}_plain (
+                id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                emotion_type varchar(10) NOT NULL,
+                "timestamp" timestamp with time zone NOT NULL,
+                user_id bigint NOT NULL
+                    REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED
+            )
+        ''')
+        cursor.execute(f'''
+            INSERT INTO {TABLE}_plain (id, emotion_type, "timestamp", user_id)
+            OVERRIDING SYSTEM VALUE
+            SELECT id, emotion_type, "timestamp", user_id FROM {TABLE}
+        ''')
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'DROP TABLE {TABLE} CASCADE')
+        cursor.execute(f'ALTER TABLE {TABLE}_plain RENAME TO {TABLE}')
+        cursor.execute(f'CREATE INDEX {TABLE}_user_id_idx ON {TABLE} (user_id)')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emotions', '0003_delete_monthlyemotionstat'),
+        ('users', '0003_user_profile_photo'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+        migrations.AddIndex(
+            model_name='emotion',
+            index=models.Index(fields=['user', 'timestamp'], name='emotion_user_ts_idx'),
+        ),
+    ]
@@ -18,3 +18,8 @@ class Emotion(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        # В PostgreSQL таблица секционирована по месяцам timestamp (миграция 0004),
+        # индекс создаётся на каждой секции
+        indexes = [
+            models.Index(fields=['user', 'timestamp'], name='emotion_user_ts_idx'),
+        ]
@@ -0,0 +1,99 @@
+import re
+from datetime import datetime, timezone
+
+from django.db import connection, transaction
+
+from .models import Emotion
+
+# Управление месячными секциями таблицы эмоций (см. миграцию 0004)
+
+PARENT = Emotion._meta.db_table
+DEFAULT_PARTITION = f'{PARENT}_default'
+PARTITION_RE = re.compile(rf'^{PARENT}_p(\d{{4}})_(\d{{2}})$')
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{PARENT}_p{month:%Y_%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [PARENT])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions():
+    """Возвращает {месяц: имя секции} для подключённых месячных секций."""
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+        ''', [PARENT])
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            partitions[month] = name
+    return partitions
+
+
+def create_partition(month):
+    name = partition_name(month)
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            [lower, upper],
+        )
+        has_stray_rows = cursor.fetchone()[0]
+        if has_stray_rows:
+            # Новая секция не создаётся, пока её строки лежат в секции по умолчанию:
+            # отключаем её, переносим строки и подключаем обратно
+            cursor.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(
+            f'CREATE TABLE {name} PARTITION OF {PARENT} '
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+        if has_stray_rows:
+            cursor.execute(
+                f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} '
+                f'WHERE "timestamp" >= %s AND "timestamp" < %s',
+                [lower, upper],
+            )
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute(
+                f'DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s',
+                [lower, upper],
+            )
+            cursor.execute(f'ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+    return name
+
+
+def archive_partition(name, drop=False):
+    """Отключает секцию от таблицы; отключённая секция остаётся архивной таблицей или удаляется."""
+    archive_name = name.replace(f'{PARENT}_p', f'{PARENT}_archive_', 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {name}')
+        if drop:
+            cursor.execute(f'DROP TABLE {name}')
+            return None
+        cursor.execute(f'ALTER TABLE {name} RENAME TO {archive_name}')
+    return archive_name
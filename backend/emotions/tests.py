@@ -1,3 +1,124 @@
-from django.test import TestCase
+import unittest
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import User
+from . import partitions
+from .models import Emotion
+from .partitions import add_months, month_start, partition_name
+
+
+class EmotionCreateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_does_not_query_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/emotions/', {'emotion_type': 'joy'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Emotion.objects.get().user_id, self.user.pk)
+        user_table = User._meta.db_table
+        self.assertFalse([q['sql'] for q in queries.captured_queries if f'FROM "{user_table}"' in q['sql']])
+
+    def test_invalid_type_is_rejected(self):
+        response = self.client.post('/api/emotions/', {'emotion_type': 'anger'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('available_user_ids', response.json())
+
+    def test_deactivated_user_cannot_read(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(client.get('/api/emotions/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get('/api/emotions/').status_code, 401)
+
+
+def month(year, number):
+    return datetime(year, number, 1, tzinfo=timezone.utc)
+
+
+class MonthArithmeticTests(SimpleTestCase):
+    def test_month_start(self):
+        self.assertEqual(month_start(datetime(2024, 2, 29, 23, 59, tzinfo=timezone.utc)), month(2024, 2))
+
+    def test_add_months_crosses_years(self):
+        self.assertEqual(add_months(month(2024, 11), 3), month(2025, 2))
+        self.assertEqual(add_months(month(2024, 1), -1), month(2023, 12))
+        self.assertEqual(add_months(month(2024, 12), 1), month(2025, 1))
+        self.assertEqual(add_months(month(2024, 3), -27), month(2021, 12))
+
+    def test_partition_name(self):
+        self.assertEqual(partition_name(month(2024, 3)), f'{Emotion._meta.db_table}_p2024_03')
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'emotions are partitioned only on PostgreSQL')
+class PartitionCommandTests(TestCase):
+    NOW = datetime(2024, 6, 15, tzinfo=timezone.utc)
+
+    def setUp(self):
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.NOW)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Ровно полгода секций: 2024-01 … 2024-06
+        for name in partitions.list_partitions().values():
+            partitions.archive_partition(name, drop=True)
+        for number in range(1, 7):
+            partitions.create_partition(month(2024, number))
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('emotion_partitions', *args, stdout=out)
+        return out.getvalue()
+
+    def tables(self):
+        return set(connection.introspection.table_names())
+
+    def test_creates_months_ahead(self):
+        self.run_command('--ahead=2')
+        self.assertEqual(sorted(partitions.list_partitions()), [month(2024, n) for n in range(1, 9)])
+
+    def test_stray_rows_move_from_default_partition(self):
+        user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+        emotion = Emotion.objects.create(user=user, emotion_type='joy')
+        Emotion.objects.filter(pk=emotion.pk).update(timestamp=datetime(2024, 7, 3, tzinfo=timezone.utc))
+        self.run_command('--ahead=1')
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {partition_name(month(2024, 7))}')
+            self.assertEqual(cursor.fetchall(), [(emotion.pk,)])
+        self.assertEqual(Emotion.objects.get().pk, emotion.pk)
+
+    def test_retain_months_archives_older(self):
+        self.run_command('--ahead=0', '--retain-months=4')
+        self.assertEqual(sorted(partitions.list_partitions()), [month(2024, n) for n in range(3, 7)])
+        table = Emotion._meta.db_table
+        self.assertLessEqual({f'{table}_archive_2024_01', f'{table}_archive_2024_02'}, self.tables())
+
+    def test_drop_removes_older(self):
+        self.run_command('--ahead=0', '--retain-months=5', '--drop')
+        self.assertEqual(sorted(partitions.list_partitions()), [month(2024, n) for n in range(2, 7)])
+        self.assertFalse({name for name in self.tables() if '_archive_' in name or name.endswith('2024_01')})
+
+    def test_dry_run_runs_no_ddl(self):
+        with CaptureQueriesContext(connection) as queries:
+            out = self.run_command('--ahead=2', '--retain-months=2', '--drop', '--dry-run')
+        self.assertFalse([q['sql'] for q in queries.captured_queries
+                          if q['sql'].lstrip().split()[0].upper() in ('CREATE', 'ALTER', 'DROP', 'INSERT', 'DELETE')])
+        self.assertIn('2024-08', out)
+        self.assertIn(partition_name(month(2024, 4)), out)
+        self.assertNotIn(partition_name(month(2024, 5)), out)
+        self.assertEqual(len(partitions.list_partitions()), 6)
+
+    def test_retain_months_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            self.run_command('--retain-months=0')
@@ -5,7 +5,6 @@ from .models import Emotion
 from .serializers import EmotionSerializer
 from django.utils import timezone
 from datetime import timedelta
-from users.models import User  # Импортируем пользовательскую модель напрямую
 import logging
 import traceback
 from django.db.models import Count
@@ -16,68 +15,41 @@ logger = logging.getLogger(__name__)
 
 # Create your views here.
 
+def count_by_type(emotions):
+    """Считает эмоции каждого типа одним сгруппированным запросом."""
+    stats = {'joy': 0, 'sadness': 0, 'neutral': 0}
+    for row in emotions.order_by().values('emotion_type').annotate(count=Count('id')):
+        stats[row['emotion_type']] = row['count']
+    return stats
+
+
 class EmotionViewSet(viewsets.ModelViewSet):
     queryset = Emotion.objects.all()
     serializer_class = EmotionSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        return Emotion.objects.filter(user=user)
+        return Emotion.objects.filter(user_id=self.request.user.id)
 
     def create(self, request, *args, **kwargs):
         try:
-            # Логирование информации о пользователе
-            logger.info(f"Попытка создать эмоцию. Пользователь: {request.user}, ID: {request.user.id}, Аутентифицирован: {request.user.is_authenticated}")
-            
-            # Получаем все пользователей из базы и логируем их ID
-            all_users = User.objects.all()
-            logger.info(f"Пользователи в базе: {', '.join([str(u.id) for u in all_users])}")
-            
             user = request.user
             emotion_type = request.data.get('emotion_type')
-            
-            logger.info(f"Тип эмоции: {emotion_type}")
-            
-            # Проверка существования пользователя
-            try:
-                # Проверяем, что пользователь существует в базе - используем пользовательскую модель User
-                user_exists = User.objects.filter(id=user.id).exists()
-                logger.info(f"Пользователь существует в базе: {user_exists}")
-                
-                if not user_exists:
-                    logger.warning(f"Пользователь с ID {user.id} не найден в базе данных")
-                    return Response({
-                        'error': 'Пользователь не найден',
-                        'user_id': user.id,
-                        'available_user_ids': [u.id for u in User.objects.all()[:10]]
-                    }, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                logger.error(f"Ошибка при проверке пользователя: {str(e)}")
-                logger.error(traceback.format_exc())
-                return Response({'error': f'Ошибка при проверке пользователя: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            logger.info('Попытка создать эмоцию %s, пользователь %s', emotion_type, user.id)
             
             if emotion_type not in ['joy', 'sadness', 'neutral']:
-                logger.warning(f"Недопустимый тип эмоции: {emotion_type}")
+                logger.warning('Недопустимый тип эмоции: %s', emotion_type)
                 return Response({'error': 'Invalid emotion type'}, status=status.HTTP_400_BAD_REQUEST)
             
             try:
-                # Логирование перед созданием записи
-                logger.info(f"Создаем запись эмоции для пользователя {user.id}")
-                
-                # Получаем явно пользователя из модели User
-                user_obj = User.objects.get(id=user.id)
-                logger.info(f"Получен пользователь: ID={user_obj.id}, username={user_obj.username}")
-                
-                # Создаем запись с явно указанным пользователем
-                emotion = Emotion(user=user_obj, emotion_type=emotion_type)
+                # Пользователь уже загружен аутентификацией, повторно из БД его не читаем
+                emotion = Emotion(user=user, emotion_type=emotion_type)
                 emotion.save()
-                logger.info(f"Запись эмоции создана: ID {emotion.id}")
+                logger.info('Запись эмоции создана: ID %s', emotion.id)
                 
                 serializer = self.get_serializer(emotion)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             except Exception as e:
-                logger.error(f"Ошибка при сохранении эмоции: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception('Ошибка при сохранении эмоции')
                 return Response({
                     'error': f'Ошибка при сохранении эмоции: {str(e)}',
                     'user_id': user.id,
@@ -86,8 +58,7 @@ class EmotionViewSet(viewsets.ModelViewSet):
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
                 
         except Exception as e:
-            logger.error(f"Непредвиденная ошибка: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception('Непредвиденная ошибка при создании эмоции')
             return Response({
                 'error': f'Произошла непредвиденная ошибка: {str(e)}',
                 'traceback': traceback.format_exc()
@@ -104,22 +75,15 @@ class EmotionViewSet(viewsets.ModelViewSet):
         else:  # month
             start_date = now - timedelta(days=30)
             
-        emotions = Emotion.objects.filter(user=user, timestamp__gte=start_date)
-        
-        stats = {
-            'joy': emotions.filter(emotion_type='joy').count(),
-            'sadness': emotions.filter(emotion_type='sadness').count(),
-            'neutral': emotions.filter(emotion_type='neutral').count()
-        }
-        
-        return Response(stats)
+        emotions = Emotion.objects.filter(user_id=user.id, timestamp__gte=start_date)
+        return Response(count_by_type(emotions))
 
     def get_monthly_stats(self, request):
         user = request.user
         # Получаем эмоции за последние 12 месяцев
         now = timezone.now()
         year_ago = now.replace(day=1) - timedelta(days=365)
-        emotions = Emotion.objects.filter(user=user, timestamp__gte=year_ago)
+        emotions = Emotion.objects.filter(user_id=user.id, timestamp__gte=year_ago)
         # Группируем по месяцу и типу эмоции
         monthly = (
             emotions
@@ -152,35 +116,19 @@ class EmotionViewSet(viewsets.ModelViewSet):
 
     def get_last_month_stats(self, request):
         user = self.request.user
-        emotions = Emotion.objects.filter(user=user)
-        monthly = (
-            emotions
-            .annotate(month=TruncMonth('timestamp'))
-            .values('month', 'emotion_type')
-            .annotate(count=Count('id'))
-            .order_by('-month')
-        )
-        from collections import defaultdict
-        stats_by_month = defaultdict(lambda: {'joy': 0, 'sadness': 0, 'neutral': 0})
-        for row in monthly:
-            month = row['month']
-            emotion_type = row['emotion_type']
-            count = row['count']
-            stats_by_month[month][emotion_type] = count
-        if stats_by_month:
-            last_month = max(stats_by_month.keys())
-            stats = stats_by_month[last_month]
-            stats['month'] = last_month.strftime('%B %Y')
-            return Response(stats)
-        else:
+        emotions = Emotion.objects.filter(user_id=user.id)
+        # Последняя эмоция находится по индексу (user, timestamp), а подсчёт
+        # ограничен диапазоном её месяца, чтобы не сканировать всю историю
+        latest = emotions.order_by('-timestamp').values_list('timestamp', flat=True).first()
+        if latest is None:
             return Response({'joy': 0, 'sadness': 0, 'neutral': 0, 'month': None})
+        month_start = timezone.localtime(latest).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        stats = count_by_type(emotions.filter(timestamp__gte=month_start, timestamp__lt=next_month))
+        stats['month'] = month_start.strftime('%B %Y')
+        return Response(stats)
 
     def get_all_time_stats(self, request):
         user = request.user
-        emotions = Emotion.objects.filter(user=user)
-        stats = {
-            'joy': emotions.filter(emotion_type='joy').count(),
-            'sadness': emotions.filter(emotion_type='sadness').count(),
-            'neutral': emotions.filter(emotion_type='neutral').count()
-        }
-        return Response(stats)
+        emotions = Emotion.objects.filter(user_id=user.id)
+        return Response(count_by_type(emotions))
@@ -1,9 +1,21 @@
 from django.contrib import admin
-from .models import Entry
+from .models import Entry, EntryRevision
+from .revisions import save_with_revision
 
 @admin.register(Entry)
 class EntryAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'created_at', 'is_public')
     list_filter = ('user', 'created_at')
-    search_fields = ('title', 'content')
+    search_fields = ('title', 'search_text')  # content хранится сжатым
     readonly_fields = ('created_at', 'updated_at')
+
+    def save_model(self, request, obj, form, change):
+        save_with_revision(obj)
+
+
+@admin.register(EntryRevision)
+class EntryRevisionAdmin(admin.ModelAdmin):
+    list_display = ('entry', 'number', 'kind', 'changed', 'created_at')
+    list_filter = ('kind',)
+    raw_id_fields = ('entry',)
+    exclude = ('payload',)
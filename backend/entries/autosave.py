@@ -0,0 +1,140 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.cache import is_shared
+
+from .models import Entry
+from .revisions import save_with_revision
+
+logger = logging.getLogger(__name__)
+
+# Автосохранение редактора. Правки полей копятся в черновике в кэше, в БД
+# они попадают одним UPDATE только изменённых колонок — когда пользователь
+# перестал печатать на AUTOSAVE_QUIET_SECONDS, но не позже AUTOSAVE_MAX_DELAY
+# после первой правки, или сразу по явному commit. Черновик должен быть виден
+# всем процессам, включая воркер задач, поэтому без общего кэша (CACHE_BACKEND)
+# черновиков нет и каждая правка пишется в БД сразу.
+
+LOCK_WAIT = 1  # секунд ожидания блокировки черновика
+
+
+class StaleVersion(Exception):
+    def __init__(self, version):
+        super().__init__(f'Current version is {version}')
+        self.version = version
+
+
+class DraftBusy(Exception):
+    """Черновик занят другим запросом дольше LOCK_WAIT."""
+
+
+def _draft_key(entry_id):
+    return f'autosave:draft:{entry_id}'
+
+
+@contextmanager
+def _locked(entry_id):
+    key = f'autosave:lock:{entry_id}'
+    deadline = time.monotonic() + LOCK_WAIT
+    # Таймаут снимает блокировку, если процесс упал, не освободив её
+    while not cache.add(key, 1, settings.AUTOSAVE_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise DraftBusy(entry_id)
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def get_draft(entry_id):
+    return cache.get(_draft_key(entry_id))
+
+
+def uses_drafts():
+    """Копятся ли правки в черновике; иначе apply_patch пишет их сразу."""
+    return is_shared()
+
+
+def _save_now(entry, version, fields):
+    with transaction.atomic():
+        current = Entry.objects.select_for_update().filter(pk=entry.pk).values_list('version', flat=True).first()
+        if current is None:
+            raise Entry.DoesNotExist
+        if version != current:
+            raise StaleVersion(current)
+        for name, value in fields.items():
+            setattr(entry, name, value)
+        entry.version = current + 1
+        save_with_revision(entry, [*fields, 'version', 'updated_at'])
+    return entry.version
+
+
+def apply_patch(entry, version, fields):
+    """
+    Добавляет правки полей в черновик. version — версия, от которой клиент
+    правил; если с тех пор запись или черновик изменились, правка отклоняется.
+    Возвращает новую версию черновика, а без общего кэша — сохранённой записи.
+    """
+    if not uses_drafts():
+        return _save_now(entry, version, fields)
+    with _locked(entry.pk):
+        draft = get_draft(entry.pk)
+        if draft is None:
+            # Версия из БД под блокировкой: черновик могли только что записать
+            current = Entry.objects.filter(pk=entry.pk).values_list('version', flat=True).first()
+            if current is None:
+                raise Entry.DoesNotExist
+            draft = {'base': current, 'version': current, 'fields': {}, 'started': time.time()}
+            started = True
+        else:
+            started = False
+        if version != draft['version']:
+            raise StaleVersion(draft['version'])
+        draft['fields'].update(fields)
+        draft['version'] += 1
+        draft['touched'] = time.time()
+        cache.set(_draft_key(entry.pk), draft, settings.AUTOSAVE_DRAFT_TIMEOUT)
+    if started:
+        from .jobs import flush_autosave
+        flush_autosave.schedule(settings.AUTOSAVE_QUIET_SECONDS, entry.pk)
+    return draft['version']
+
+
+def due_in(draft):
+    """Сколько секунд осталось до записи черновика; 0 — пора писать."""
+    now = time.time()
+    return max(min(
+        draft['touched'] + settings.AUTOSAVE_QUIET_SECONDS - now,
+        draft['started'] + settings.AUTOSAVE_MAX_DELAY - now,
+    ), 0)
+
+
+def flush_draft(entry_id, entry=None):
+    """Записывает черновик в БД. Возвращает сохранённую запись или None, если черновика нет."""
+    if get_draft(entry_id) is None:
+        return None
+    with _locked(entry_id):
+        draft = get_draft(entry_id)
+        if draft is None:
+            return None
+        if entry is None:
+            entry = Entry.objects.filter(pk=entry_id).first()
+            if entry is None:
+                cache.delete(_draft_key(entry_id))
+                return None
+        if entry.version != draft['base']:
+            # Запись сохранили целиком в обход черновика: правки черновика новее
+            logger.warning('Autosave draft of entry %s based on version %s, entry is at %s',
+                           entry_id, draft['base'], entry.version)
+        for name, value in draft['fields'].items():
+            setattr(entry, name, value)
+        entry.version = max(draft['version'], entry.version + 1)
+        save_with_revision(entry, [*draft['fields'], 'version', 'updated_at'])
+        cache.delete(_draft_key(entry_id))
+    return entry
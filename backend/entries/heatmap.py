@@ -0,0 +1,89 @@
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce, TruncDate
+
+from backend.cache import bump_generation, is_shared, versioned_key
+from backend.metrics import record_cache
+from emotions.models import Emotion
+from .models import Entry
+
+# Порядок эмоций задаёт индексы в массиве mood ответа
+EMOTION_TYPES = [code for code, _ in Emotion.EMOTION_CHOICES]
+NO_MOOD = -1
+
+
+def _scope(user_id):
+    return f'heatmap:{user_id}'
+
+
+def invalidate_heatmap(user_id):
+    bump_generation(_scope(user_id))
+
+
+def build_year_heatmap(user_id, year, tz):
+    """
+    Собирает тепловую карту года двумя сгруппированными запросами:
+    записи по эффективной дате (date или день создания) и эмоции по локальному дню.
+    """
+    first_day = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - first_day).days
+    start = datetime(year, 1, 1, tzinfo=tz)
+    end = datetime(year + 1, 1, 1, tzinfo=tz)
+
+    entry_rows = (
+        Entry.objects
+        .filter(user_id=user_id)
+        .filter(Q(date__year=year) | Q(date__isnull=True, created_at__gte=start, created_at__lt=end))
+        .annotate(day=Coalesce('date', TruncDate('created_at', tzinfo=tz)))
+        .values('day')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    emotion_rows = (
+        Emotion.objects
+        .filter(user_id=user_id, timestamp__gte=start, timestamp__lt=end)
+        .annotate(day=TruncDate('timestamp', tzinfo=tz))
+        .values('day', 'emotion_type')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    entries = [0] * days
+    for row in entry_rows:
+        entries[(row['day'] - first_day).days] = row['count']
+
+    # Доминирующая эмоция дня: максимум отметок, при равенстве — порядок EMOTION_TYPES
+    best = {}
+    for row in emotion_rows:
+        index = (row['day'] - first_day).days
+        candidate = (row['count'], -EMOTION_TYPES.index(row['emotion_type']))
+        if candidate > best.get(index, (0, 0)):
+            best[index] = candidate
+    mood = [NO_MOOD] * days
+    for index, (_, order) in best.items():
+        mood[index] = -order
+
+    return {
+        'year': year,
+        'start': first_day.isoformat(),
+        'days': days,
+        'emotions': EMOTION_TYPES,
+        'entries': entries,
+        'mood': mood,
+    }
+
+
+def get_year_heatmap(user_id, year, tz):
+    key = versioned_key(_scope(user_id), year, tz.key)
+    data = cache.get(key)
+    record_cache('heatmap', data is not None)
+    if data is None:
+        data = build_year_heatmap(user_id, year, tz)
+        # Сброс поколения виден только процессу, где произошла запись: в
+        # локальном кэше остальные воркеры держат карту лишь короткое время
+        timeout = settings.HEATMAP_CACHE_TIMEOUT if is_shared() else settings.HEATMAP_LOCAL_CACHE_TIMEOUT
+        cache.set(key, data, timeout)
+    return data
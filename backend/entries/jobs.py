@@ -0,0 +1,30 @@
+from django.conf import settings
+
+from tasks.registry import task
+from .autosave import due_in, flush_draft, get_draft
+from .revisions import prune_revisions
+from .sync import compact_changes
+
+
+@task(queue='maintenance', max_attempts=1)
+def compact_sync_log():
+    compact_changes()
+
+
+@task(queue='maintenance', max_attempts=1)
+def prune_entry_revisions():
+    prune_revisions()
+
+
+@task(queue='default')
+def flush_autosave(entry_id):
+    """Пишет черновик автосохранения, когда правки утихли; иначе переносит себя на потом."""
+    draft = get_draft(entry_id)
+    if draft is None:
+        return
+    wait = due_in(draft)
+    # Без воркера (TASKS_EAGER) отложить запись некому — пишем сразу
+    if wait > 0 and not settings.TASKS_EAGER:
+        flush_autosave.schedule(wait, entry_id)
+        return
+    flush_draft(entry_id)
@@ -0,0 +1,70 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.fields import decompress_text, compress_text, to_text
+from entries.models import Entry
+from .benchmark_renderers import WORDS
+
+
+def sample_texts(count, length):
+    rng = random.Random(42)
+    texts = []
+    for _ in range(count):
+        size = rng.randint(length // 4, length * 2)
+        texts.append(' '.join(rng.choice(WORDS) for _ in range(size // 7))[:size])
+    return texts
+
+
+def measure(func, values, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in values:
+            func(value)
+    return (time.perf_counter() - start) / (repeat * len(values)) * 1e6
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает размер и время сжатия/распаковки текста записей по кодекам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=500)
+        parser.add_argument('--length', type=int, default=3000,
+                            help='Средняя длина синтетического текста в символах')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--from-db', action='store_true',
+                            help='Взять тексты записей из БД')
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            texts = [to_text(value) for value in Entry.objects.values_list('content', flat=True)[:options['entries']]]
+        else:
+            texts = sample_texts(options['entries'], options['length'])
+        texts = [text for text in texts if text]
+        if not texts:
+            self.stdout.write('Нет текстов для замера')
+            return
+        raw = sum(len(text.encode()) for text in texts)
+        self.stdout.write(f'Текстов: {len(texts)}, исходный размер: {raw / 1024:.1f} КБ')
+
+        codecs = ['zlib']
+        try:
+            import zstandard  # noqa: F401
+            codecs.append('zstd')
+        except ImportError:
+            self.stdout.write('zstandard не установлен — zstd пропущен')
+
+        repeat = options['repeat']
+        encode_us = measure(str.encode, texts, repeat)
+        self.stdout.write(f"{'без сжатия':<10} {raw / 1024:9.1f} КБ  100%  запись {encode_us:7.1f} мкс  "
+                          f"чтение {measure(bytes.decode, [t.encode() for t in texts], repeat):7.1f} мкс")
+        for codec in codecs:
+            packed = [compress_text(text, codec=codec) for text in texts]
+            size = sum(len(value) for value in packed)
+            write_us = measure(lambda text: compress_text(text, codec=codec), texts, repeat)
+            read_us = measure(decompress_text, packed, repeat)
+            self.stdout.write(
+                f'{codec:<10} {size / 1024:9.1f} КБ  {size / raw:4.0%}  '
+                f'запись {write_us:7.1f} мкс  чтение {read_us:7.1f} мкс  (на запись)'
+            )
@@ -0,0 +1,73 @@
+import gzip
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from backend.renderers import MessagePackRenderer, ORJSONRenderer
+from entries.models import Entry
+from entries.serializers import EntrySerializer
+from users.models import User
+
+WORDS = ('сегодня', 'был', 'очень', 'долгий', 'день', 'и', 'я', 'много', 'думала', 'о', 'том',
+         'что', 'важно', 'погода', 'прогулка', 'книга', 'вечер', 'друзья', 'работа', 'отдых')
+
+
+def sample_entries(count, content_length):
+    """Несохранённые записи, похожие на ленту: длинный текст, хэштеги, автор с фото."""
+    rng = random.Random(42)
+    now = timezone.now()
+    authors = [User(id=i, username=f'user{i}', profile_photo=f'blobs/ab/{i:064x}.jpg') for i in range(1, 11)]
+    entries = []
+    for i in range(count):
+        text = ' '.join(rng.choice(WORDS) for _ in range(content_length // 7))[:content_length]
+        entries.append(Entry(
+            id=i + 1, user=authors[i % len(authors)], title=f'Запись {i}', content=text,
+            location={'lat': 55.75, 'lng': 37.61, 'name': 'Москва'}, hashtags='#день,#мысли',
+            is_public=True, date=(now - timedelta(days=i)).date(),
+            created_at=now - timedelta(days=i), updated_at=now - timedelta(days=i),
+        ))
+    return entries
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает рендереры ответа (DRF JSON, orjson, MessagePack) на выводе EntrySerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=50,
+                            help='Сколько записей в одной странице ленты')
+        parser.add_argument('--content-length', type=int, default=2000,
+                            help='Длина текста записи в символах')
+        parser.add_argument('--iterations', type=int, default=200,
+                            help='Сколько раз рендерить страницу')
+        parser.add_argument('--from-db', action='store_true',
+                            help='Взять публичные записи из БД вместо синтетических')
+
+    def handle(self, *args, **options):
+        if options['from_db']:
+            entries = list(Entry.objects.filter(is_public=True).select_related('user')[:options['entries']])
+        else:
+            entries = sample_entries(options['entries'], options['content_length'])
+        data = EntrySerializer(entries, many=True).data
+        self.stdout.write(f'Записей на странице: {len(entries)}, итераций: {options["iterations"]}')
+
+        renderers = [
+            ('DRF JSONRenderer', JSONRenderer()),
+            ('ORJSONRenderer', ORJSONRenderer()),
+            ('MessagePackRenderer', MessagePackRenderer()),
+        ]
+        baseline = None
+        for name, renderer in renderers:
+            body = renderer.render(data, renderer.media_type, {})
+            start = time.perf_counter()
+            for _ in range(options['iterations']):
+                renderer.render(data, renderer.media_type, {})
+            per_render = (time.perf_counter() - start) / options['iterations'] * 1000
+            baseline = baseline or per_render
+            self.stdout.write(
+                f'{name:<20} {per_render:8.3f} мс  x{baseline / per_render:5.1f}  '
+                f'{len(body):>9} байт  gzip {len(gzip.compress(body)):>8} байт'
+            )
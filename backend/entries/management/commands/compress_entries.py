@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from backend.fields import PackedText, compress_text, decompress_text
+from entries.models import Entry, make_excerpt, make_search_text
+
+
+class Command(BaseCommand):
+    help = ('Пересжимает текст записей текущим COMPRESSED_TEXT_CODEC и порогом, '
+            'заполняет пустые excerpt и search_text и сообщает об экономии места')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не записывать')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        raw_total = before_total = after_total = changed = seen = 0
+        last_id = 0
+        while True:
+            rows = list(
+                Entry.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'content', 'excerpt', 'search_text')[:batch_size]
+            )
+            if not rows:
+                break
+            updates = []
+            for entry_id, packed, excerpt, search_text in rows:
+                text = decompress_text(packed)
+                repacked = compress_text(text)
+                raw_total += len(text.encode())
+                before_total += len(packed)
+                after_total += len(repacked)
+                if repacked != bytes(packed) or (text and not (excerpt and search_text)):
+                    updates.append((entry_id, repacked, make_excerpt(text), make_search_text(text)))
+            if updates and not options['dry_run']:
+                # bulk_update: без сигналов и без сдвига updated_at — текст не меняется
+                Entry.objects.bulk_update(
+                    [Entry(id=entry_id, content=PackedText(repacked), excerpt=excerpt, search_text=search_text)
+                     for entry_id, repacked, excerpt, search_text in updates],
+                    ['content', 'excerpt', 'search_text'],
+                )
+            changed += len(updates)
+            seen += len(rows)
+            last_id = rows[-1][0]
+
+        verb = 'Будет обновлено' if options['dry_run'] else 'Обновлено'
+        self.stdout.write(f'Записей: {seen}, {verb.lower()}: {changed}')
+        if raw_total:
+            self.stdout.write(
+                f'Текст: {raw_total / 1024:.1f} КБ, хранилось: {before_total / 1024:.1f} КБ, '
+                f'после: {after_total / 1024:.1f} КБ ({after_total / raw_total:.0%} от исходного)'
+            )
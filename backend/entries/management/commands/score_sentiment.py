@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from entries.sentiment import score_entries
+
+
+class Command(BaseCommand):
+    help = 'Оценивает тональность текста записей (только новые и изменённые с прошлого запуска)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Сколько записей оценивать за один запрос')
+        parser.add_argument('--full', action='store_true',
+                            help='Переоценить все записи, а не только изменённые')
+
+    def handle(self, *args, **options):
+        def progress(count):
+            self.stdout.write(f'Оценено записей: {count}')
+
+        total = score_entries(chunk_size=options['chunk_size'], full=options['full'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Готово, оценено записей: {total}'))
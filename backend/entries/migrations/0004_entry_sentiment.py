@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0003_remove_entry_html_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='sentiment_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='sentiment_scored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-19 12:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH = 1000
+
+
+def seed_changes(apps, schema_editor):
+    # Существующие объекты попадают в журнал как upsert в порядке изменения,
+    # чтобы первая синхронизация (since=0) отдала их все
+    Change = apps.get_model('entries', 'Change')
+    sources = [
+        ('entry', apps.get_model('entries', 'Entry').objects.order_by('updated_at', 'id')),
+        ('emotion', apps.get_model('emotions', 'Emotion').objects.order_by('timestamp', 'id')),
+    ]
+    for kind, queryset in sources:
+        batch = []
+        for object_id, user_id in queryset.values_list('id', 'user_id').iterator(chunk_size=BATCH):
+            batch.append(Change(user_id=user_id, kind=kind, object_id=object_id, op='upsert'))
+            if len(batch) >= BATCH:
+                Change.objects.bulk_create(batch)
+                batch = []
+        Change.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0004_entry_sentiment'),
+        ('emotions', '0004_partition_emotion_by_month'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('entry', 'Запись'), ('emotion', 'Эмоция')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('op', models.CharField(choices=[('upsert', 'Создание или изменение'), ('delete', 'Удаление')], max_length=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'seq'], name='change_user_seq_idx'), models.Index(fields=['kind', 'object_id'], name='change_object_idx')],
+            },
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
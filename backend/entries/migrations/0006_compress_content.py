@@ -0,0 +1,68 @@
+import backend.fields
+from django.db import migrations, models
+
+BATCH = 500
+
+
+def pack_content(apps, schema_editor):
+    # Текст переносится из старой колонки пачками по id; сжатие делает само поле
+    Entry = apps.get_model('entries', 'Entry')
+    last_id = 0
+    while True:
+        rows = list(
+            Entry.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'content_plain')[:BATCH]
+        )
+        if not rows:
+            break
+        Entry.objects.bulk_update(
+            [
+                Entry(id=entry_id, content=text or '', excerpt=' '.join((text or '').split())[:300])
+                for entry_id, text in rows
+            ],
+            ['content', 'excerpt'],
+        )
+        last_id = rows[-1][0]
+
+
+def unpack_content(apps, schema_editor):
+    Entry = apps.get_model('entries', 'Entry')
+    for entry in Entry.objects.only('id', 'content').iterator(chunk_size=BATCH):
+        Entry.objects.filter(id=entry.id).update(content_plain=entry.content)
+
+
+def set_external_storage(apps, schema_editor):
+    # Значение уже сжато: PostgreSQL не должен пытаться сжать его ещё раз (TOAST)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE entries_entry ALTER COLUMN content SET STORAGE EXTERNAL')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0005_change_log'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='entry',
+            old_name='content',
+            new_name='content_plain',
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='content',
+            field=backend.fields.CompressedTextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='entry',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300),
+        ),
+        migrations.RunPython(pack_content, unpack_content),
+        migrations.RemoveField(
+            model_name='entry',
+            name='content_plain',
+        ),
+        migrations.RunPython(set_external_storage, migrations.RunPython.noop),
+    ]
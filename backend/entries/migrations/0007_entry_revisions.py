@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 12:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0006_compress_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('snapshot', 'Полная копия'), ('delta', 'Изменения')], max_length=8)),
+                ('payload', models.BinaryField()),
+                ('changed', models.CharField(blank=True, default='', max_length=300)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='entries.entry')),
+            ],
+            options={
+                'ordering': ['entry', '-number'],
+                'indexes': [models.Index(fields=['created_at'], name='entry_revision_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('entry', 'number'), name='entry_revision_number_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0007_entry_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+import backend.fields
+
+BATCH = 500
+
+
+def fill_search_text(apps, schema_editor):
+    Entry = apps.get_model('entries', 'Entry')
+    last_id = 0
+    while True:
+        rows = list(
+            Entry.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'content')[:BATCH]
+        )
+        if not rows:
+            break
+        Entry.objects.bulk_update(
+            [
+                Entry(id=entry_id, search_text=' '.join(backend.fields.to_text(packed or b'').split()))
+                for entry_id, packed in rows
+            ],
+            ['search_text'],
+        )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0008_entry_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,32 @@
 from django.db import models
+
+from backend.fields import CompressedTextField
+from backend.querycache import CachingManager
 from users.models import User  # Импортируем пользовательскую модель напрямую
 
+EXCERPT_LENGTH = 300
+
+
+def make_search_text(text):
+    return ' '.join(text.split())
+
+
+def make_excerpt(text):
+    return make_search_text(text)[:EXCERPT_LENGTH]
+
+
+class EntryManager(CachingManager):
+    # Открытая копия текста нужна только для поиска: по умолчанию не загружается
+    def get_queryset(self):
+        return super().get_queryset().defer('search_text')
+
+
 class Entry(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='entries')
     title = models.CharField(max_length=200, default='Без названия')
-    content = models.TextField(default='')  # Простой текст для поиска
+    content = CompressedTextField(default='')  # Текст записи, в БД хранится сжатым
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, default='', editable=False)  # Начало текста открыто: для превью
+    search_text = models.TextField(blank=True, default='', editable=False)  # Весь текст открыто: для поиска
     text_color = models.CharField(max_length=7, default='#000000')  # Цвет текста в формате HEX
     font_size = models.CharField(max_length=10, default='16px')  # Размер шрифта
     text_align = models.CharField(max_length=10, default='left')  # Выравнивание текста
@@ -17,12 +39,90 @@ class Entry(models.Model):
     date = models.DateField(null=True, blank=True)  # Дата записи
     hashtags = models.TextField(null=True, blank=True)  # Хэштеги через запятую
     is_public = models.BooleanField(default=False)  # Флаг публичности записи
+    sentiment_score = models.FloatField(null=True, blank=True)  # Тональность текста от -1 до 1
+    sentiment_scored_at = models.DateTimeField(null=True, blank=True)  # updated_at оценённой версии
+    version = models.PositiveIntegerField(default=1, editable=False)  # Растёт с каждым сохранением правок
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EntryManager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Entries'
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Частичные сохранения (фоновые задачи, автосохранение) версию выставляют сами
+        if update_fields is None and not self._state.adding:
+            self.version += 1
+        if update_fields is None or 'content' in update_fields:
+            # Нераспакованный (PackedText) или отложенный текст не менялся
+            text = self.__dict__.get('content')
+            if isinstance(text, str):
+                self.excerpt = make_excerpt(text)
+                self.search_text = make_search_text(text)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'excerpt', 'search_text'}
+        super().save(*args, **kwargs)
+
+
+class Change(models.Model):
+    """
+    Журнал изменений для синхронизации клиентов. seq растёт монотонно,
+    удаление оставляет запись op=delete (tombstone) вместо следа в таблице.
+    """
+    ENTRY = 'entry'
+    EMOTION = 'emotion'
+    KIND_CHOICES = [(ENTRY, 'Запись'), (EMOTION, 'Эмоция')]
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OP_CHOICES = [(UPSERT, 'Создание или изменение'), (DELETE, 'Удаление')]
+
+    seq = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='change_user_seq_idx'),
+            models.Index(fields=['kind', 'object_id'], name='change_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.op} {self.kind} {self.object_id}"
+
+
+class EntryRevision(models.Model):
+    """
+    Версия записи. snapshot хранит все версионируемые поля целиком, delta —
+    только отличия от предыдущей версии; payload — JSON, сжатый как CompressedTextField.
+    """
+    SNAPSHOT = 'snapshot'
+    DELTA = 'delta'
+    KIND_CHOICES = [(SNAPSHOT, 'Полная копия'), (DELTA, 'Изменения')]
+
+    entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()  # Порядковый номер версии внутри записи
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    payload = models.BinaryField()
+    changed = models.CharField(max_length=300, blank=True, default='')  # Изменённые поля через запятую
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['entry', '-number']
+        constraints = [
+            models.UniqueConstraint(fields=['entry', 'number'], name='entry_revision_number_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='entry_revision_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_id} v{self.number} ({self.kind})"
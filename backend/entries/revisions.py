@@ -0,0 +1,250 @@
+import json
+from datetime import timedelta
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from backend.fields import compress_text, decompress_text, to_text
+from .models import Entry, EntryRevision
+
+# История правок записи. Каждое сохранение через save_with_revision, которое
+# меняет версионируемые поля, добавляет версию: delta с отличиями от предыдущей или, раз в
+# REVISION_SNAPSHOT_EVERY версий, snapshot целиком. Любая версия собирается
+# из ближайшего snapshot не больше чем за REVISION_SNAPSHOT_EVERY шагов.
+
+VERSIONED_FIELDS = (
+    'title', 'content', 'text_color', 'font_size', 'text_align', 'is_bold',
+    'is_underline', 'is_strikethrough', 'list_type', 'location', 'date',
+    'hashtags', 'is_public',
+)
+# Для длинного текста хранится правка, а не новое значение
+TEXT_FIELDS = ('content',)
+
+
+def state_of(entry, fields=VERSIONED_FIELDS):
+    state = {}
+    for name in fields:
+        value = getattr(entry, name)
+        if name == 'date' and value is not None and not isinstance(value, str):
+            value = value.isoformat()
+        state[name] = value
+    return state
+
+
+def text_delta(old, new):
+    """
+    Правки, превращающие old в new: [[начало, конец, вставка], ...] по
+    позициям old. Общие начало и конец отрезаются сразу, посимвольное
+    сравнение идёт только по изменённой середине.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    a = old[prefix:len(old) - suffix]
+    b = new[prefix:len(new) - suffix]
+    if not a and not b:
+        return []
+    if not a or not b or len(a) + len(b) > settings.REVISION_DIFF_LIMIT:
+        return [[prefix, prefix + len(a), b]]
+    return [
+        [prefix + i1, prefix + i2, b[j1:j2]]
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_text_delta(text, ops):
+    # С конца, чтобы позиции ещё не применённых правок не сдвигались
+    for start, end, inserted in reversed(ops):
+        text = text[:start] + inserted + text[end:]
+    return text
+
+
+def make_delta(previous, state):
+    delta = {}
+    for name, value in state.items():
+        old = previous.get(name)
+        if value == old:
+            continue
+        if name in TEXT_FIELDS and isinstance(old, str) and isinstance(value, str):
+            delta[name] = {'ops': text_delta(old, value)}
+        else:
+            delta[name] = {'value': value}
+    return delta
+
+
+def apply_delta(state, delta):
+    state = dict(state)
+    for name, change in delta.items():
+        if 'ops' in change:
+            state[name] = apply_text_delta(state.get(name) or '', change['ops'])
+        else:
+            state[name] = change['value']
+    return state
+
+
+def _dump(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _load(payload):
+    return json.loads(decompress_text(payload))
+
+
+def _chain(entry_id, number=None):
+    """Версии от number (или последней) назад до ближайшего snapshot включительно."""
+    revisions = EntryRevision.objects.filter(entry_id=entry_id)
+    if number is not None:
+        revisions = revisions.filter(number__lte=number)
+    chain = []
+    for revision in revisions.order_by('-number')[:settings.REVISION_SNAPSHOT_EVERY]:
+        chain.append(revision)
+        if revision.kind == EntryRevision.SNAPSHOT:
+            return chain
+    if chain:
+        raise ValueError(f'Revision chain of entry {entry_id} has no snapshot')
+    return chain
+
+
+def _replay(chain):
+    state = {}
+    for revision in reversed(chain):
+        data = _load(revision.payload)
+        state = data if revision.kind == EntryRevision.SNAPSHOT else apply_delta(state, data)
+    return state
+
+
+def rebuild(entry_id, number):
+    """Состояние записи в версии number или None, если такой версии нет."""
+    chain = _chain(entry_id, number)
+    if not chain or chain[0].number != number:
+        return None
+    return _replay(chain)
+
+
+def _create(entry_id, number, kind, data, changed=()):
+    return EntryRevision.objects.create(
+        entry_id=entry_id, number=number, kind=kind,
+        payload=compress_text(_dump(data)), changed=','.join(changed)[:300],
+    )
+
+
+def _versioned(update_fields):
+    if update_fields is None:
+        return VERSIONED_FIELDS
+    return tuple(name for name in VERSIONED_FIELDS if name in update_fields)
+
+
+def _snapshot_existing(entry):
+    """
+    У записи, созданной до истории правок (или сохранённой в обход неё),
+    первой версией становится то, что сейчас лежит в БД, — иначе правка
+    затрёт это без следа. Заодно блокирует строку записи: параллельные
+    сохранения с версией идут по очереди.
+    """
+    row = Entry.objects.select_for_update().filter(pk=entry.pk).values(*VERSIONED_FIELDS).first()
+    if row is None or EntryRevision.objects.filter(entry_id=entry.pk).exists():
+        return
+    row['content'] = to_text(row['content'])
+    if row['date'] is not None:
+        row['date'] = row['date'].isoformat()
+    _create(entry.pk, 1, EntryRevision.SNAPSHOT, row)
+
+
+def _record_revision(entry, fields):
+    chain = _chain(entry.pk)
+    if not chain:
+        return _create(entry.pk, 1, EntryRevision.SNAPSHOT, state_of(entry))
+
+    previous = _replay(chain)
+    state = {**previous, **state_of(entry, fields)}
+    delta = make_delta(previous, state)
+    if not delta:
+        return None
+    number = chain[0].number + 1
+    # Snapshot по расписанию или если правка не меньше самой записи
+    if len(chain) >= settings.REVISION_SNAPSHOT_EVERY or len(_dump(delta)) >= len(_dump(state)):
+        return _create(entry.pk, number, EntryRevision.SNAPSHOT, state, delta)
+    return _create(entry.pk, number, EntryRevision.DELTA, delta, delta)
+
+
+def save_with_revision(entry, update_fields=None):
+    """
+    Сохраняет запись и в той же транзакции добавляет версию, если
+    версионируемые поля изменились. Версии пишут только правки пользователя
+    (API, автосохранение, восстановление, админка) — прочие save() и bulk-
+    операции историю не трогают и лишних запросов не делают.
+    """
+    fields = _versioned(update_fields)
+    if not fields:
+        entry.save(update_fields=update_fields)
+        return entry
+    with transaction.atomic():
+        if not entry._state.adding and entry.pk is not None:
+            _snapshot_existing(entry)
+        entry.save(update_fields=update_fields)
+        _record_revision(entry, fields)
+    return entry
+
+
+def restore(entry, number):
+    """Возвращает запись к версии number; восстановление само становится новой версией."""
+    state = rebuild(entry.pk, number)
+    if state is None:
+        return None
+    for name, value in state.items():
+        setattr(entry, name, value)
+    return save_with_revision(entry)
+
+
+def rebase(entry_id, number):
+    """Делает версию number snapshot'ом и удаляет всё, что было до неё."""
+    with transaction.atomic():
+        Entry.objects.select_for_update().filter(pk=entry_id).values_list('pk', flat=True).first()
+        state = rebuild(entry_id, number)
+        if state is None:
+            return 0
+        EntryRevision.objects.filter(entry_id=entry_id, number=number).update(
+            kind=EntryRevision.SNAPSHOT, payload=compress_text(_dump(state))
+        )
+        deleted, _ = EntryRevision.objects.filter(entry_id=entry_id, number__lt=number).delete()
+    return deleted
+
+
+def prune_revisions():
+    """
+    Удаляет версии старше REVISION_KEEP_DAYS и сверх REVISION_MAX_PER_ENTRY
+    на запись. Последняя версия остаётся всегда.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.REVISION_KEEP_DAYS)
+    limit = settings.REVISION_MAX_PER_ENTRY
+    candidates = (
+        EntryRevision.objects.values('entry_id')
+        .annotate(first=Min('number'), last=Max('number'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    stale = set(
+        EntryRevision.objects.filter(created_at__lt=cutoff).values_list('entry_id', flat=True).distinct()
+    )
+    deleted = 0
+    for row in candidates.iterator():
+        entry_id, last = row['entry_id'], row['last']
+        keep_from = row['first']
+        if row['total'] > limit:
+            keep_from = last - limit + 1
+        if entry_id in stale:
+            fresh = (
+                EntryRevision.objects.filter(entry_id=entry_id, created_at__gte=cutoff)
+                .aggregate(first=Min('number'))['first']
+            )
+            keep_from = max(keep_from, fresh if fresh is not None else last)
+        if keep_from > row['first']:
+            deleted += rebase(entry_id, keep_from)
+    return deleted
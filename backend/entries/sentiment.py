@@ -0,0 +1,123 @@
+import re
+from functools import lru_cache
+
+from django.db.models import F, Q
+
+from backend.fields import to_text
+
+from .models import Entry
+
+# Небольшой русско-английский словарь тональности. Слово совпадает с основой,
+# если после неё идёт окончание: у русских — не длиннее RU_MAX_ENDING букв,
+# у английских — только из ENGLISH_SUFFIXES (иначе crystal давал бы cry,
+# saddle — sad). Короткие слова заданы целиком.
+POSITIVE_STEMS = (
+    'радост', 'радуюс', 'счастл', 'счасть', 'любим', 'люблю', 'хорош', 'отличн',
+    'прекрасн', 'замечат', 'весел', 'улыб', 'спокойн', 'доволь', 'доволен',
+    'благодар', 'успешн', 'восторг', 'нравит', 'понрав', 'вдохнов', 'уютн',
+    'happ', 'joy', 'lov', 'great', 'wonderful', 'excit', 'grateful', 'gratitude', 'smil',
+    'calm', 'relax', 'enjoy', 'amazing', 'awesome', 'proud',
+)
+POSITIVE_WORDS = ('рад', 'рада', 'рады', 'good', 'nice', 'glad', 'fun')
+NEGATIVE_STEMS = (
+    'груст', 'грущ', 'печал', 'плох', 'ужасн', 'злост', 'злюс', 'тоск', 'устал',
+    'страшн', 'боюс', 'одинок', 'обид', 'раздраж', 'тревож', 'тревог', 'плач',
+    'плака', 'ненави', 'скучн', 'скуча', 'разочаров', 'депресс', 'больно',
+    'sad', 'terribl', 'awful', 'angr', 'tired', 'lonel', 'afraid', 'anxi',
+    'cry', 'cri', 'hate', 'hating', 'hatred', 'bored', 'boring', 'upset', 'depress', 'worr', 'stress',
+)
+NEGATIVE_WORDS = ('bad', 'зло', 'злой', 'злая', 'мрак')
+# Слова, которые начинаются с основы, но оценки не несут
+NEUTRAL_WORDS = frozenset(('довольно', 'тоскана', 'тосканы', 'тоскане'))
+NEGATIONS = frozenset(('не', 'нет', 'ни', 'not', 'no', 'never', "don't", "didn't", "isn't", 'dont'))
+
+MIN_STEM = 3
+RU_MAX_ENDING = 6
+ENGLISH_SUFFIXES = frozenset((
+    '', 's', 'es', 'e', 'ed', 'd', 'ing', 'ting', 'ly', 'ely', 'y', 'ey', 'ily', 'ier', 'iest',
+    'iness', 'ness', 'ied', 'ies', 'ying', 'ful', 'fully', 'ous', 'ously', 'ety', 'ion', 'ive',
+    'ment', 'ement', 'able', 'ation', 'er', 'ers', 'est', 'der', 'dest', 'om',
+))
+TOKEN_RE = re.compile(r"[a-zа-яё']+")
+
+LEXICON = {
+    **{stem: 1.0 for stem in POSITIVE_STEMS},
+    **{stem: -1.0 for stem in NEGATIVE_STEMS},
+}
+EXACT = {
+    **{word: 1.0 for word in POSITIVE_WORDS},
+    **{word: -1.0 for word in NEGATIVE_WORDS},
+    **{word: 0.0 for word in NEUTRAL_WORDS},
+}
+
+
+def _is_ending(rest, latin):
+    return rest in ENGLISH_SUFFIXES if latin else len(rest) <= RU_MAX_ENDING
+
+
+@lru_cache(maxsize=100_000)
+def word_weight(token):
+    """Вес слова: точное совпадение или самая длинная основа словаря с допустимым окончанием."""
+    if token in EXACT:
+        return EXACT[token]
+    latin = 'a' <= token[0] <= 'z'
+    for length in range(len(token), MIN_STEM - 1, -1):
+        weight = LEXICON.get(token[:length])
+        if weight is not None and _is_ending(token[length:], latin):
+            return weight
+    return 0.0
+
+
+def score_text(text):
+    """Тональность текста от -1 (негатив) до 1 (позитив); 0, если оценочных слов нет."""
+    total = 0.0
+    matched = 0
+    negate = False
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in NEGATIONS:
+            negate = True
+            continue
+        weight = word_weight(token)
+        if weight:
+            total += -weight if negate else weight
+            matched += 1
+        negate = False
+    return total / matched if matched else 0.0
+
+
+def stale_entries():
+    """Записи без оценки или изменённые после последней оценки."""
+    return Entry.objects.filter(
+        Q(sentiment_scored_at__isnull=True) | Q(updated_at__gt=F('sentiment_scored_at'))
+    )
+
+
+def score_entries(chunk_size=1000, full=False, progress=None):
+    """
+    Оценивает записи пачками по возрастанию id и сохраняет результат через bulk_update,
+    не трогая updated_at. В sentiment_scored_at пишется updated_at оценённой версии,
+    поэтому запись, изменённая во время прогона, будет оценена в следующий раз.
+    """
+    queryset = Entry.objects.all() if full else stale_entries()
+    last_id = 0
+    scored = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'content', 'updated_at')[:chunk_size]
+        )
+        if not rows:
+            break
+        Entry.objects.bulk_update(
+            [
+                Entry(id=entry_id, sentiment_score=score_text(to_text(content) or ''), sentiment_scored_at=updated_at)
+                for entry_id, content, updated_at in rows
+            ],
+            ['sentiment_score', 'sentiment_scored_at'],
+        )
+        last_id = rows[-1][0]
+        scored += len(rows)
+        if progress:
+            progress(scored)
+    return scored
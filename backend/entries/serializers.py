@@ -1,11 +1,14 @@
 from rest_framework import serializers
-from .models import Entry
+from .models import Entry, EntryRevision
+from .revisions import save_with_revision
 import logging
 
 logger = logging.getLogger(__name__)
 
 class EntrySerializer(serializers.ModelSerializer):
     author = serializers.SerializerMethodField()
+    # content хранится в CompressedTextField; для API это обычный текст
+    content = serializers.CharField(required=False, allow_blank=True, style={'base_type': 'textarea'})
 
     class Meta:
         model = Entry
@@ -14,9 +17,9 @@ class EntrySerializer(serializers.ModelSerializer):
             'font_size', 'text_align', 'is_bold', 'is_underline', 
             'is_strikethrough', 'list_type', 'location', 'cover_image', 
             'date', 'created_at', 'updated_at', 'hashtags', 'is_public',
-            'author'
+            'author', 'excerpt', 'version'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at', 'excerpt', 'version']
 
     def get_author(self, obj):
         user = obj.user
@@ -36,10 +39,10 @@ class EntrySerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         try:
-            logger.debug(f"Entry create validated_data: {validated_data}")
-            return Entry.objects.create(**validated_data)
+            logger.debug('Entry create fields: %s', validated_data.keys())
+            return save_with_revision(Entry(**validated_data))
         except Exception as e:
-            logger.error(f"Error creating entry: {str(e)}")
+            logger.exception('Error creating entry')
             raise serializers.ValidationError(f"Error creating entry: {str(e)}")
 
     def update(self, instance, validated_data):
@@ -50,8 +53,7 @@ class EntrySerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
-        instance.save()
-        return instance
+        return save_with_revision(instance)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -60,3 +62,14 @@ class EntrySerializer(serializers.ModelSerializer):
         # representation.pop('content', None)
 
         return representation
+
+
+class EntryRevisionSerializer(serializers.ModelSerializer):
+    changed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = EntryRevision
+        fields = ['number', 'kind', 'changed', 'created_at']
+
+    def get_changed(self, obj):
+        return obj.changed.split(',') if obj.changed else []
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from emotions.models import Emotion
+from users.models import User
+from .heatmap import invalidate_heatmap
+from .models import Change, Entry
+from .sync import record_change
+
+
+@receiver([post_save, post_delete], sender=Entry)
+@receiver([post_save, post_delete], sender=Emotion)
+def invalidate_user_heatmap(sender, instance, **kwargs):
+    invalidate_heatmap(instance.user_id)
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_save, sender=Emotion)
+def log_upsert(sender, instance, **kwargs):
+    record_change(instance, Change.UPSERT)
+
+
+@receiver(post_delete, sender=Entry)
+@receiver(post_delete, sender=Emotion)
+def log_delete(sender, instance, origin=None, **kwargs):
+    # При удалении пользователя его журнал удаляется каскадом — tombstone некому читать
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    record_change(instance, Change.DELETE)
+
@@ -0,0 +1,91 @@
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+
+from emotions.models import Emotion
+from emotions.serializers import EmotionSerializer
+from .models import Change, Entry
+from .serializers import EntrySerializer
+
+# Лента изменений для офлайн-клиентов: клиент хранит токен (seq последнего
+# полученного изменения) и при запуске забирает только то, что изменилось
+# после него. Изменения пишутся в той же транзакции, что и сами данные.
+#
+# seq выдаётся при вставке, а видна строка после коммита. Если бы транзакция
+# с меньшим seq коммитилась позже транзакции с большим, курсор клиента ушёл бы
+# дальше и изменение потерялось. Поэтому изменения одного пользователя пишутся
+# под транзакционной advisory-блокировкой на PostgreSQL (держится до коммита):
+# следующая транзакция получает seq только после коммита предыдущей, и все
+# видимые изменения пользователя старше любого ещё не закоммиченного.
+# SQLite и так пропускает пишущие транзакции по одной.
+
+KINDS = {Entry: Change.ENTRY, Emotion: Change.EMOTION}
+# Пространство ключей advisory-блокировок ленты (первый аргумент pg_advisory_xact_lock)
+FEED_LOCK_SPACE = 0x5359
+
+
+def _lock_feed(connection, user_id):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # int4: совпадение ключей у разных пользователей лишь упорядочит их записи
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [FEED_LOCK_SPACE, user_id % 2 ** 31])
+
+
+def record_change(instance, op):
+    using = router.db_for_write(Change)
+    # В autocommit блокировка и вставка — одна транзакция; внутри чужой — её часть
+    with transaction.atomic(using=using, savepoint=False):
+        _lock_feed(connections[using], instance.user_id)
+        Change.objects.using(using).create(
+            user_id=instance.user_id, kind=KINDS[type(instance)], object_id=instance.pk, op=op
+        )
+
+
+def changes_since(user, since, limit, request):
+    """
+    Изменения пользователя с seq > since, не больше limit, по возрастанию seq.
+    Несколько изменений одного объекта внутри страницы схлопываются в последнее.
+    """
+    rows = list(
+        Change.objects.filter(user=user, seq__gt=since)
+        .order_by('seq')
+        .values_list('seq', 'kind', 'object_id', 'op')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for seq, kind, object_id, op in rows:
+        latest.pop((kind, object_id), None)
+        latest[(kind, object_id)] = (seq, op)
+
+    upserts = {kind: [object_id for (k, object_id), (_, op) in latest.items() if k == kind and op == Change.UPSERT]
+               for kind in (Change.ENTRY, Change.EMOTION)}
+    entries = Entry.objects.filter(user=user, id__in=upserts[Change.ENTRY]).select_related('user')
+    emotions = Emotion.objects.filter(user=user, id__in=upserts[Change.EMOTION])
+    data = {
+        Change.ENTRY: {item['id']: item for item in EntrySerializer(entries, many=True, context={'request': request}).data},
+        Change.EMOTION: {item['id']: item for item in EmotionSerializer(emotions, many=True).data},
+    }
+
+    changes = []
+    for (kind, object_id), (seq, op) in latest.items():
+        change = {'seq': seq, 'type': kind, 'id': object_id, 'op': op}
+        if op == Change.UPSERT:
+            if object_id not in data[kind]:
+                # Объект удалён позже — его tombstone придёт на следующей странице
+                continue
+            change['data'] = data[kind][object_id]
+        changes.append(change)
+
+    return {
+        'changes': changes,
+        'next': str(rows[-1][0] if rows else since),
+        'has_more': has_more,
+    }
+
+
+def compact_changes():
+    """Удаляет изменения, после которых у того же объекта есть более новое: клиенту хватит последнего."""
+    newer = Change.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'), seq__gt=OuterRef('seq'))
+    deleted, _ = Change.objects.filter(Exists(newer)).delete()
+    return deleted
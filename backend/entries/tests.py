@@ -1,3 +1,505 @@
-from django.test import TestCase
+import random
+import threading
+import time
+import unittest
+from datetime import timedelta
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from emotions.models import Emotion
+from users.models import User
+from users.tests import shared_cache
+from . import autosave
+from . import heatmap
+from .jobs import flush_autosave
+from .models import Change, Entry, EntryRevision
+from .sentiment import score_entries, score_text, stale_entries
+from .revisions import apply_text_delta, prune_revisions, rebuild, state_of, text_delta
+from .sync import changes_since, compact_changes
+
+
+def make_user(name='alice'):
+    return User.objects.create_user(username=name, email=f'{name}@example.com', password='pass12345!X')
+
+
+class ChangesFeedTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def feed(self, since=0, limit=100):
+        response = self.client.get(f'/api/entries/changes/?since={since}&limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_in_seq_order_with_paging(self):
+        entries = [Entry.objects.create(user=self.user, title=f't{i}') for i in range(3)]
+        emotion = Emotion.objects.create(user=self.user, emotion_type='joy')
+
+        page = self.feed(limit=2)
+        self.assertEqual([(c['type'], c['id']) for c in page['changes']],
+                         [('entry', entries[0].pk), ('entry', entries[1].pk)])
+        self.assertTrue(page['has_more'])
+        seqs = [c['seq'] for c in page['changes']]
+        self.assertEqual(seqs, sorted(seqs))
+
+        page = self.feed(since=page['next'], limit=2)
+        self.assertEqual([(c['type'], c['id']) for c in page['changes']],
+                         [('entry', entries[2].pk), ('emotion', emotion.pk)])
+        self.assertFalse(page['has_more'])
+        self.assertEqual(self.feed(since=page['next']), {'changes': [], 'next': page['next'], 'has_more': False})
+
+    def test_updates_collapse_to_latest_state(self):
+        entry = Entry.objects.create(user=self.user, title='first')
+        entry.title = 'second'
+        entry.save()
+        changes = self.feed()['changes']
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['op'], 'upsert')
+        self.assertEqual(changes[0]['data']['title'], 'second')
+
+    def test_delete_leaves_tombstone(self):
+        entry = Entry.objects.create(user=self.user, title='gone')
+        cursor = self.feed()['next']
+        entry_id = entry.pk
+        entry.delete()
+        changes = self.feed(since=cursor)['changes']
+        self.assertEqual(changes, [{'seq': changes[0]['seq'], 'type': 'entry', 'id': entry_id, 'op': 'delete'}])
+        # С самого начала: создание и удаление схлопываются в tombstone
+        self.assertEqual([c['op'] for c in self.feed()['changes']], ['delete'])
+
+    def test_upsert_of_object_deleted_on_later_page_is_skipped(self):
+        entry = Entry.objects.create(user=self.user, title='x')
+        entry_id = entry.pk
+        other = Entry.objects.create(user=self.user, title='y')
+        entry.delete()
+        page = self.feed(limit=2)
+        self.assertEqual([c['id'] for c in page['changes']], [other.pk])
+        self.assertEqual([(c['id'], c['op']) for c in self.feed(since=page['next'])['changes']],
+                         [(entry_id, 'delete')])
+
+    def test_other_users_changes_are_hidden(self):
+        Entry.objects.create(user=make_user('bob'), title='bob')
+        self.assertEqual(self.feed()['changes'], [])
+
+    def test_user_deletion_writes_no_tombstones(self):
+        Entry.objects.create(user=self.user, title='x')
+        self.user.delete()
+        self.assertFalse(Change.objects.exists())
+
+    def test_compaction_keeps_latest_change(self):
+        entry = Entry.objects.create(user=self.user, title='x')
+        entry.save()
+        entry.delete()
+        self.assertEqual(compact_changes(), 2)
+        self.assertEqual(list(Change.objects.values_list('op', flat=True)), ['delete'])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'advisory locks are PostgreSQL-only')
+class ChangesFeedOrderingTests(TransactionTestCase):
+    def test_cursor_never_passes_uncommitted_change(self):
+        user = make_user()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    Entry.objects.create(user=user, title='slow')
+                    started.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        def fast_writer():
+            try:
+                Entry.objects.create(user=user, title='fast')
+            finally:
+                connections.close_all()
+
+        slow = threading.Thread(target=slow_writer)
+        slow.start()
+        self.assertTrue(started.wait(5))
+        fast = threading.Thread(target=fast_writer)
+        fast.start()
+        time.sleep(0.3)
+
+        # Медленная транзакция ещё открыта: быстрая ждёт её и ничего не видно
+        page = changes_since(user, 0, 100, None)
+        self.assertEqual(page['changes'], [])
+        self.assertTrue(fast.is_alive())
+
+        release.set()
+        slow.join(5)
+        fast.join(5)
+        page = changes_since(user, 0, 100, None)
+        self.assertEqual([c['data']['title'] for c in page['changes']], ['slow', 'fast'])
+
+
+class TextDeltaTests(TestCase):
+    def test_round_trip(self):
+        rnd = random.Random(49)
+        text = 'Сегодня был длинный день.\n' * 20
+        for _ in range(200):
+            new = list(text)
+            for _ in range(rnd.randint(1, 5)):
+                at = rnd.randint(0, len(new))
+                new[at:at + rnd.randint(0, 10)] = rnd.choice(['', 'ёж', 'новый текст', '\n'])
+            new = ''.join(new)
+            self.assertEqual(apply_text_delta(text, text_delta(text, new)), new)
+            text = new
+
+    def test_large_change_is_one_replacement(self):
+        with self.settings(REVISION_DIFF_LIMIT=10):
+            self.assertEqual(text_delta('abcXYZdef', 'abc0123456789def'), [[3, 6, '0123456789']])
+        self.assertEqual(text_delta('same', 'same'), [])
+
+
+@override_settings(REVISION_SNAPSHOT_EVERY=3)
+class RevisionTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/entries/', {'title': 'v1', 'content': 'Первая строка.'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.entry = Entry.objects.get(pk=response.json()['id'])
+        self.states = [state_of(self.entry)]
+
+    def edit(self, **fields):
+        response = self.client.patch(f'/api/entries/{self.entry.pk}/', fields, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.states.append(state_of(Entry.objects.get(pk=self.entry.pk)))
+
+    def edit_many(self, count=10):
+        content = self.states[-1]['content']
+        for i in range(count):
+            content = content.replace('строка', f'строка {i}') + f'\nПравка {i}.'
+            self.edit(content=content, **({'title': f'title {i}'} if i % 4 == 0 else {}))
+
+    def assert_rebuilds(self, numbers):
+        for number in numbers:
+            with self.subTest(number=number):
+                self.assertEqual(rebuild(self.entry.pk, number), self.states[number - 1])
+
+    def test_every_revision_rebuilds_after_edits(self):
+        self.edit_many()
+        self.edit(is_public=True, date='2024-05-01')
+        revisions = list(self.entry.revisions.order_by('number'))
+        self.assertEqual([r.number for r in revisions], list(range(1, len(self.states) + 1)))
+        # Snapshot не реже чем раз в REVISION_SNAPSHOT_EVERY версий
+        kinds = [r.kind for r in revisions]
+        self.assertEqual(kinds[0], EntryRevision.SNAPSHOT)
+        self.assertNotIn([EntryRevision.DELTA] * 3, [kinds[i:i + 3] for i in range(len(kinds))])
+        self.assertIn(EntryRevision.DELTA, kinds)
+        self.assert_rebuilds(range(1, len(self.states) + 1))
+        self.assertIsNone(rebuild(self.entry.pk, len(self.states) + 1))
+
+    def test_unchanged_save_adds_no_revision(self):
+        self.client.patch(f'/api/entries/{self.entry.pk}/', {'title': 'v1'}, format='json')
+        self.assertEqual(self.entry.revisions.count(), 1)
+
+    def test_plain_save_does_not_touch_history(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.entry.title = 'mass update'
+            self.entry.save()
+            Entry.objects.bulk_create([Entry(user=self.user, title='bulk')])
+        self.assertFalse([q for q in queries if 'entryrevision' in q['sql']])
+        self.assertEqual(self.entry.revisions.count(), 1)
+
+        # Следующая правка через API сначала сохраняет то, что лежит в БД
+        Entry.objects.filter(pk=self.entry.pk).update(title='outside')
+        EntryRevision.objects.filter(entry=self.entry).delete()
+        self.states = [{**self.states[0], 'title': 'outside'}]
+        self.edit(title='v2')
+        self.assert_rebuilds([1, 2])
+
+    def test_restore_becomes_new_revision(self):
+        self.edit_many(4)
+        response = self.client.post(f'/api/entries/{self.entry.pk}/revisions/2/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], self.states[1]['content'])
+        self.assertEqual(rebuild(self.entry.pk, len(self.states) + 1), self.states[1])
+        self.assertEqual(self.client.post(f'/api/entries/{self.entry.pk}/revisions/99/restore/').status_code, 404)
+
+    def test_prune_by_count_keeps_latest_rebuildable(self):
+        self.edit_many()
+        total = len(self.states)
+        with self.settings(REVISION_MAX_PER_ENTRY=4):
+            self.assertEqual(prune_revisions(), total - 4)
+        numbers = list(self.entry.revisions.order_by('number').values_list('number', flat=True))
+        self.assertEqual(numbers, list(range(total - 3, total + 1)))
+        self.assertEqual(self.entry.revisions.get(number=total - 3).kind, EntryRevision.SNAPSHOT)
+        self.assert_rebuilds(numbers)
+        self.assertIsNone(rebuild(self.entry.pk, 1))
+
+        # После обрезки история продолжается как обычно
+        self.edit(title='after prune')
+        self.assert_rebuilds([total + 1])
+
+    def test_prune_by_age_always_keeps_last(self):
+        self.edit_many(5)
+        total = len(self.states)
+        old = timezone.now() - timedelta(days=100)
+        self.entry.revisions.filter(number__lte=4).update(created_at=old)
+        self.assertEqual(prune_revisions(), 4)
+        self.assertEqual(self.entry.revisions.order_by('number').first().number, 5)
+        self.assert_rebuilds(range(5, total + 1))
+
+        self.entry.revisions.update(created_at=old)
+        prune_revisions()
+        self.assertEqual(list(self.entry.revisions.values_list('number', flat=True)), [total])
+        self.assert_rebuilds([total])
+
+
+@override_settings(TASKS_EAGER=False, AUTOSAVE_QUIET_SECONDS=0)
+class AutosaveTests(TestCase):
+    def setUp(self):
+        shared_cache(self)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.entry = Entry.objects.create(user=self.user, title='draft', content='a')
+        self.url = f'/api/entries/{self.entry.pk}/'
+
+    def patch(self, version, commit=False, **fields):
+        return self.client.post(f'{self.url}autosave/', {'version': version, 'fields': fields, 'commit': commit},
+                                format='json')
+
+    def stored(self):
+        return Entry.objects.get(pk=self.entry.pk)
+
+    def test_patches_accumulate_until_commit(self):
+        version = self.entry.version
+        self.assertEqual(self.patch(version, content='ab').json(), {'version': version + 1, 'saved': False})
+        self.assertEqual(self.patch(version + 1, title='t').json(), {'version': version + 2, 'saved': False})
+        self.assertEqual(self.stored().content, 'a')
+
+        self.assertEqual(self.patch(version + 2, commit=True).json(), {'version': version + 2, 'saved': True})
+        stored = self.stored()
+        self.assertEqual((stored.title, stored.content, stored.version), ('t', 'ab', version + 2))
+        self.assertIsNone(autosave.get_draft(self.entry.pk))
+
+    def test_stale_version_conflicts_with_current_version(self):
+        version = self.entry.version
+        self.patch(version, content='ab')
+        response = self.patch(version, content='xy')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], version + 1)
+        self.assertEqual(autosave.get_draft(self.entry.pk)['fields'], {'content': 'ab'})
+
+    def test_busy_draft_conflicts(self):
+        cache.add(f'autosave:lock:{self.entry.pk}', 1)
+        with mock.patch.object(autosave, 'LOCK_WAIT', 0.05):
+            response = self.patch(self.entry.version, content='ab')
+            self.assertEqual(response.status_code, 409)
+            self.assertNotIn('version', response.json())
+
+            # Запись поверх занятого черновика тоже 409, а не 500
+            cache.set(autosave._draft_key(self.entry.pk), {
+                'base': self.entry.version, 'version': self.entry.version + 1,
+                'fields': {'content': 'ab'}, 'started': time.time(), 'touched': time.time(),
+            })
+            self.assertEqual(self.client.patch(self.url, {'title': 'x'}, format='json').status_code, 409)
+
+    def test_read_shows_draft_without_writing(self):
+        version = self.entry.version
+        self.patch(version, content='ab')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual((response.json()['content'], response.json()['version']), ('ab', version + 1))
+        self.assertFalse([q for q in queries if not q['sql'].lstrip().upper().startswith('SELECT')])
+        self.assertEqual(self.stored().content, 'a')
+        self.assertIsNotNone(autosave.get_draft(self.entry.pk))
+
+    def test_update_writes_draft_first(self):
+        self.patch(self.entry.version, content='ab')
+        response = self.client.patch(self.url, {'title': 'new'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        stored = self.stored()
+        self.assertEqual((stored.title, stored.content), ('new', 'ab'))
+        self.assertIsNone(autosave.get_draft(self.entry.pk))
+
+    def test_job_flushes_quiet_draft(self):
+        self.patch(self.entry.version, content='ab')
+        flush_autosave.func(self.entry.pk)
+        self.assertEqual(self.stored().content, 'ab')
+        self.assertEqual(rebuild(self.entry.pk, 2)['content'], 'ab')
+        self.assertIsNone(autosave.get_draft(self.entry.pk))
+
+    def test_local_cache_saves_each_patch(self):
+        # Черновик в памяти процесса не увидел бы воркер задач
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            version = self.entry.version
+            self.assertEqual(self.patch(version, content='ab').json(), {'version': version + 1, 'saved': True})
+            self.assertIsNone(autosave.get_draft(self.entry.pk))
+            stored = self.stored()
+            self.assertEqual((stored.content, stored.version), ('ab', version + 1))
+            self.assertEqual(rebuild(self.entry.pk, 2)['content'], 'ab')
+
+            response = self.patch(version, content='xy')
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['version'], version + 1)
+            self.assertEqual(self.patch(version + 1, commit=True).json(), {'version': version + 1, 'saved': False})
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        return self.client.get('/api/entries/heatmap/', {'year': 2024, **params})
+
+    def emotion(self, emotion_type, timestamp):
+        emotion = Emotion.objects.create(user=self.user, emotion_type=emotion_type)
+        Emotion.objects.filter(pk=emotion.pk).update(timestamp=timestamp)
+
+    def test_day_cells(self):
+        Entry.objects.create(user=self.user, title='a', date='2024-01-02')
+        Entry.objects.create(user=self.user, title='b', date='2024-01-02')
+        Entry.objects.create(user=self.user, title='other year', date='2023-01-02')
+        Entry.objects.create(user=make_user('bob'), title='bob', date='2024-01-02')
+        self.emotion('sadness', '2024-03-01T10:00:00Z')
+        self.emotion('joy', '2024-03-01T11:00:00Z')
+        self.emotion('sadness', '2024-03-01T12:00:00Z')
+        # 23:30 UTC 31 декабря — уже 1 января 2024 в Москве
+        self.emotion('joy', '2023-12-31T23:30:00Z')
+
+        data = self.get(tz='Europe/Moscow').json()
+        self.assertEqual((data['start'], data['days']), ('2024-01-01', 366))
+        self.assertEqual(sum(data['entries']), 2)
+        self.assertEqual(data['entries'][1], 2)
+        sadness, joy = data['emotions'].index('sadness'), data['emotions'].index('joy')
+        self.assertEqual(data['mood'][31 + 29], sadness)
+        self.assertEqual(data['mood'][0], joy)
+        self.assertEqual(data['mood'].count(heatmap.NO_MOOD), 364)
+
+        utc = self.get(tz='UTC').json()
+        self.assertEqual(utc['mood'][0], heatmap.NO_MOOD)
+
+    def test_validation(self):
+        for params in ({'year': 'abc'}, {'year': 1800}, {'tz': 'Mars/Olympus'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+    def test_invalidated_by_entry_and_emotion(self):
+        self.assertEqual(sum(self.get().json()['entries']), 0)
+        entry = Entry.objects.create(user=self.user, title='a', date='2024-05-05')
+        self.assertEqual(sum(self.get().json()['entries']), 1)
+        self.emotion('joy', '2024-05-05T12:00:00Z')
+        data = self.get().json()
+        self.assertEqual(data['mood'][125], data['emotions'].index('joy'))
+        entry.delete()
+        self.assertEqual(sum(self.get().json()['entries']), 0)
+
+    def test_local_cache_keeps_heatmap_briefly(self):
+        with mock.patch.object(heatmap, 'cache', wraps=cache) as spy:
+            self.get()
+        self.assertEqual(spy.set.call_args.args[2], 60)
+        with mock.patch.object(heatmap, 'is_shared', return_value=True), \
+                mock.patch.object(heatmap, 'cache', wraps=cache) as spy:
+            self.get(year=2023)
+        self.assertEqual(spy.set.call_args.args[2], 60 * 60 * 24)
+
+
+class SentimentTests(TestCase):
+    def test_score_text(self):
+        cases = {
+            'Сегодня я счастлива, всё отлично': 1.0,
+            'Грустно и тоскливо': -1.0,
+            'happy but tired': 0.0,
+            'So happy, loved it, but worried': 1 / 3,
+            'Ничего особенного': 0.0,
+            '': 0.0,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertAlmostEqual(score_text(text), expected)
+
+    def test_negation_flips_next_word_only(self):
+        self.assertEqual(score_text('я не рад'), -1.0)
+        self.assertEqual(score_text("I'm not sad"), 1.0)
+        self.assertEqual(score_text('not sad, just tired'), 0.0)
+
+    def test_stems_need_a_real_ending(self):
+        for text in ('crystal saddle', 'grater', 'happening', 'joystick', 'довольно холодно', 'Тоскана'):
+            with self.subTest(text=text):
+                self.assertEqual(score_text(text), 0.0)
+        for text in ('sadness', 'saddest', 'cried', 'crying', 'lovely', 'грустный', 'радостного'):
+            with self.subTest(text=text):
+                self.assertNotEqual(score_text(text), 0.0)
+
+    def test_score_entries_only_rescores_changed(self):
+        user = make_user()
+        happy = Entry.objects.create(user=user, title='a', content='happy day')
+        sad = Entry.objects.create(user=user, title='b', content='sad day')
+        self.assertEqual(score_entries(chunk_size=1), 2)
+        happy.refresh_from_db()
+        self.assertEqual(happy.sentiment_score, 1.0)
+        self.assertEqual(happy.sentiment_scored_at, happy.updated_at)
+        self.assertFalse(stale_entries().exists())
+        self.assertEqual(score_entries(), 0)
+
+        sad.content = 'great day'
+        sad.save()
+        self.assertEqual(list(stale_entries()), [sad])
+        self.assertEqual(score_entries(), 1)
+        self.assertEqual(Entry.objects.get(pk=sad.pk).sentiment_score, 1.0)
+        self.assertEqual(score_entries(full=True), 2)
+
+    def test_mood_match(self):
+        user = make_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        Entry.objects.create(user=user, title='a', content='happy', date=timezone.localdate())
+        Emotion.objects.create(user=user, emotion_type='joy')
+        score_entries()
+
+        data = client.get('/api/entries/mood_match/?days=7').json()
+        self.assertEqual(data['days'], [{'date': timezone.localdate().isoformat(), 'written': 1.0, 'logged': 1.0}])
+        self.assertEqual((data['written_avg'], data['logged_avg'], data['agreement']), (1.0, 1.0, 1.0))
+
+        Emotion.objects.create(user=user, emotion_type='sadness')
+        Emotion.objects.create(user=user, emotion_type='sadness')
+        data = client.get('/api/entries/mood_match/').json()
+        self.assertEqual(data['agreement'], 0.0)
+        self.assertEqual(client.get('/api/entries/mood_match/?days=x').status_code, 400)
+
+
+class EntrySearchTextTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.entry = Entry.objects.create(user=self.user, content='начало\n\n' + 'слово ' * 100 + 'иголка')
+
+    def test_search_text_follows_content(self):
+        self.assertEqual(len(self.entry.excerpt), 300)
+        self.assertTrue(self.entry.search_text.endswith('слово иголка'))
+        # Копия для поиска по умолчанию не загружается
+        entry = Entry.objects.get(pk=self.entry.pk)
+        self.assertEqual(entry.get_deferred_fields(), {'search_text'})
+        entry.content = 'другой текст'
+        entry.save(update_fields=['content'])
+        self.assertEqual(Entry.objects.values_list('search_text', flat=True).get(pk=entry.pk), 'другой текст')
+
+    def test_admin_searches_whole_text(self):
+        other = Entry.objects.create(user=self.user, content='ничего')
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345!X')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/entries/entry/', {'q': 'иголка'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [self.entry])
+        self.assertNotIn(other, response.context['cl'].result_list)
@@ -2,24 +2,41 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from .models import Entry
-from .serializers import EntrySerializer
+from .serializers import EntryRevisionSerializer, EntrySerializer
 from users.models import User  # Импортируем кастомную модель User
+import copy
 import logging
 import traceback
-from datetime import datetime
-from django.db.models import Q
+from datetime import datetime, timedelta
+from django.db.models import Avg, Case, FloatField, Q, Value, When
 import os
 from django.conf import settings
+from django.utils import timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.db.models.functions import Coalesce, TruncDate
+from emotions.models import Emotion
+from .autosave import DraftBusy, StaleVersion, apply_patch, flush_draft, get_draft, uses_drafts
+from .heatmap import get_year_heatmap
+from .revisions import VERSIONED_FIELDS, rebuild, restore as restore_revision
+from .sync import changes_since
+from backend.uploads import UploadSlotMixin
+from blobs.jobs import shrink_later
 
 
 logger = logging.getLogger(__name__)
 
+
+class DraftBusyError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Entry is being saved, retry'
+
 # Create your views here.
 
-class EntryViewSet(viewsets.ModelViewSet):
+class EntryViewSet(UploadSlotMixin, viewsets.ModelViewSet):
     serializer_class = EntrySerializer
 
     def get_permissions(self):
@@ -37,17 +54,35 @@ class EntryViewSet(viewsets.ModelViewSet):
             return Entry.objects.filter(user=self.request.user).order_by('-created_at')
         return Entry.objects.none()
 
+    def get_object(self):
+        entry = super().get_object()
+        if self.action == 'autosave':
+            return entry
+        if self.request.method in permissions.SAFE_METHODS:
+            # Чтение видит ещё не записанное автосохранение, но в БД не пишет
+            draft = get_draft(entry.pk)
+            if draft is not None:
+                for name, value in draft['fields'].items():
+                    setattr(entry, name, value)
+                entry.version = draft['version']
+            return entry
+        # Изменение записи идёт поверх черновика, поэтому сначала пишем его
+        try:
+            return flush_draft(entry.pk, entry) or entry
+        except DraftBusy:
+            raise DraftBusyError
+
     @action(detail=False, methods=['get'])
     def public(self, request):
         """
         Возвращает все публичные записи всех пользователей.
         """
         try:
-            entries = Entry.objects.filter(is_public=True).select_related('user').order_by('-created_at')
+            entries = Entry.objects.filter(is_public=True).select_related('user').order_by('-created_at').cache()
             serializer = self.get_serializer(entries, many=True, context={'request': request})
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error fetching all public entries: {str(e)}")
+            logger.exception('Error fetching all public entries')
             return Response(
                 {"detail": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -57,33 +92,34 @@ class EntryViewSet(viewsets.ModelViewSet):
         try:
             # Проверяем, что пользователь существует в базе данных
             user_id = self.request.user.id
-            logger.info(f"Creating entry for user: {self.request.user.username}, ID: {user_id}")
+            logger.info('Creating entry for user %s', user_id)
             
             try:
                 # Получаем объект пользователя напрямую из модели User
                 user = User.objects.get(id=user_id)
-                logger.info(f"Found user for create entry: {user.username}, ID: {user.id}")
-                serializer.save(user=user)
+                entry = serializer.save(user=user)
+                if 'cover_image' in self.request.FILES:
+                    shrink_later(entry, 'cover_image')
             except User.DoesNotExist:
-                logger.error(f"User with ID {user_id} does not exist")
+                logger.error('User with ID %s does not exist', user_id)
                 raise ValueError(f"User with ID {user_id} does not exist")
         except Exception as e:
-            logger.error(f"Error in perform_create: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception('Error in perform_create')
             raise
 
+    def perform_update(self, serializer):
+        entry = serializer.save()
+        if 'cover_image' in self.request.FILES:
+            shrink_later(entry, 'cover_image')
+
     def create(self, request, *args, **kwargs):
         try:
-            logger.debug(f"Request data: {request.data}")
-            logger.info(f"Date from request: {request.data.get('date')}")
-            logger.info(f"User creating entry: {request.user.username}, ID: {request.user.id}")
-            
-            # Получаем всех пользователей из базы (для диагностики)
-            all_users = User.objects.all()
-            logger.info(f"All users in database: {', '.join([f'{u.id}({u.username})' for u in all_users[:10]])}")
+            # Только имена полей: содержимое записи и файлы в лог не попадают
+            logger.debug('Entry create fields: %s', request.data.keys())
+            logger.info('User %s creating entry, date=%s', request.user.id, request.data.get('date'))
             
-            # Создаем копию данных для модификации
-            data = request.data.copy()
+            # Поверхностная копия: загруженные файлы лежат во временных файлах и не копируются
+            data = copy.copy(request.data)
             
             # Преобразуем дату в правильный формат
             date_str = data.get('date')
@@ -91,7 +127,7 @@ class EntryViewSet(viewsets.ModelViewSet):
                 try:
                     date = datetime.strptime(date_str, '%Y-%m-%d').date()
                     data['date'] = date
-                    logger.info(f"Parsed date for create: {date}")
+                    logger.debug('Parsed date for create: %s', date)
                 except ValueError:
                     return Response(
                         {"detail": "Invalid date format. Use YYYY-MM-DD"},
@@ -106,15 +142,17 @@ class EntryViewSet(viewsets.ModelViewSet):
                 self.perform_create(serializer)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             except ValueError as ve:
-                logger.error(f"Value error in create: {str(ve)}")
+                logger.warning('Value error in create: %s', ve)
                 return Response(
                     {"detail": str(ve)},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+        except APIException:
+            # Ошибки валидации и загрузки отдаются клиенту как есть
+            raise
         except Exception as e:
-            logger.error(f"Error in create: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception('Error in create')
             return Response(
                 {
                     "detail": str(e),
@@ -133,7 +171,7 @@ class EntryViewSet(viewsets.ModelViewSet):
                 return Response(serializer.data)
             return Response(None)
         except Exception as e:
-            logger.error(f"Error fetching last entry: {str(e)}")
+            logger.exception('Error fetching last entry')
             return Response(
                 {"detail": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -143,7 +181,7 @@ class EntryViewSet(viewsets.ModelViewSet):
     def by_date(self, request):
         try:
             date_str = request.query_params.get('date')
-            logger.info(f"Received date parameter: {date_str}")
+            logger.debug('Received date parameter: %s', date_str)
             
             if not date_str:
                 return Response(
@@ -153,7 +191,6 @@ class EntryViewSet(viewsets.ModelViewSet):
 
             try:
                 date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                logger.info(f"Parsed date: {date}")
             except ValueError:
                 return Response(
                     {"detail": "Invalid date format. Use YYYY-MM-DD"},
@@ -164,18 +201,194 @@ class EntryViewSet(viewsets.ModelViewSet):
                 Q(date=date) | Q(created_at__date=date)
             ).order_by('-created_at')
             
-            logger.info(f"Found {entries.count()} entries for date {date}")
-            logger.info(f"Query: {entries.query}")
-
             serializer = self.get_serializer(entries, many=True)
+            logger.info('Found %d entries for date %s', len(serializer.data), date)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error fetching entries by date: {str(e)}")
+            logger.exception('Error fetching entries by date')
             return Response(
                 {"detail": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Изменения записей и эмоций после токена since: upsert с данными объекта
+        или delete. Клиент повторяет запрос с next, пока has_more.
+        """
+        try:
+            since = int(request.query_params.get('since') or 0)
+            limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {"detail": "since and limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+        return Response(changes_since(request.user, max(since, 0), limit, request))
+
+    @action(detail=True, methods=['get'])
+    def revisions(self, request, pk=None):
+        """Версии записи, новые первыми: номер, тип и список изменённых полей."""
+        entry = self.get_object()
+        return Response(EntryRevisionSerializer(entry.revisions.order_by('-number'), many=True).data)
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>\d+)')
+    def revision(self, request, pk=None, number=None):
+        """Поля записи в версии number."""
+        entry = self.get_object()
+        state = rebuild(entry.pk, int(number))
+        if state is None:
+            return Response({"detail": "Revision not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'number': int(number), **state})
+
+    @action(detail=True, methods=['post'], url_path=r'revisions/(?P<number>\d+)/restore')
+    def restore(self, request, pk=None, number=None):
+        """Возвращает запись к версии number; текущее состояние остаётся в истории."""
+        entry = self.get_object()
+        if restore_revision(entry, int(number)) is None:
+            return Response({"detail": "Revision not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(entry).data)
+
+    @action(detail=True, methods=['get', 'post'])
+    def autosave(self, request, pk=None):
+        """
+        POST {"version": 7, "fields": {"content": "..."}, "commit": false} ->
+        {"version": 8, "saved": false}. Правки копятся и пишутся в БД одним
+        UPDATE после паузы или сразу при commit; без общего кэша каждая правка
+        пишется сразу ("saved": true). Если version устарела — 409 с текущей
+        версией. GET — текущая версия и ещё не записанные поля.
+        """
+        entry = self.get_object()
+        if request.method == 'GET':
+            draft = get_draft(entry.pk)
+            if draft is None:
+                return Response({'version': entry.version, 'pending': {}})
+            return Response({'version': draft['version'], 'pending': draft['fields']})
+
+        version = request.data.get('version')
+        fields = request.data.get('fields') or {}
+        if not isinstance(version, int) or not isinstance(fields, dict):
+            return Response(
+                {"detail": "version must be an integer and fields an object"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        unknown = set(fields) - set(VERSIONED_FIELDS)
+        if unknown:
+            return Response(
+                {"detail": f"Fields cannot be autosaved: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(entry, data=fields, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            if fields:
+                version = apply_patch(entry, version, dict(serializer.validated_data))
+            saved = bool(fields) and not uses_drafts()
+            if request.data.get('commit') and flush_draft(entry.pk, entry) is not None:
+                saved = True
+            if saved:
+                version = entry.version
+        except StaleVersion as stale:
+            return Response(
+                {"detail": "Entry was changed since this version", "version": stale.version},
+                status=status.HTTP_409_CONFLICT
+            )
+        except DraftBusy:
+            return Response({"detail": "Entry is being saved, retry"}, status=status.HTTP_409_CONFLICT)
+        return Response({'version': version, 'saved': saved})
+
+    @action(detail=False, methods=['get'])
+    def heatmap(self, request):
+        """
+        Возвращает календарь года: по ячейке на день с числом записей и доминирующей эмоцией.
+        """
+        year_str = request.query_params.get('year')
+        try:
+            year = int(year_str) if year_str else timezone.localdate().year
+        except ValueError:
+            return Response(
+                {"detail": "Invalid year. Use YYYY"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1900 <= year <= 9998:
+            return Response(
+                {"detail": "Invalid year. Use YYYY"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        tz_name = request.query_params.get('tz')
+        try:
+            tz = ZoneInfo(tz_name) if tz_name else timezone.get_current_timezone()
+        except (ZoneInfoNotFoundError, ValueError):
+            return Response(
+                {"detail": f"Unknown time zone: {tz_name}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(get_year_heatmap(request.user.id, year, tz))
+
+    @action(detail=False, methods=['get'])
+    def mood_match(self, request):
+        """
+        Сравнивает тональность написанного с отмеченным настроением по дням.
+        Тональность считается командой score_sentiment, настроение: joy=1, neutral=0, sadness=-1.
+        """
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+        except ValueError:
+            return Response(
+                {"detail": "days must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start = timezone.now() - timedelta(days=days)
+
+        written = dict(
+            self.get_queryset()
+            .filter(sentiment_score__isnull=False, created_at__gte=start)
+            .annotate(day=Coalesce('date', TruncDate('created_at')))
+            .values('day')
+            .annotate(score=Avg('sentiment_score'))
+            .order_by()
+            .values_list('day', 'score')
+        )
+        logged = dict(
+            Emotion.objects
+            .filter(user=request.user, timestamp__gte=start)
+            .annotate(day=TruncDate('timestamp'))
+            .values('day')
+            .annotate(score=Avg(Case(
+                When(emotion_type='joy', then=Value(1.0)),
+                When(emotion_type='sadness', then=Value(-1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )))
+            .order_by()
+            .values_list('day', 'score')
+        )
+
+        def sign(value, threshold=0.15):
+            return 0 if abs(value) < threshold else (1 if value > 0 else -1)
+
+        result = []
+        matches = 0
+        for day in sorted(written.keys() & logged.keys()):
+            result.append({
+                'date': day.isoformat(),
+                'written': round(written[day], 3),
+                'logged': round(logged[day], 3),
+            })
+            matches += sign(written[day]) == sign(logged[day])
+
+        return Response({
+            'days': result,
+            'written_avg': round(sum(written.values()) / len(written), 3) if written else None,
+            'logged_avg': round(sum(logged.values()) / len(logged), 3) if logged else None,
+            'agreement': round(matches / len(result), 3) if result else None,
+        })
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def public_by_user(self, request):
         try:
@@ -195,13 +408,12 @@ class EntryViewSet(viewsets.ModelViewSet):
                 )
             
             # Get only public entries for the specified user
-            entries = Entry.objects.filter(user=user, is_public=True).order_by('-created_at')
-            logger.info(f"Found {entries.count()} public entries for user {user.username}")
-            
+            entries = Entry.objects.filter(user=user, is_public=True).select_related('user').order_by('-created_at').cache()
             serializer = self.get_serializer(entries, many=True)
+            logger.info('Found %d public entries for user %s', len(serializer.data), user.pk)
             return Response(serializer.data)
         except Exception as e:
-            logger.error(f"Error fetching public entries: {str(e)}")
+            logger.exception('Error fetching public entries')
             return Response(
                 {"detail": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -0,0 +1,25 @@
+import os
+import shutil
+
+# Для метрик Prometheus в нескольких воркерах: каталог PROMETHEUS_MULTIPROC_DIR
+# очищается при старте мастера, файлы умерших воркеров помечаются.
+# Соединения с БД прогреваются в каждом воркере после загрузки приложения.
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    from backend.db import warm_up
+    # Sync-воркер обслуживает запросы в этом же потоке — его соединение пригодится
+    warm_up(thread_connections=type(worker).__name__ == 'SyncWorker')
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from backend.querycache import CachingManager
+
 User = get_user_model()
 
 class Review(models.Model):
@@ -9,6 +11,8 @@ class Review(models.Model):
     rating = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CachingManager()
+
     def __str__(self):
         return f"Review by {self.author} (Rating: {self.rating})"
 
@@ -6,13 +6,13 @@ import logging
 logger = logging.getLogger(__name__)
 
 class ReviewListCreateView(generics.ListCreateAPIView):
-    queryset = Review.objects.order_by('-created_at')
+    queryset = Review.objects.order_by('-created_at').cache()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
 
     def perform_create(self, serializer):
         try:
-            logger.info('Creating new review with data: %s', self.request.data)
+            logger.debug('Creating new review with fields: %s', self.request.data.keys())
             # Убедимся, что author не None
             author = self.request.data.get('author', '').strip() or 'Аноним'
             serializer.save(author=author)
@@ -28,7 +28,7 @@ class ReviewListCreate(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         try:
-            logger.info('Creating new review with data: %s', self.request.data)
+            logger.debug('Creating new review with fields: %s', self.request.data.keys())
             instance = serializer.save()
             logger.info('Review created successfully: %s', instance.id)
         except Exception as e:
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('queue', 'status')
+    search_fields = ('name', 'key')
+    readonly_fields = ('created_at', 'locked_at', 'locked_by', 'finished_at', 'last_error')
@@ -0,0 +1,14 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Job
+from .registry import task
+
+
+@task(max_attempts=1)
+def purge_finished():
+    """Удаляет выполненные задачи старше TASKS_KEEP_FINISHED_DAYS; упавшие остаются для разбора."""
+    border = timezone.now() - timedelta(days=settings.TASKS_KEEP_FINISHED_DAYS)
+    Job.objects.filter(status=Job.DONE, finished_at__lt=border).delete()
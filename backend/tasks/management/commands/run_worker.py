@@ -0,0 +1,36 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из таблицы tasks_job'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default='',
+                            help='Очереди через запятую, можно с числом потоков: default,media=2 '
+                                 '(по умолчанию все из TASKS_QUEUES)')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти (для cron и отладки)')
+
+    def handle(self, *args, **options):
+        queues = dict(settings.TASKS_QUEUES)
+        if options['queues']:
+            selected = {}
+            for item in options['queues'].split(','):
+                name, _, concurrency = item.strip().partition('=')
+                try:
+                    selected[name] = int(concurrency) if concurrency else queues.get(name, 1)
+                except ValueError:
+                    raise CommandError(f'Неверное число потоков для очереди {name}: {concurrency}')
+            queues = selected
+
+        worker = Worker(queues, once=options['once'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(f"Воркер {worker.id}: {', '.join(f'{q}×{n}' for q, n in queues.items())}")
+        worker.run()
+        self.stdout.write('Воркер остановлен')
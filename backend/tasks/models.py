@@ -0,0 +1,49 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Задача фоновой очереди: вызов функции name(*args, **kwargs) не раньше run_at."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    name = models.CharField(max_length=200)  # модуль.функция
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Ключ периодической задачи: в очереди не больше одной задачи с ним
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at']),
+            models.Index(fields=['key', 'finished_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=Q(status__in=['queued', 'running']), name='tasks_job_pending_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.queue}] {self.status}"
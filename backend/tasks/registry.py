@@ -0,0 +1,59 @@
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+_registry = {}
+
+
+class Task:
+    """Функция, которую можно поставить в очередь: f.delay(...) или f.schedule(...)."""
+
+    def __init__(self, func, queue, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.queue = queue
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.schedule(None, *args, **kwargs)
+
+    def schedule(self, when, *args, **kwargs):
+        """when — datetime, число секунд от текущего момента или None (сразу)."""
+        if settings.TASKS_EAGER:
+            # Без воркера (разработка): выполнить после коммита в этом же процессе
+            transaction.on_commit(partial(self.func, *args, **kwargs))
+            return None
+        if isinstance(when, (int, float)):
+            when = timezone.now() + timedelta(seconds=when)
+        return enqueue(self.name, args, kwargs, queue=self.queue, run_at=when, max_attempts=self.max_attempts)
+
+
+def task(queue='default', max_attempts=5):
+    def register(func):
+        wrapped = Task(func, queue, max_attempts)
+        _registry[wrapped.name] = wrapped
+        return wrapped
+    return register
+
+
+def get_task(name):
+    return _registry.get(name)
+
+
+def enqueue(name, args=(), kwargs=None, queue='default', run_at=None, max_attempts=5, key=None):
+    """
+    Сохраняет задачу в таблицу. Строка пишется в текущей транзакции, поэтому
+    воркер увидит задачу только вместе с данными, ради которых она создана.
+    """
+    from .models import Job
+
+    return Job.objects.create(
+        name=name, args=list(args), kwargs=kwargs or {}, queue=queue,
+        run_at=run_at or timezone.now(), max_attempts=max_attempts, key=key,
+    )
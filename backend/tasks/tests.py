@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .registry import enqueue, task
+from .worker import backoff, claim, ensure_periodic, run_job
+
+calls = []
+
+
+@task(max_attempts=3)
+def record(value):
+    calls.append(value)
+
+
+@task()
+def tick():
+    calls.append('tick')
+
+
+@task(max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+WORKER = 'test:1'
+
+
+@override_settings(TASKS_EAGER=False, TASKS_RETRY_BASE=10, TASKS_RETRY_MAX=60)
+class WorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_and_run(self):
+        record.delay('a')
+        job = claim('default', WORKER)
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.RUNNING, 1, WORKER))
+        run_job(job, WORKER)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, ['a'])
+        self.assertIsNone(claim('default', WORKER))
+
+    def test_claim_waits_for_run_at_and_queue(self):
+        record.schedule(60, 'later')
+        record.delay('other')
+        Job.objects.filter(kwargs={}, args=['other']).update(queue='media')
+        self.assertIsNone(claim('default', WORKER))
+        self.assertEqual(claim('media', WORKER).args, ['other'])
+
+    def test_stale_running_job_is_reclaimed(self):
+        record.delay('stale')
+        job = claim('default', WORKER)
+        self.assertIsNone(claim('default', 'test:2'))
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        again = claim('default', 'test:2')
+        self.assertEqual((again.pk, again.attempts, again.locked_by), (job.pk, 2, 'test:2'))
+        # Первый воркер, закончив, не перезаписывает состояние перехваченной задачи
+        run_job(job, WORKER)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        explode.delay()
+        job = claim('default', WORKER)
+        before = timezone.now()
+        run_job(job, WORKER)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('RuntimeError: boom', job.last_error)
+        delay = (job.run_at - before).total_seconds()
+        self.assertTrue(4 <= delay <= 11, delay)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job = claim('default', WORKER)
+        self.assertEqual(job.attempts, 2)
+        run_job(job, WORKER)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_grows_and_is_capped(self):
+        for attempt, (low, high) in {1: (5, 10), 2: (10, 20), 3: (20, 40), 10: (30, 60)}.items():
+            with self.subTest(attempt=attempt):
+                seconds = backoff(attempt).total_seconds()
+                self.assertTrue(low <= seconds <= high, seconds)
+
+    def test_unknown_task_fails(self):
+        enqueue('tasks.tests.missing')
+        job = claim('default', WORKER)
+        run_job(job, WORKER)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('tasks.tests.missing', job.last_error)
+
+
+@override_settings(TASKS_EAGER=False, TASKS_PERIODIC={'every-minute': {'task': 'tasks.tests.tick', 'every': 60}})
+class PeriodicTests(TestCase):
+    def test_one_pending_job_per_key(self):
+        ensure_periodic()
+        ensure_periodic()
+        self.assertEqual(Job.objects.filter(key='periodic:every-minute').count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            enqueue(tick.name, key='periodic:every-minute')
+
+    def test_next_run_after_previous_finished(self):
+        ensure_periodic()
+        job = claim('default', WORKER)
+        run_job(job, WORKER)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+        ensure_periodic()
+        pending = Job.objects.get(key='periodic:every-minute', status=Job.QUEUED)
+        finished = Job.objects.get(pk=job.pk).finished_at
+        self.assertEqual(pending.run_at, finished + timedelta(seconds=60))
+
+
+@override_settings(TASKS_EAGER=True)
+class EagerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_on_commit_without_a_job_row(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertIsNone(record.delay('eager'))
+            self.assertEqual(calls, [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(calls, ['eager'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_not_run_when_transaction_rolls_back(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    record.delay('rolled back')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(calls, [])
@@ -0,0 +1,142 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .registry import enqueue, get_task
+
+logger = logging.getLogger(__name__)
+
+
+def backoff(attempt):
+    """Пауза перед повтором: экспонента с ограничением и случайным разбросом."""
+    delay = min(settings.TASKS_RETRY_BASE * 2 ** (attempt - 1), settings.TASKS_RETRY_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim(queue, worker_id):
+    """
+    Забирает одну готовую задачу очереди. SKIP LOCKED пропускает строки,
+    которые в этот момент забирают другие воркеры, без ожидания блокировки.
+    Задачи, зависшие в running дольше TASKS_LOCK_TIMEOUT (воркер упал), забираются повторно.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(queue=queue)
+            .filter(Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+            .order_by('run_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = now
+        job.locked_by = worker_id
+        job.save(update_fields=['status', 'attempts', 'locked_at', 'locked_by'])
+    return job
+
+
+def run_job(job, worker_id):
+    task = get_task(job.name)
+    now = timezone.now()
+    if task is None:
+        changes = {'status': Job.FAILED, 'finished_at': now, 'last_error': f'Неизвестная задача {job.name}'}
+    else:
+        try:
+            task.func(*job.args, **job.kwargs)
+        except Exception:
+            logger.warning('Job %s (%s) failed, attempt %s', job.pk, job.name, job.attempts, exc_info=True)
+            now = timezone.now()
+            changes = {'last_error': traceback.format_exc()}
+            if job.attempts < job.max_attempts:
+                changes.update(status=Job.QUEUED, run_at=now + backoff(job.attempts))
+            else:
+                changes.update(status=Job.FAILED, finished_at=now)
+        else:
+            changes = {'status': Job.DONE, 'finished_at': timezone.now(), 'last_error': ''}
+    # Если задачу уже перехватил другой воркер по таймауту, её состояние не трогаем
+    Job.objects.filter(pk=job.pk, locked_by=worker_id).update(locked_at=None, **changes)
+
+
+def ensure_periodic():
+    """Ставит в очередь следующий запуск каждой задачи из TASKS_PERIODIC."""
+    for name, spec in settings.TASKS_PERIODIC.items():
+        key = f'periodic:{name}'
+        if Job.objects.filter(key=key, status__in=[Job.QUEUED, Job.RUNNING]).exists():
+            continue
+        task = get_task(spec['task'])
+        if task is None:
+            logger.error('Periodic job %s refers to unknown task %s', name, spec['task'])
+            continue
+        last = Job.objects.filter(key=key).exclude(finished_at=None).order_by('-finished_at').first()
+        run_at = last.finished_at + timedelta(seconds=spec['every']) if last else timezone.now()
+        try:
+            with transaction.atomic():
+                enqueue(task.name, queue=task.queue, run_at=run_at, max_attempts=task.max_attempts, key=key)
+        except IntegrityError:
+            pass  # следующий запуск уже поставил другой воркер
+
+
+class Worker:
+    """Потоки по очередям: queues = {'default': 2, 'media': 1} — число потоков на очередь."""
+
+    def __init__(self, queues, once=False):
+        self.queues = queues
+        self.once = once
+        self.stopping = threading.Event()
+        self.id = f'{socket.gethostname()}:{os.getpid()}'
+
+    def work(self, queue, index):
+        worker_id = f'{self.id}:{queue}:{index}'
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                job = claim(queue, worker_id)
+                if job is None:
+                    if self.once:
+                        return
+                    self.stopping.wait(settings.TASKS_POLL_INTERVAL)
+                    continue
+                run_job(job, worker_id)
+        finally:
+            connections.close_all()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self.work, args=(queue, index), name=f'tasks-{queue}-{index}', daemon=True)
+            for queue, concurrency in self.queues.items()
+            for index in range(concurrency)
+        ]
+        ensure_periodic()
+        for thread in threads:
+            thread.start()
+        try:
+            if self.once:
+                for thread in threads:
+                    thread.join()
+            else:
+                while not self.stopping.wait(settings.TASKS_PERIODIC_CHECK):
+                    close_old_connections()
+                    ensure_periodic()
+        finally:
+            # Текущие задачи дорабатывают, новые не берутся
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+            connections.close_all()
+
+    def stop(self, *args):
+        self.stopping.set()
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from backend.cache import is_shared
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация, которая берёт пользователя из кэша вместо запроса к БД
+    на каждый вызов API. Кэш сбрасывается сигналами при сохранении/удалении User.
+    Сброс должен дойти до всех воркеров, поэтому с кэшем в памяти процесса
+    пользователь не кэшируется: иначе отключённый пользователь или смена пароля
+    в других воркерах действовали бы до истечения TTL.
+    """
+
+    def get_user(self, validated_token):
+        if not is_shared():
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Обычный путь simplejwt: запрос к БД и все проверки
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
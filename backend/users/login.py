@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import caches
+from rest_framework import serializers
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .models import User
+
+# Проверка пароля (PBKDF2) — самая дорогая часть входа. Асинхронный вход
+# выполняет её в ограниченном пуле потоков, синхронный — прямо в потоке
+# запроса: он всё равно ждал бы результат. Одновременных проверок в процессе
+# не больше LOGIN_HASH_MAX_PENDING, а до них запросы отсекаются дешёвыми
+# проверками: token bucket по IP и email в локальном кэше и поиск по email.
+
+INVALID_CREDENTIALS = 'Неверный email или пароль.'
+
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.LOGIN_HASH_WORKERS,
+    thread_name_prefix='login-hash',
+)
+_pending_lock = threading.Lock()
+_pending = 0
+
+
+class TokenBucket:
+    """Token bucket в локальном кэше: capacity попыток, полное восстановление за period секунд."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, prefix, capacity, period):
+        self.prefix = prefix
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.cache = caches['local']
+
+    def consume(self, key):
+        """Списывает одну попытку; возвращает 0, если можно, иначе секунды до следующей."""
+        cache_key = f'{self.prefix}:{key}'
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self.cache.get(cache_key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self.cache.set(cache_key, (tokens, now), int(self.capacity / self.rate) + 1)
+                return (1 - tokens) / self.rate
+            self.cache.set(cache_key, (tokens - 1, now), int(self.capacity / self.rate) + 1)
+            return 0
+
+
+ip_bucket = TokenBucket('login:ip', *settings.LOGIN_THROTTLE_IP)
+email_bucket = TokenBucket('login:email', *settings.LOGIN_THROTTLE_EMAIL)
+
+
+def _throttle(request, email):
+    wait = ip_bucket.consume(BaseThrottle().get_ident(request)) or email_bucket.consume(email.lower())
+    if wait:
+        raise Throttled(wait=wait)
+
+
+def _reserve_hash_slot():
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.LOGIN_HASH_MAX_PENDING:
+            raise Throttled(detail='Сервер перегружен, попробуйте войти позже.', wait=1)
+        _pending += 1
+
+
+def _release_hash_slot():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _verify_password(raw_password, encoded):
+    """Проверяет пароль и при необходимости готовит новый хеш."""
+    preferred = settings.LOGIN_PASSWORD_HASHER
+    rehashed = []
+    valid = check_password(
+        raw_password, encoded,
+        setter=lambda raw: rehashed.append(make_password(raw, hasher=preferred)),
+        preferred=preferred,
+    )
+    return valid, rehashed[0] if rehashed else None
+
+
+def _can_authenticate(user):
+    return user is not None and user.is_active and user.has_usable_password()
+
+
+def check_credentials(request, email, password):
+    """Синхронный вход: возвращает пользователя или бросает ValidationError/Throttled."""
+    _throttle(request, email)
+    user = User.objects.filter(email=email).first()
+    if not _can_authenticate(user):
+        raise serializers.ValidationError(INVALID_CREDENTIALS)
+
+    _reserve_hash_slot()
+    try:
+        valid, rehashed = _verify_password(password, user.password)
+    finally:
+        _release_hash_slot()
+    if not valid:
+        raise serializers.ValidationError(INVALID_CREDENTIALS)
+    if rehashed:
+        user.password = rehashed
+        user.save(update_fields=['password'])
+    return user
+
+
+async def acheck_credentials(request, email, password):
+    """Асинхронный вход: цикл событий не блокируется на время хеширования."""
+    _throttle(request, email)
+    user = await User.objects.filter(email=email).afirst()
+    if not _can_authenticate(user):
+        raise serializers.ValidationError(INVALID_CREDENTIALS)
+
+    _reserve_hash_slot()
+    try:
+        loop = asyncio.get_running_loop()
+        valid, rehashed = await loop.run_in_executor(_hash_executor, _verify_password, password, user.password)
+    finally:
+        _release_hash_slot()
+    if not valid:
+        raise serializers.ValidationError(INVALID_CREDENTIALS)
+    if rehashed:
+        user.password = rehashed
+        await user.asave(update_fields=['password'])
+    return user
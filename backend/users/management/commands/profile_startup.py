@@ -0,0 +1,112 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Запускается в отдельном процессе, чтобы измерить настоящий холодный старт:
+# импорт WSGI-приложения и первый запрос без прогретых модулей.
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from importlib import import_module
+from django.conf import settings
+module, name = settings.WSGI_APPLICATION.rsplit('.', 1)
+application = getattr(import_module(module), name)
+ready = time.perf_counter()
+host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h.strip('.*')), 'localhost')
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': host, 'SERVER_PORT': '80',
+    'wsgi.url_scheme': 'http', 'wsgi.input': __import__('io').BytesIO(), 'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+}
+statuses = []
+body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({
+    'app_ms': (ready - start) * 1000,
+    'first_response_ms': (done - start) * 1000,
+    'status': statuses[0] if statuses else None,
+}))
+'''
+
+
+def parse_importtime(lines):
+    """Строки -X importtime -> [(модуль, собственное время мкс, накопленное мкс)]."""
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def probe_startup(path, top=20):
+    """Холодный старт в отдельном процессе: время до готовности приложения и до первого ответа."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, path],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f'Процесс замера завершился с ошибкой:\n{result.stderr[-2000:]}')
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr.splitlines())
+
+    # Собственное время импорта по пакетам верхнего уровня
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    return {
+        **timings,
+        'import_ms': sum(self_us for _, self_us, _ in modules) / 1000,
+        'modules': len(modules),
+        'top_modules': [
+            {'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+            for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:top]
+        ],
+        'top_packages': [
+            {'package': name, 'self_ms': total / 1000}
+            for name, total in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top]
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Измеряет холодный старт: время импорта по модулям и время до первого ответа'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/covers/',
+                            help='Запрос, время ответа на который измеряется')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Сколько самых дорогих модулей показать')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Завершиться с ошибкой, если первый ответ дольше N мс '
+                                 '(по умолчанию STARTUP_BUDGET_MS, его же проверяет тест)')
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        report = probe_startup(options['path'], options['top'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self.stdout.write(f"Импорт WSGI-приложения: {report['app_ms']:.0f} мс "
+                              f"(импорт модулей {report['import_ms']:.0f} мс, модулей: {report['modules']})")
+            self.stdout.write(f"Первый ответ {options['path']}: {report['first_response_ms']:.0f} мс, {report['status']}")
+            self.stdout.write('\nПакеты по собственному времени импорта:')
+            for row in report['top_packages']:
+                self.stdout.write(f"  {row['self_ms']:8.1f} мс  {row['package']}")
+            self.stdout.write('\nМодули по накопленному времени импорта:')
+            for row in report['top_modules']:
+                self.stdout.write(f"  {row['cumulative_ms']:8.1f} мс  {row['module']}")
+
+        budget = options['budget_ms'] or settings.STARTUP_BUDGET_MS
+        if report['first_response_ms'] > budget:
+            raise CommandError(f"Холодный старт {report['first_response_ms']:.0f} мс превышает бюджет {budget:.0f} мс")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.revocation import revocation_store
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из таблицы отзыва refresh-токены, срок действия которых истёк'
+
+    def handle(self, *args, **options):
+        deleted = revocation_store.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted}'))
@@ -34,3 +34,13 @@ class User(AbstractUser):
 
     def has_pin(self):
         return bool(self.pin_code)
+
+
+class RevokedToken(models.Model):
+    """Отозванный refresh-токен (jti). Проверка идёт через Bloom-фильтр в users.revocation."""
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
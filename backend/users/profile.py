@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from backend.cache import bump_generation, get_generation, is_shared, versioned_key
+from backend.metrics import record_cache
+from comments.models import Comment
+from entries.models import Entry
+from entries.serializers import EntrySerializer
+from like.models import Like
+from .models import User
+
+# Публичный профиль целиком: карточка пользователя, число публичных записей и
+# первая страница записей со счётчиками лайков и комментариев. Сборка — ровно
+# три запроса, результат кэшируется до любой записи, касающейся владельца.
+# Сброс поколения должен дойти до всех воркеров, поэтому с кэшем в памяти
+# процесса профиль не кэшируется и ETag не выдаётся. В кэше ссылки на файлы
+# относительные: абсолютными их делает absolute_urls для каждого запроса.
+
+
+def _scope(user_id):
+    return f'profile:{user_id}'
+
+
+def _username_key(username):
+    return f'profile:uid:{username}'
+
+
+def invalidate_profile(user_id):
+    bump_generation(_scope(user_id))
+
+
+def _count_subquery(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(entry=OuterRef('pk'))
+            .order_by()
+            .values('entry')
+            .annotate(count=Count('id'))
+            .values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def build_profile(user, page_size):
+    public = Entry.objects.filter(user=user, is_public=True)
+    stats = public.aggregate(count=Count('id'), last_updated=Max('updated_at'))
+    entries = list(
+        public.order_by('-created_at')
+        .annotate(like_count=_count_subquery(Like), comment_count=_count_subquery(Comment))[:page_size]
+    )
+    for entry in entries:
+        entry.user = user  # автор уже загружен, без запроса на каждую запись
+
+    items = EntrySerializer(entries, many=True).data
+    for item, entry in zip(items, entries):
+        item['like_count'] = entry.like_count
+        item['comment_count'] = entry.comment_count
+
+    return {
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'photo': user.profile_photo.url if user.profile_photo else None,
+        },
+        'public_entries_count': stats['count'],
+        'last_updated': stats['last_updated'].isoformat() if stats['last_updated'] else None,
+        'entries': items,
+        'page_size': page_size,
+        'has_more': stats['count'] > page_size,
+    }
+
+
+def absolute_urls(data, request):
+    """Копия профиля со ссылками на фото и обложки относительно хоста запроса."""
+    def absolute(url):
+        return request.build_absolute_uri(url) if url else url
+
+    entries = [
+        {**item, 'cover_image': absolute(item['cover_image']),
+         'author': {**item['author'], 'photo': absolute(item['author']['photo'])}}
+        for item in data['entries']
+    ]
+    return {**data, 'user': {**data['user'], 'photo': absolute(data['user']['photo'])}, 'entries': entries}
+
+
+def profile_etag(user_id, page_size):
+    return f'"{user_id}-{get_generation(_scope(user_id))}-{page_size}"'
+
+
+def cached_user_id(username):
+    if not is_shared():
+        return None
+    return cache.get(_username_key(username))
+
+
+def get_profile(username, page_size):
+    """
+    Возвращает (данные, etag) или (None, None), если пользователя нет; без
+    общего кэша etag — None. Ссылки в данных относительные.
+    """
+    user_id = cached_user_id(username)
+    if user_id is not None:
+        data = cache.get(versioned_key(_scope(user_id), page_size))
+        # После смены имени старое имя может указывать на устаревший профиль
+        if data is not None and data['user']['username'] == username:
+            record_cache('profile', True)
+            return data, profile_etag(user_id, page_size)
+    record_cache('profile', False)
+
+    user = User.objects.filter(username=username).only(
+        'id', 'username', 'first_name', 'last_name', 'profile_photo'
+    ).first()
+    if user is None:
+        return None, None
+    data = build_profile(user, page_size)
+    if not is_shared():
+        return data, None
+    cache.set(_username_key(username), user.id, settings.PROFILE_CACHE_TIMEOUT)
+    cache.set(versioned_key(_scope(user.id), page_size), data, settings.PROFILE_CACHE_TIMEOUT)
+    return data, profile_etag(user.id, page_size)
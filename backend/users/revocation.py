@@ -0,0 +1,122 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """Bloom-фильтр: "нет" — точно не отозван, "да" — нужно проверить в БД."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationStore:
+    """
+    Хранилище отозванных jti: таблица RevokedToken и Bloom-фильтр в памяти процесса.
+    Фильтр строится из таблицы при первом обращении и раз в TOKEN_REVOCATION_SYNC_SECONDS
+    догружает строки, отозванные другими процессами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._synced_at = 0.0
+
+    def _rebuild(self):
+        count = RevokedToken.objects.count()
+        bloom = BloomFilter(
+            max(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, count * 2),
+            settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE,
+        )
+        last_id = 0
+        for row_id, jti in RevokedToken.objects.order_by('id').values_list('id', 'jti').iterator(chunk_size=5000):
+            bloom.add(jti)
+            last_id = row_id
+        self._filter = bloom
+        self._last_id = last_id
+
+    def _sync(self):
+        with self._lock:
+            if self._filter is None or self._filter.count > self._filter.capacity:
+                self._rebuild()
+            elif time.monotonic() - self._synced_at >= settings.TOKEN_REVOCATION_SYNC_SECONDS:
+                rows = RevokedToken.objects.filter(id__gt=self._last_id).order_by('id').values_list('id', 'jti')
+                for row_id, jti in rows:
+                    self._filter.add(jti)
+                    self._last_id = row_id
+            else:
+                return
+            self._synced_at = time.monotonic()
+
+    def is_revoked(self, jti):
+        if self._filter is None or time.monotonic() - self._synced_at >= settings.TOKEN_REVOCATION_SYNC_SECONDS:
+            self._sync()
+        bloom = self._filter
+        if bloom is not None and jti not in bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        """Отзывает jti. Возвращает False, если он уже был отозван (повторное использование)."""
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        if self._filter is not None:
+            with self._lock:
+                self._filter.add(jti)
+        return True
+
+    def purge_expired(self):
+        """Удаляет строки истёкших токенов; фильтр перестраивается при следующей проверке."""
+        deleted, _ = RevokedToken.objects.filter(expires_at__lt=datetime.now(timezone.utc)).delete()
+        with self._lock:
+            self._filter = None
+        return deleted
+
+
+revocation_store = RevocationStore()
+
+
+class RevocableRefreshToken(RefreshToken):
+    """Refresh-токен, проверяющий отзыв через revocation_store."""
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if revocation_store.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        expires_at = datetime.fromtimestamp(self['exp'], tz=timezone.utc)
+        if not revocation_store.revoke(self[api_settings.JTI_CLAIM], expires_at):
+            raise TokenError('Token is blacklisted')
@@ -5,7 +5,10 @@ from emotions.models import Emotion
 from django.db.models.functions import TruncMonth
 from django.db.models import Count
 from collections import defaultdict
-from django.contrib.auth import authenticate
+from .login import check_credentials
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from .revocation import RevocableRefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     profile_photo = serializers.ImageField(required=False, allow_null=True)
@@ -94,17 +97,16 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-class UserLoginSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)  # Changed from username to email
     password = serializers.CharField(required=True, write_only=True)
 
+class UserLoginSerializer(LoginCredentialsSerializer):
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
-        user = authenticate(email=email, password=password)
-        if not user:
-            raise serializers.ValidationError('Неверный email или пароль.')
-        attrs['user'] = user
+        attrs['user'] = check_credentials(self.context['request'], email, password)
         return attrs
 
 class PinCodeSerializer(serializers.Serializer):
@@ -134,4 +136,30 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError('Старый пароль неверен.')
-        return value 
+        return value
+
+class RotatingTokenRefreshSerializer(serializers.Serializer):
+    """
+    Обновление токенов с ротацией: старый refresh-токен отзывается, и повторно
+    использовать его нельзя (отзыв атомарен благодаря уникальному jti в таблице).
+    """
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = RevocableRefreshToken(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed('No active account found for the given token.', 'no_active_account')
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from comments.models import Comment
+from entries.models import Entry
+from like.models import Like
+from .authentication import invalidate_cached_user
+from .models import User
+from .profile import invalidate_profile
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    invalidate_profile(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Entry)
+def invalidate_author_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_entry_author_profile(sender, instance, **kwargs):
+    # Счётчики на записи входят в профиль её автора, а не того, кто лайкнул
+    if sender.entry.is_cached(instance):
+        author_id = instance.entry.user_id
+    else:
+        author_id = Entry.objects.filter(pk=instance.entry_id).values_list('user_id', flat=True).first()
+    if author_id is not None:
+        invalidate_profile(author_id)
@@ -1,3 +1,248 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import login
+from .authentication import CachedJWTAuthentication, user_cache_key
+from .management.commands.profile_startup import probe_startup
+from comments.models import Comment
+from entries.models import Entry
+from like.models import Like
+from .models import RevokedToken, User
+from .revocation import BloomFilter, revocation_store
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+        self.token = AccessToken.for_user(self.user)
+
+    def test_process_local_cache_is_not_used(self):
+        # Устаревший пользователь в кэше памяти процесса не должен пропускать запрос
+        cache.set(user_cache_key(self.user.pk), self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            CachedJWTAuthentication().get_user(self.token)
+
+    def test_shared_cache_is_used_and_invalidated(self):
+        with tempfile.TemporaryDirectory() as path:
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': path}}
+            with override_settings(CACHES=shared):
+                auth = CachedJWTAuthentication()
+                self.assertEqual(auth.get_user(self.token), self.user)
+                with self.assertNumQueries(0):
+                    auth.get_user(self.token)
+
+                self.user.is_active = False
+                self.user.save()
+                with self.assertRaises(AuthenticationFailed):
+                    auth.get_user(self.token)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        values = [f'jti-{i}' for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TokenRotationTests(TestCase):
+    def setUp(self):
+        # Фильтр общий на процесс: строим заново по таблице этого теста
+        revocation_store._filter = None
+        self.addCleanup(setattr, revocation_store, '_filter', None)
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X')
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post('/api/users/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_refresh_rotates_and_old_token_is_rejected(self):
+        old = RefreshToken.for_user(self.user)
+        response = self.refresh(old)
+        self.assertEqual(response.status_code, 200)
+        new = response.json()['refresh']
+        self.assertNotEqual(RefreshToken(new)['jti'], old['jti'])
+        self.assertIn('access', response.json())
+
+        self.assertEqual(self.refresh(old).status_code, 401)
+        self.assertEqual(self.refresh(new).status_code, 200)
+
+    def test_revoked_elsewhere_is_rejected_after_sync(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(revocation_store.is_revoked(token['jti']))
+        # Отзыв другим процессом: строка в таблице, в фильтре этого процесса её нет
+        RevokedToken.objects.create(jti=token['jti'], expires_at=timezone.now() + timedelta(days=1))
+        with override_settings(TOKEN_REVOCATION_SYNC_SECONDS=3600):
+            self.assertFalse(revocation_store.is_revoked(token['jti']))
+        with override_settings(TOKEN_REVOCATION_SYNC_SECONDS=0):
+            self.assertTrue(revocation_store.is_revoked(token['jti']))
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_inactive_user_cannot_refresh(self):
+        token = RefreshToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_purge_deletes_only_expired(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(minutes=1))
+        RevokedToken.objects.create(jti='valid', expires_at=now + timedelta(days=1))
+        out = StringIO()
+        call_command('purge_revoked_tokens', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['valid'])
+        self.assertTrue(revocation_store.is_revoked('valid'))
+        self.assertFalse(revocation_store.is_revoked('expired'))
+
+
+class FastHasher(PBKDF2PasswordHasher):
+    iterations = 2000
+
+
+@override_settings(PASSWORD_HASHERS=['users.tests.FastHasher'])
+class LoginTests(TestCase):
+    PASSWORD = 'pass12345!X'
+
+    def setUp(self):
+        caches['local'].clear()
+        self.addCleanup(caches['local'].clear)
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password=self.PASSWORD)
+
+    def login(self, password=PASSWORD, path='/api/users/login/'):
+        return self.client.post(path, {'email': 'a@a.ru', 'password': password}, content_type='application/json')
+
+    def test_sync_login_hashes_in_request_thread(self):
+        with mock.patch.object(login._hash_executor, 'submit') as submit:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', response.json())
+        submit.assert_not_called()
+        self.assertEqual(self.login('wrong').status_code, 400)
+
+    def test_email_bucket_exhaustion_is_429(self):
+        with mock.patch.object(login, 'email_bucket', login.TokenBucket('test:email', 2, 60)):
+            self.assertEqual(self.login('wrong').status_code, 400)
+            self.assertEqual(self.login('wrong').status_code, 400)
+            with mock.patch.object(login, '_verify_password') as verify:
+                response = self.login()
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            # До хеширования дело не дошло
+            verify.assert_not_called()
+
+    def test_password_rehashed_after_hasher_change(self):
+        self.user.password = FastHasher().encode(self.PASSWORD, FastHasher().salt(), iterations=1000)
+        self.user.save()
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split('$')[1], '2000')
+        self.assertTrue(self.user.check_password(self.PASSWORD))
+
+    def test_login_async(self):
+        path = '/api/users/login/async/'
+        response = self.login(path=path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['id'], self.user.pk)
+        self.assertEqual(self.login('wrong', path=path).status_code, 400)
+        self.assertEqual(self.client.post(path, b'{', content_type='application/json').status_code, 400)
+        with mock.patch.object(login, 'ip_bucket', login.TokenBucket('test:ip', 1, 60)):
+            self.login('wrong', path=path)
+            response = self.login(path=path)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+def shared_cache(test):
+    """Общий для процессов кэш (файловый) на время теста."""
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    override = override_settings(CACHES={
+        **settings.CACHES,
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': path},
+    })
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class PublicProfileTests(TestCase):
+    URL = '/api/users/profile/alice/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='a@a.ru', password='pass12345!X',
+                                             profile_photo='profile_photos/alice.png')
+        self.bob = User.objects.create_user(username='bob', email='b@b.ru', password='pass12345!X')
+        self.entries = [Entry.objects.create(user=self.user, title=f't{i}', is_public=True) for i in range(12)]
+        Entry.objects.create(user=self.user, title='private')
+        for entry in self.entries[-3:]:
+            Like.objects.create(user=self.bob, entry=entry)
+            Comment.objects.create(user=self.bob, entry=entry, text='hi')
+
+    def test_fixed_query_count(self):
+        with self.assertNumQueries(3):
+            data = self.client.get(self.URL).json()
+        self.assertEqual((data['public_entries_count'], len(data['entries']), data['has_more']), (12, 10, True))
+        self.assertEqual((data['entries'][0]['like_count'], data['entries'][0]['comment_count']), (1, 1))
+        self.assertEqual(data['entries'][-1]['like_count'], 0)
+        with self.assertNumQueries(3):
+            self.client.get(self.URL, {'page_size': 50})
+        self.assertEqual(self.client.get('/api/users/profile/nobody/').status_code, 404)
+
+    def test_process_local_cache_gives_no_etag(self):
+        response = self.client.get(self.URL)
+        self.assertNotIn('ETag', response)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.URL, headers={'If-None-Match': '"x"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_shared_cache_and_etag(self):
+        shared_cache(self)
+        response = self.client.get(self.URL)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.URL).json(), response.json())
+            self.assertEqual(self.client.get(self.URL, headers={'If-None-Match': etag}).status_code, 304)
+
+        Like.objects.create(user=self.bob, entry=self.entries[-4])
+        response = self.client.get(self.URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['entries'][3]['like_count'], 1)
+
+    def test_urls_follow_request_host(self):
+        shared_cache(self)
+        first = self.client.get(self.URL, headers={'Host': 'a.example'}).json()
+        second = self.client.get(self.URL, headers={'Host': 'b.example'}).json()
+        self.assertEqual(first['user']['photo'], 'http://a.example/media/profile_photos/alice.png')
+        self.assertEqual(second['user']['photo'], 'http://b.example/media/profile_photos/alice.png')
+        self.assertEqual(second['entries'][0]['author']['photo'], second['user']['photo'])
+
+
+class ColdStartTests(SimpleTestCase):
+    def test_first_response_within_budget(self):
+        report = probe_startup('/api/covers/')
+        self.assertEqual(report['status'], '200 OK')
+        self.assertLess(
+            report['first_response_ms'], settings.STARTUP_BUDGET_MS,
+            f"Холодный старт {report['first_response_ms']:.0f} мс, самые дорогие пакеты: "
+            + ', '.join(f"{row['package']} {row['self_ms']:.0f} мс" for row in report['top_packages'][:5])
+        )
@@ -5,9 +5,21 @@ from rest_framework.views import APIView
 from django.contrib.auth import authenticate
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSerializer, PinCodeSerializer, VerifyPinSerializer, DontRemindSerializer, ChangePasswordSerializer
+from .serializers import UserRegistrationSerializer, UserLoginSerializer, LoginCredentialsSerializer, UserSerializer, PinCodeSerializer, VerifyPinSerializer, DontRemindSerializer, ChangePasswordSerializer
 from .models import User
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework import serializers
+from rest_framework.exceptions import Throttled
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .login import acheck_credentials
+from backend.uploads import UploadSlotMixin
+from blobs.jobs import shrink_later
+from .profile import absolute_urls, cached_user_id, get_profile, profile_etag
+from django.conf import settings
+import json
+import math
 
 # Create your views here.
 
@@ -27,27 +39,57 @@ class UserRegistrationView(APIView):
                 'has_pin': user.has_pin(),
             },
             'token': str(refresh.access_token),
+            'refresh': str(refresh),
         }, status=status.HTTP_201_CREATED)
 
 class UserLoginView(APIView):
     permission_classes = [AllowAny]
     
     def post(self, request):
-        serializer = UserLoginSerializer(data=request.data)
+        serializer = UserLoginSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'has_pin': user.has_pin(),
-            },
-            'token': str(refresh.access_token),
-        })
+        return Response(login_payload(user))
+
+def login_payload(user):
+    refresh = RefreshToken.for_user(user)
+    return {
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'has_pin': user.has_pin(),
+        },
+        'token': str(refresh.access_token),
+        'refresh': str(refresh),
+    }
 
-class UserMeView(APIView):
+@csrf_exempt
+@require_POST
+async def login_async(request):
+    """
+    Асинхронный вход (под ASGI): проверка пароля уходит в пул потоков,
+    рабочий цикл событий продолжает обслуживать другие запросы.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = LoginCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        user = await acheck_credentials(request, serializer.validated_data['email'], serializer.validated_data['password'])
+    except Throttled as exc:
+        response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+        if exc.wait:
+            response['Retry-After'] = str(math.ceil(exc.wait))
+        return response
+    except serializers.ValidationError as exc:
+        return JsonResponse({'non_field_errors': exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse(login_payload(user))
+
+class UserMeView(UploadSlotMixin, APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
@@ -57,7 +99,10 @@ class UserMeView(APIView):
     def patch(self, request):
         serializer = UserSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            user = serializer.save()
+            if 'profile_photo' in request.FILES:
+                # Уменьшение фото — в фоне, ответ не ждёт Pillow
+                shrink_later(user, 'profile_photo')
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
@@ -118,3 +163,29 @@ def get_user_by_username(request):
         return Response(serializer.data)
     except User.DoesNotExist:
         return Response({'detail': f'User with username {username} not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def public_profile(request, username):
+    """Публичный профиль одним запросом: карточка, счётчик и первая страница записей."""
+    try:
+        page_size = int(request.query_params.get('page_size', settings.PROFILE_PAGE_SIZE))
+    except ValueError:
+        return Response({'detail': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    page_size = max(1, min(page_size, settings.PROFILE_MAX_PAGE_SIZE))
+
+    # Ответ 304 отдаётся только по кэшу, без обращения к БД
+    user_id = cached_user_id(username)
+    if user_id is not None and request.headers.get('If-None-Match') == profile_etag(user_id, page_size):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = profile_etag(user_id, page_size)
+    else:
+        data, etag = get_profile(username, page_size)
+        if data is None:
+            return Response({'detail': f'User with username {username} not found'}, status=status.HTTP_404_NOT_FOUND)
+        response = Response(absolute_urls(data, request))
+        if etag:
+            response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response